@@ -0,0 +1,80 @@
+"""Micro-benchmark: canary decision time vs. rule-set size.
+
+Compares the compiled CanaryRouter index against the previous behaviour
+(linear scan over all rules, re.compile on every regex evaluation).
+
+Usage:
+    PYTHONPATH=src python benchmarks/canary_rules.py
+"""
+
+from __future__ import annotations
+
+import functools
+import random
+import re
+import timeit
+
+from gateway.proxy.canary import CanaryRouter, CanaryRule
+
+RULE_COUNTS = [10, 100, 1_000, 5_000]
+ITERATIONS = 2_000
+
+
+def _make_rules(count: int, rng: random.Random) -> list[CanaryRule]:
+    rules = []
+    for i in range(count):
+        partner = f"partner{i % 500}"
+        if i % 10 == 0:
+            pattern = f"^/api/v1/partners/{partner}/report/.*"
+        else:
+            pattern = f"/api/v1/partners/{partner}/resource{i}"
+        rules.append(
+            CanaryRule(partner=partner, endpoint_pattern=pattern, method="GET", percentage=1)
+        )
+    rng.shuffle(rules)
+    return rules
+
+
+def _linear_scan(rules: list[CanaryRule], partner: str, path: str, method: str) -> list[CanaryRule]:
+    """Pre-index behaviour: every rule checked, regexes compiled per evaluation."""
+    matched = []
+    for rule in rules:
+        if rule.partner is not None and partner.lower() != rule.partner.lower():
+            continue
+        if rule.method is not None and method.upper() != rule.method.upper():
+            continue
+        pattern = rule.endpoint_pattern or ""
+        if pattern.startswith("^") or ".*" in pattern:
+            if not re.compile(pattern).search(path):
+                continue
+        elif not path.startswith(pattern):
+            continue
+        matched.append(rule)
+    return matched
+
+
+def main() -> None:
+    rng = random.Random(42)
+    path = "/api/v1/partners/partner7/resource7/details"
+    print(f"{'rules':>8} {'indexed us/op':>15} {'linear us/op':>15}")
+    for count in RULE_COUNTS:
+        rules = _make_rules(count, rng)
+        router = CanaryRouter(rules=rules, canary_enabled=True)
+        assert router.matching_rules("partner7", path, "GET") == _linear_scan(
+            rules, "partner7", path, "GET"
+        )
+
+        indexed = timeit.timeit(
+            functools.partial(router.should_use_canary, "partner7", path, "GET"),
+            number=ITERATIONS,
+        )
+        linear = timeit.timeit(
+            functools.partial(_linear_scan, rules, "partner7", path, "GET"), number=ITERATIONS
+        )
+        print(
+            f"{count:>8} {indexed / ITERATIONS * 1e6:>15.2f} {linear / ITERATIONS * 1e6:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
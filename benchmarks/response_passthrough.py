@@ -0,0 +1,106 @@
+"""Micro-benchmark: CPU per MB proxied for a gzip-encoded upstream body.
+
+Compares relaying the body as received (aiter_raw, PROXY_RESPONSE_PASSTHROUGH)
+against decoding it (aiter_bytes, the previous behaviour) and against decoding
+plus re-compressing it, which is what keeping the body compressed would cost
+without passthrough. The upstream is an in-process httpx.MockTransport, so the
+numbers are gateway CPU only.
+
+Usage:
+    PYTHONPATH=src python benchmarks/response_passthrough.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import random
+import time
+import zlib
+
+import httpx
+
+BODY_SIZES = [64 * 1024, 1024 * 1024, 8 * 1024 * 1024]
+CHUNK_SIZE = 64 * 1024
+TARGET_SECONDS = 0.5
+
+
+def _json_like_body(size: int, rng: random.Random) -> bytes:
+    """Repetitive JSON-ish payload that compresses roughly like real API responses."""
+    records = []
+    total = 0
+    while total < size:
+        record = (
+            f'{{"id":"{rng.getrandbits(64):016x}","status":"{rng.choice(["open", "closed", "pending"])}",'
+            f'"amount":{rng.randint(1, 100_000)},"partner":"partner{rng.randint(1, 50)}"}}'
+        )
+        records.append(record)
+        total += len(record) + 1
+    return ("[" + ",".join(records) + "]").encode()[:size]
+
+
+class _NetworkStream(httpx.AsyncByteStream):
+    """Upstream body arriving in socket-read-sized pieces."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def __aiter__(self):
+        for offset in range(0, len(self.body), CHUNK_SIZE):
+            yield self.body[offset:offset + CHUNK_SIZE]
+
+
+async def _relay(client: httpx.AsyncClient, mode: str) -> int:
+    async with client.stream("GET", "http://upstream/report") as response:
+        relayed = 0
+        if mode == "passthrough":
+            async for chunk in response.aiter_raw(CHUNK_SIZE):
+                relayed += len(chunk)
+        elif mode == "decode":
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                relayed += len(chunk)
+        else:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                relayed += len(compressor.compress(chunk))
+            relayed += len(compressor.flush())
+        return relayed
+
+
+async def _cpu_ms_per_mb(encoded: bytes, mode: str) -> float:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers={"content-type": "application/json", "content-encoding": "gzip"},
+            stream=_NetworkStream(encoded),
+        )
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await _relay(client, mode)
+        iterations = 0
+        started = time.process_time()
+        while True:
+            await _relay(client, mode)
+            iterations += 1
+            elapsed = time.process_time() - started
+            if elapsed >= TARGET_SECONDS:
+                break
+    return elapsed * 1000 / iterations / (len(encoded) / (1024 * 1024))
+
+
+async def main() -> None:
+    rng = random.Random(42)
+    print(
+        f"{'body':>8} {'gzip':>8} {'passthrough':>12} {'decode':>12} {'decode+gzip':>12}  (CPU ms per MB on the wire)"
+    )
+    for size in BODY_SIZES:
+        encoded = gzip.compress(_json_like_body(size, rng), compresslevel=6)
+        results = [await _cpu_ms_per_mb(encoded, mode) for mode in ("passthrough", "decode", "recompress")]
+        print(
+            f"{size // 1024:>6}KB {len(encoded) // 1024:>6}KB "
+            + " ".join(f"{ms:>12.2f}" for ms in results)
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
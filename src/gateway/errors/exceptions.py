@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+from typing import Any, Mapping, Optional
 
 from .types import ErrorStruct
 
@@ -15,8 +15,11 @@ class FundboxAPIException(Exception):
         error: ErrorStruct,
         *message_formatting: Any,
         detail: Optional[dict] = None,
+        headers: Optional[Mapping[str, str]] = None,
     ):
         self.error = error
         self.message_formatting = message_formatting
         self.detail = detail
+        # Extra response headers (e.g. Retry-After on a 429)
+        self.headers = dict(headers) if headers else None
         super().__init__(error.message_format)
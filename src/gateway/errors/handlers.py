@@ -21,8 +21,17 @@ def fundbox_error_payload(exc: FundboxAPIException) -> dict:
     ) | ({"detail": exc.detail} if exc.detail else {})
 
 
+def fundbox_error_response(exc: FundboxAPIException) -> JSONResponse:
+    """The response for exc; usable outside FastAPI's exception handling (e.g. in middleware)."""
+    return JSONResponse(
+        status_code=exc.error.http_status_code,
+        content=fundbox_error_payload(exc),
+        headers=exc.headers,
+    )
+
+
 async def fundbox_exception_handler(request: Request, exc: FundboxAPIException) -> JSONResponse:
-    return JSONResponse(status_code=exc.error.http_status_code, content=fundbox_error_payload(exc))
+    return fundbox_error_response(exc)
 
 
 async def http_exception_handler(request: Request, exc: StarletteHTTPException) -> JSONResponse:
@@ -21,7 +21,10 @@ from gateway.routers.leads import router as leads_router
 import os
 import sys
 from gateway.partners.router import mount_partner_docs
-from gateway.partners.policies import POLICY_PROVIDER
+from gateway.middleware.expired_requests import ExpiredRequestMiddleware
+from gateway.middleware.rate_limit import PartnerRateLimitMiddleware
+from gateway.partners.policies import POLICY_PROVIDER, RATE_LIMITER
+from gateway.proxy.asgi import ProxyFastLaneMiddleware
 from gateway.proxy.client import proxy_client_lifespan
 from gateway.proxy.router import router as proxy_router
 
@@ -149,3 +152,18 @@ except Exception as e:
 # This catch-all route handles requests not matched by explicitly defined routes above
 # As endpoints are migrated to contract-first definitions, fewer requests will hit this fallback
 app.include_router(proxy_router)
+
+# Optional pure-ASGI fast lane: requests that would only reach the catch-all are
+# forwarded straight from the ASGI scope, skipping FastAPI routing and the inner
+# middleware. Contract-first routes above are still served by FastAPI.
+if os.getenv("GATEWAY_PROXY_FAST_LANE", "").lower() in {"1", "true", "yes"}:
+    app.add_middleware(ProxyFastLaneMiddleware, router=app.router)
+
+# Partner rate limits (PartnerPolicy.rate_limit / tag_rate_limits). Added last so
+# it runs first: a partner over its limit gets a 429 before routing, auth or DB work.
+app.add_middleware(PartnerRateLimitMiddleware, limiter=RATE_LIMITER, router=app.router)
+
+# Requests whose deadline passed while they queued behind the load balancer
+# (X-Request-Start / X-Request-Timeout). Outermost: they get a 503 before any
+# rate-limit, routing, auth or DB work.
+app.add_middleware(ExpiredRequestMiddleware)
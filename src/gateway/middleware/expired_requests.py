@@ -0,0 +1,77 @@
+"""Pure-ASGI middleware dropping requests whose deadline passed while they queued."""
+
+from __future__ import annotations
+
+import logging
+
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from gateway.proxy.client import get_proxy_client
+from gateway.proxy.deadline import DeadlinePolicy
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiredRequestMiddleware:
+    """
+    Answer 503 to requests that expired before the gateway got to them.
+
+    Under backlog, requests wait in the load balancer and the worker's accept
+    queue long after their callers gave up. A request is dropped when its
+    DeadlinePolicy budget is already spent on arrival: the caller's
+    X-Request-Timeout less the time since X-Request-Start, or the load
+    balancer's own timeout since X-Request-Start. Runs outermost, so a
+    dropped request costs two header lookups - no routing, auth, DB session
+    or upstream call. Requests without these headers pass straight through.
+
+    Usage:
+        app.add_middleware(ExpiredRequestMiddleware)
+    """
+
+    def __init__(self, app: ASGIApp, deadlines: DeadlinePolicy | None = None):
+        """
+        Args:
+            app: Wrapped ASGI application
+            deadlines: Deadline headers and load balancer timeout (default: the
+                       proxy client's, so both share settings and counters)
+        """
+        self.app = app
+        self.deadlines = deadlines
+
+    def _policy(self) -> DeadlinePolicy | None:
+        if self.deadlines is not None:
+            return self.deadlines
+        try:
+            return get_proxy_client().deadlines
+        except RuntimeError:  # proxy client not initialized (app run without its lifespan)
+            return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        policy = self._policy()
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = scope["headers"]
+        age = policy.age(headers)
+        remaining = policy.remaining(headers, age)
+        if remaining is None or remaining > 0:
+            await self.app(scope, receive, send)
+            return
+
+        policy.dropped(age)
+        logger.info(
+            f"request_dropped reason=expired method={scope['method']} path={scope['path']} "
+            f"queued_ms={'unknown' if age is None else f'{age * 1000:.0f}'} "
+            f"overdue_ms={-remaining * 1000:.0f}"
+        )
+        response = Response(
+            content="Service Unavailable: request expired before it was handled",
+            status_code=503,
+            headers={"Content-Type": "text/plain"},
+        )
+        await response(scope, receive, send)
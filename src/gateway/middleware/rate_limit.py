@@ -0,0 +1,118 @@
+"""Pure-ASGI middleware enforcing partner rate limits before any other work."""
+
+from __future__ import annotations
+
+import logging
+import re
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Router
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from gateway.errors.error_codes import ErrorHandling
+from gateway.errors.exceptions import FundboxAPIException
+from gateway.errors.handlers import fundbox_error_response
+from gateway.partners.ratelimit import PartnerRateLimiter
+from gateway.proxy.asgi import RouteMatcher, route_path
+
+logger = logging.getLogger(__name__)
+
+_PARTNER_IN_PATH = re.compile(r"/partners/([^/]+)")
+
+
+def _partner(scope: Scope) -> str:
+    """Partner id from the X-Partner header, else from a /partners/{partner}/ path."""
+    partner = Headers(scope=scope).get("x-partner", "").strip()
+    if not partner:
+        match = _PARTNER_IN_PATH.search(scope["path"])
+        partner = match.group(1) if match else ""
+    return partner.lower()
+
+
+class PartnerRateLimitMiddleware:
+    """
+    Answer 429 to partners over their PartnerPolicy rate limits.
+
+    Runs outermost, so a rejected request costs one bucket check - no routing,
+    auth, DB session or upstream call. Route tags are resolved with one regex
+    per limited tag, built from the app's routes on first use. Requests within
+    their limits get RateLimit-* headers; rejections get the gateway's error
+    payload (ErrorHandling.TOO_MANY_REQUESTS) plus Retry-After.
+
+    The partner is taken from the X-Partner header (or a /partners/{partner}/
+    path) before any authentication has run, so it is a claim, not an
+    identity: a client that sends another partner's id spends that partner's
+    tokens, and can drain its bucket. Keying buckets on credentials instead
+    would not help - unverified tokens are free to rotate, and verifying them
+    here costs the DB work this middleware exists to avoid. These limits
+    protect the upstream from well-behaved partners overrunning their share;
+    abusive or anonymous traffic has to be stopped in front of the gateway
+    (load balancer / WAF), where the client address is known.
+
+    Usage:
+        app.add_middleware(PartnerRateLimitMiddleware, limiter=RATE_LIMITER, router=app.router)
+    """
+
+    def __init__(self, app: ASGIApp, limiter: PartnerRateLimiter, router: Router):
+        """
+        Args:
+            app: Wrapped ASGI application
+            limiter: Buckets and the policies they enforce
+            router: Router whose route tags select per-tag limits
+        """
+        self.app = app
+        self.limiter = limiter
+        self.router = router
+        self._tag_matchers: dict[str, RouteMatcher] | None = None
+
+    @property
+    def tag_matchers(self) -> dict[str, RouteMatcher]:
+        # Built lazily: routes are registered after the middleware is added
+        if self._tag_matchers is None:
+            self._tag_matchers = {
+                tag: RouteMatcher(
+                    [r for r in self.router.routes if tag in (getattr(r, "tags", None) or ())],
+                    exclude=set(),
+                )
+                for tag in self.limiter.limited_tags()
+            }
+        return self._tag_matchers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        partner = _partner(scope)
+        if not partner:
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], route_path(scope)
+        tags = [tag for tag, matcher in self.tag_matchers.items() if matcher.matches(method, path)]
+        decision = self.limiter.check(partner, tags)
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = decision.headers()
+        if not decision.allowed:
+            logger.info(
+                f"rate_limited partner={partner} method={method} path={path} "
+                f"tags={','.join(tags) or 'none'} retry_after={headers['Retry-After']}"
+            )
+            exc = FundboxAPIException(
+                ErrorHandling.TOO_MANY_REQUESTS,
+                f"retry after {headers['Retry-After']}s",
+                headers=headers,
+            )
+            await fundbox_error_response(exc)(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                for name, value in headers.items():
+                    response_headers.setdefault(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
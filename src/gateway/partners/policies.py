@@ -1,5 +1,6 @@
 from .policy import PartnerPolicy
 from .file_provider import InMemoryPolicyProvider
+from .ratelimit import PartnerRateLimiter
 
 POLICY_PROVIDER = InMemoryPolicyProvider(
     policies={
@@ -7,3 +8,8 @@ POLICY_PROVIDER = InMemoryPolicyProvider(
         "intuit": PartnerPolicy("intuit", frozenset({"Leads"})),
     }
 )
+
+# Per-worker token buckets for the policies' rate_limit / tag_rate_limits
+# (enforced by PartnerRateLimitMiddleware); no partner is limited until its
+# policy sets one
+RATE_LIMITER = PartnerRateLimiter(POLICY_PROVIDER)
@@ -1,13 +1,46 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, FrozenSet, Optional
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    Token bucket: ``requests`` per ``per_seconds`` on average, bursts up to ``burst``.
+    """
+    requests: int
+    per_seconds: float = 1.0
+    burst: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.requests < 1 or self.per_seconds <= 0 or (self.burst is not None and self.burst < 1):
+            raise ValueError(f"Invalid rate limit: {self}")
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second."""
+        return self.requests / self.per_seconds
+
+    @property
+    def capacity(self) -> int:
+        return self.burst if self.burst is not None else self.requests
 
 
 @dataclass(frozen=True)
 class PartnerPolicy:
     partner: str
     allow_tags: FrozenSet[str]
+    # Applies to every request of the partner
+    rate_limit: Optional[RateLimit] = None
+    # Route tag -> limit for requests to routes carrying that tag (on top of rate_limit)
+    tag_rate_limits: Mapping[str, RateLimit] = field(default_factory=dict, compare=False)
+    # Share of upstream capacity relative to other partners once it runs out (fair queuing)
+    weight: float = 1.0
+
+    def __post_init__(self) -> None:
+        if self.weight <= 0:
+            raise ValueError(f"Invalid weight for partner {self.partner}: {self.weight}")
 
 
 class PartnerPolicyProvider:
@@ -26,3 +59,10 @@ class PartnerPolicyProvider:
             return self._default
         # choose strict default
         return PartnerPolicy(partner=partner, allow_tags=frozenset())
+
+    def policies(self) -> list[PartnerPolicy]:
+        """Every configured policy, the default one included."""
+        policies = list(self._policies.values())
+        if self._default:
+            policies.append(self._default)
+        return policies
@@ -0,0 +1,165 @@
+"""In-process token buckets enforcing PartnerPolicy rate limits."""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from gateway.proxy.metrics import CounterSet
+
+from .policy import PartnerPolicyProvider, RateLimit
+
+
+class TokenBucket:
+    """
+    One rate limit's state: refilled lazily from the clock on each check.
+
+    Everything is plain arithmetic on two floats, so a check is O(1) and needs
+    no lock - all access happens on the event loop.
+    """
+
+    __slots__ = ("limit", "tokens", "updated_at")
+
+    def __init__(self, limit: RateLimit, now: float):
+        self.limit = limit
+        self.tokens = float(limit.capacity)
+        self.updated_at = now
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(float(self.limit.capacity), self.tokens + elapsed * self.limit.rate)
+            self.updated_at = now
+
+    def wait_seconds(self) -> float:
+        """Seconds until a whole token is available."""
+        return max(0.0, (1 - self.tokens) / self.limit.rate)
+
+    def reset_seconds(self) -> float:
+        """Seconds until the bucket is full again."""
+        return max(0.0, (self.limit.capacity - self.tokens) / self.limit.rate)
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    """Outcome of one check, reported against the tightest bucket involved."""
+
+    allowed: bool
+    limit: RateLimit
+    remaining: int
+    reset_seconds: float
+    retry_after: float = 0.0
+
+    def headers(self) -> dict[str, str]:
+        """RateLimit-* headers (IETF httpapi draft), plus Retry-After when rejected."""
+        headers = {
+            "RateLimit-Limit": str(self.limit.capacity),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_seconds)),
+            "RateLimit-Policy": f"{self.limit.requests};w={self.limit.per_seconds:g}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class PartnerRateLimiter:
+    """
+    Per-partner and per-(partner, route tag) token buckets.
+
+    A request takes one token from its partner's bucket and from the bucket of
+    every limited tag on its route, or from none of them when any is empty.
+    Buckets are created on first use; beyond ``max_buckets`` the least
+    recently used one is dropped, so unknown partner ids cannot grow memory
+    without bound while busy partners keep their buckets.
+    """
+
+    def __init__(self, provider: PartnerPolicyProvider, max_buckets: int = 10_000):
+        """
+        Args:
+            provider: Where partner policies (and their limits) come from
+            max_buckets: Buckets kept per worker
+        """
+        self.provider = provider
+        self.max_buckets = max_buckets
+        self.counters = CounterSet()
+        # policy partner -> allowed/rejected
+        self.partners: dict[str, CounterSet] = {}
+        self._buckets: OrderedDict[tuple[str, Optional[str]], TokenBucket] = OrderedDict()
+
+    def limited_tags(self) -> frozenset[str]:
+        """Route tags that carry a limit for at least one partner."""
+        return frozenset(tag for policy in self.provider.policies() for tag in policy.tag_rate_limits)
+
+    def check(
+        self, partner: str, tags: Iterable[str] = (), now: float | None = None
+    ) -> RateLimitDecision | None:
+        """Take a token for one request of partner; None when no limit applies."""
+        policy = self.provider.get(partner)
+        limits: list[tuple[Optional[str], RateLimit]] = []
+        if policy.rate_limit is not None:
+            limits.append((None, policy.rate_limit))
+        if policy.tag_rate_limits:
+            limits.extend(
+                (tag, policy.tag_rate_limits[tag]) for tag in tags if tag in policy.tag_rate_limits
+            )
+        if not limits:
+            return None
+
+        now = time.monotonic() if now is None else now
+        buckets = [self._bucket(partner, tag, limit, now) for tag, limit in limits]
+        for bucket in buckets:
+            bucket.refill(now)
+
+        # Counted per policy: partner ids without a policy of their own share the default's
+        partner_counters = self.partners.get(policy.partner)
+        if partner_counters is None:
+            partner_counters = self.partners[policy.partner] = CounterSet()
+
+        empty = [bucket for bucket in buckets if bucket.tokens < 1]
+        if empty:
+            blocking = max(empty, key=TokenBucket.wait_seconds)
+            self.counters.inc("rejected")
+            partner_counters.inc("rejected")
+            return RateLimitDecision(
+                allowed=False,
+                limit=blocking.limit,
+                remaining=0,
+                reset_seconds=blocking.reset_seconds(),
+                retry_after=blocking.wait_seconds(),
+            )
+
+        for bucket in buckets:
+            bucket.tokens -= 1
+        tightest = min(buckets, key=lambda bucket: bucket.tokens)
+        self.counters.inc("allowed")
+        partner_counters.inc("allowed")
+        return RateLimitDecision(
+            allowed=True,
+            limit=tightest.limit,
+            remaining=int(tightest.tokens),
+            reset_seconds=tightest.reset_seconds(),
+        )
+
+    def _bucket(self, partner: str, tag: Optional[str], limit: RateLimit, now: float) -> TokenBucket:
+        key = (partner, tag)
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.limit is not limit:
+            if bucket is None and len(self._buckets) >= self.max_buckets:
+                self._buckets.popitem(last=False)
+                self.counters.inc("evictions")
+            bucket = self._buckets[key] = TokenBucket(limit, now)
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def status(self) -> dict:
+        """Bucket count and allowed/rejected counters per partner (for /debug/rate-limits)."""
+        return {
+            "buckets": len(self._buckets),
+            "max_buckets": self.max_buckets,
+            **self.counters.snapshot(),
+            "partners": {partner: c.snapshot() for partner, c in self.partners.items()},
+        }
@@ -0,0 +1,170 @@
+"""Pure-ASGI fast lane for requests that would hit the catch-all proxy route."""
+
+from __future__ import annotations
+
+import re
+from typing import AsyncIterator
+
+from starlette.datastructures import Headers
+from starlette.requests import ClientDisconnect
+from starlette.routing import BaseRoute, Router, WebSocketRoute
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from gateway.proxy.body import read_body_stream
+from gateway.proxy.client import get_proxy_client
+from gateway.proxy.handler import forward_request
+from gateway.proxy.router import catch_all_proxy
+
+# Named groups cannot repeat inside one alternation, and we only need a yes/no answer
+_NAMED_GROUP = re.compile(r"\(\?P<[^>]+>")
+
+
+def route_path(scope: Scope) -> str:
+    """Path as seen by the Starlette router (root_path stripped)."""
+    path: str = scope["path"]
+    root_path: str = scope.get("root_path", "")
+    if not root_path or not path.startswith(root_path):
+        return path
+    if path == root_path:
+        return ""
+    if path[len(root_path)] == "/":
+        return path[len(root_path):]
+    return path
+
+
+async def _receive_body(receive: Receive) -> AsyncIterator[bytes]:
+    """Yield request body chunks straight from the ASGI receive channel."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.request":
+            chunk = message.get("body", b"")
+            if chunk:
+                yield chunk
+            if not message.get("more_body", False):
+                return
+        elif message["type"] == "http.disconnect":
+            raise ClientDisconnect()
+
+
+class RouteMatcher:
+    """
+    Answers "would any contract-first route match this request?" in one regex call.
+
+    Mirrors Starlette's routing rule that only a FULL match (path and method) wins
+    over the catch-all: a path that exists for GET only still falls through to the
+    proxy for POST.
+    """
+
+    def __init__(self, routes: list[BaseRoute], exclude: set[object]):
+        static: dict[str, set[str]] = {}
+        patterns: dict[str, list[str]] = {}
+        any_method_patterns: list[str] = []
+
+        for route in routes:
+            if getattr(route, "endpoint", None) in exclude:
+                continue
+            path_regex = getattr(route, "path_regex", None)
+            if path_regex is None or isinstance(route, WebSocketRoute):
+                continue
+            methods = getattr(route, "methods", None)
+            path_format = getattr(route, "path_format", None)
+            param_convertors = getattr(route, "param_convertors", None)
+
+            if methods and path_format and not param_convertors:
+                for method in methods:
+                    static.setdefault(method, set()).add(path_format)
+                continue
+
+            pattern = _NAMED_GROUP.sub("(?:", path_regex.pattern)
+            if methods:
+                for method in methods:
+                    patterns.setdefault(method, []).append(pattern)
+            else:
+                # Mounts and other method-less routes accept every method
+                any_method_patterns.append(pattern)
+
+        self._static = {method: frozenset(paths) for method, paths in static.items()}
+        methods = set(patterns) | set(self._static)
+        self._any_method = (
+            re.compile("|".join(f"(?:{p})" for p in any_method_patterns))
+            if any_method_patterns
+            else None
+        )
+        self._by_method = {
+            method: re.compile("|".join(f"(?:{p})" for p in patterns[method]))
+            for method in methods
+            if patterns.get(method)
+        }
+
+    def matches(self, method: str, path: str) -> bool:
+        if path in self._static.get(method, ()):
+            return True
+        regex = self._by_method.get(method)
+        if regex is not None and regex.match(path):
+            return True
+        return self._any_method is not None and self._any_method.match(path) is not None
+
+
+class ProxyFastLaneMiddleware:
+    """
+    Serve catch-all proxy traffic without going through FastAPI.
+
+    Requests that match a contract-first route are passed to the wrapped app as
+    usual. Everything else - what the ``/{full_path:path}`` catch-all would have
+    received - is forwarded directly from ``scope``/``receive``/``send`` via
+    forward_request, reusing the shared ProxyClient and its CanaryRouter. This
+    skips dependency resolution, Request construction, the route scan and any
+    inner middleware (e.g. the DB session middleware).
+
+    Usage:
+        app.add_middleware(ProxyFastLaneMiddleware, router=app.router)
+    """
+
+    def __init__(self, app: ASGIApp, router: Router, exclude_endpoints: tuple = ()):
+        """
+        Args:
+            app: Wrapped ASGI application
+            router: Router whose routes are served by the wrapped app
+            exclude_endpoints: Endpoints treated as "not a route" (the catch-all)
+        """
+        self.app = app
+        self.router = router
+        self.exclude_endpoints = set(exclude_endpoints) | {catch_all_proxy}
+        self._matcher: RouteMatcher | None = None
+
+    @property
+    def matcher(self) -> RouteMatcher:
+        # Built lazily: routes are registered after the middleware is added
+        if self._matcher is None:
+            self._matcher = RouteMatcher(self.router.routes, self.exclude_endpoints)
+        return self._matcher
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.matcher.matches(scope["method"], route_path(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        proxy_client = get_proxy_client()
+        headers = Headers(scope=scope)
+        body = await read_body_stream(
+            headers,
+            _receive_body(receive),
+            mode=proxy_client.request_body_mode,
+            spool_max_memory=proxy_client.spool_max_memory,
+        )
+        client = scope.get("client")
+
+        response = await forward_request(
+            proxy_client,
+            method=scope["method"],
+            path=route_path(scope),
+            query_string=scope.get("query_string", b"").decode("latin-1"),
+            raw_headers=scope["headers"],
+            client_ip=client[0] if client else "",
+            scheme=scope.get("scheme", "http"),
+            body=body,
+            canary_router=proxy_client.canary_router,
+            debug_mode=proxy_client.debug_mode,
+            receive=receive,
+        )
+        await response(scope, receive, send)
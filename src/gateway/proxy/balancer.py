@@ -0,0 +1,261 @@
+"""Client-side balancing across several legacy upstream instances."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Literal
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+BalancerStrategy = Literal["least_outstanding", "p2c"]
+
+BALANCER_STRATEGIES: frozenset[str] = frozenset({"least_outstanding", "p2c"})
+
+# Ejections back off exponentially up to this multiple of the base ejection time
+_MAX_EJECTION_MULTIPLIER = 10
+
+
+def parse_upstream_urls(value: str) -> list[str]:
+    """Split an UPSTREAM_BASE_URL value ("http://a:8001, http://b:8002") into base URLs."""
+    urls = [part.strip().rstrip("/") for part in value.replace("\n", ",").split(",")]
+    urls = [url for url in urls if url]
+    if not urls:
+        raise ValueError("UPSTREAM_BASE_URL environment variable is required")
+    for url in urls:
+        try:
+            parsed = httpx.URL(url)
+        except Exception as e:
+            raise ValueError(f"Invalid UPSTREAM_BASE_URL: {url}") from e
+        if len(urls) > 1 and not parsed.host:
+            raise ValueError(f"Invalid UPSTREAM_BASE_URL: {url}")
+    return urls
+
+
+class UpstreamInstance:
+    """One upstream address and its passive health state."""
+
+    __slots__ = (
+        "base_url",
+        "outstanding",
+        "consecutive_failures",
+        "ejected_until",
+        "ejections",
+        "probing",
+        "requests",
+        "failures",
+    )
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        # monotonic time; 0 = in rotation
+        self.ejected_until = 0.0
+        # consecutive ejections, drives backoff; reset by a success
+        self.ejections = 0
+        # ejection expired, waiting for a probe to succeed
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+
+    def url(self, path: str) -> str:
+        if not path.startswith("/"):
+            path = "/" + path
+        return f"{self.base_url}{path}"
+
+    def status(self, now: float) -> dict:
+        return {
+            "base_url": self.base_url,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.ejected_until > now or self.probing,
+            "ejected_for_seconds": round(max(0.0, self.ejected_until - now), 1),
+            "ejections": self.ejections,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class UpstreamPool:
+    """
+    Picks a legacy upstream instance per request and tracks outlier state.
+
+    Balancing looks only at in-process outstanding requests (counted from the
+    upstream call until the response body has been relayed):
+    - least_outstanding: the instance with the fewest, ties broken randomly
+    - p2c: power of two choices - the less busy of two random instances
+
+    Outlier detection is passive: ``consecutive_failures`` connect errors or
+    timeouts in a row eject an instance for ``ejection_seconds``, doubling per
+    repeated ejection. When the ejection expires the instance is probed (a GET
+    to ``probe_path``; any HTTP response counts as reachable) before it takes
+    traffic again. Without a running prober, an expired instance goes straight
+    back into rotation and a single failure ejects it again.
+
+    If every instance is ejected, all of them are used anyway (panic mode) - a
+    guess is better than failing every request at the gateway.
+    """
+
+    def __init__(
+        self,
+        base_urls: list[str],
+        strategy: str = "least_outstanding",
+        consecutive_failures: int = 5,
+        ejection_seconds: float = 30.0,
+        probe_path: str = "/",
+        probe_interval: float = 5.0,
+        probe_timeout: float = 2.0,
+    ):
+        """
+        Args:
+            base_urls: Upstream base URLs (at least one)
+            strategy: "least_outstanding" or "p2c"
+            consecutive_failures: Connect errors/timeouts in a row that eject an instance
+            ejection_seconds: Base ejection time
+            probe_path: Path requested to check an ejected instance
+            probe_interval: Seconds between prober runs
+            probe_timeout: Timeout of a single probe
+        """
+        if not base_urls:
+            raise ValueError("UPSTREAM_BASE_URL environment variable is required")
+        if strategy not in BALANCER_STRATEGIES:
+            raise ValueError(
+                f"Invalid PROXY_BALANCER: {strategy} (expected one of {sorted(BALANCER_STRATEGIES)})"
+            )
+        if consecutive_failures < 1:
+            raise ValueError(f"Invalid PROXY_OUTLIER_CONSECUTIVE_FAILURES: {consecutive_failures}")
+        self.instances = [UpstreamInstance(url) for url in base_urls]
+        self.strategy = strategy
+        self.consecutive_failures = consecutive_failures
+        self.ejection_seconds = ejection_seconds
+        self.probe_path = probe_path
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._prober: asyncio.Task | None = None
+
+    def pick(self) -> UpstreamInstance:
+        """Choose the instance for the next request (call acquire() on it)."""
+        instances = self.instances
+        if len(instances) == 1:
+            return instances[0]
+
+        now = time.monotonic()
+        available = [i for i in instances if self._available(i, now)]
+        if not available:
+            available = instances  # panic mode
+
+        if self.strategy == "p2c" and len(available) > 2:
+            first, second = random.sample(available, 2)
+            return first if first.outstanding <= second.outstanding else second
+
+        # Random start so ties don't always land on the first configured instance
+        offset = random.randrange(len(available))
+        best = available[offset]
+        for n in range(1, len(available)):
+            candidate = available[(offset + n) % len(available)]
+            if candidate.outstanding < best.outstanding:
+                best = candidate
+        return best
+
+    def _available(self, instance: UpstreamInstance, now: float) -> bool:
+        if instance.probing:
+            return False
+        if instance.ejected_until == 0.0:
+            return True
+        if now < instance.ejected_until:
+            return False
+        if self._prober is not None:
+            # Expired: the prober decides when it comes back
+            instance.probing = True
+            return False
+        # Nobody probes: half-open, the next failure ejects again
+        instance.ejected_until = 0.0
+        instance.consecutive_failures = self.consecutive_failures - 1
+        return True
+
+    @staticmethod
+    def acquire(instance: UpstreamInstance) -> None:
+        instance.outstanding += 1
+        instance.requests += 1
+
+    @staticmethod
+    def release(instance: UpstreamInstance) -> None:
+        instance.outstanding -= 1
+
+    def record_success(self, instance: UpstreamInstance) -> None:
+        instance.consecutive_failures = 0
+        instance.ejections = 0
+
+    def record_failure(self, instance: UpstreamInstance, error: Exception) -> None:
+        """Count an error against an instance; connect errors and timeouts can eject it."""
+        if not isinstance(error, (httpx.ConnectError, httpx.TimeoutException)):
+            return
+        instance.failures += 1
+        instance.consecutive_failures += 1
+        if instance.consecutive_failures >= self.consecutive_failures and len(self.instances) > 1:
+            self._eject(instance, reason=type(error).__name__)
+
+    def _eject(self, instance: UpstreamInstance, reason: str) -> None:
+        instance.ejections += 1
+        multiplier = min(2 ** (instance.ejections - 1), _MAX_EJECTION_MULTIPLIER)
+        duration = self.ejection_seconds * multiplier
+        instance.ejected_until = time.monotonic() + duration
+        instance.probing = False
+        instance.consecutive_failures = 0
+        logger.warning(
+            f"upstream_instance_ejected base_url={instance.base_url} reason={reason} "
+            f"ejection_seconds={duration} ejections={instance.ejections}"
+        )
+
+    async def probe(self, client: httpx.AsyncClient) -> None:
+        """Probe every instance whose ejection has expired and reinstate the reachable ones."""
+        now = time.monotonic()
+        due = [
+            i for i in self.instances
+            if i.probing or (i.ejected_until and now >= i.ejected_until)
+        ]
+        for instance in due:
+            instance.probing = True
+            try:
+                await client.get(instance.url(self.probe_path), timeout=self.probe_timeout)
+            except httpx.HTTPError as e:
+                self._eject(instance, reason=f"probe_{type(e).__name__}")
+                continue
+            instance.ejected_until = 0.0
+            instance.probing = False
+            logger.info(f"upstream_instance_reinstated base_url={instance.base_url}")
+
+    def start(self, client: httpx.AsyncClient) -> None:
+        """Start the background prober (only useful with more than one instance)."""
+        if self._prober is None and len(self.instances) > 1 and self.probe_interval > 0:
+            self._prober = asyncio.get_running_loop().create_task(self._probe_loop(client))
+
+    async def stop(self) -> None:
+        if self._prober is not None:
+            self._prober.cancel()
+            try:
+                await self._prober
+            except asyncio.CancelledError:
+                pass
+            self._prober = None
+
+    async def _probe_loop(self, client: httpx.AsyncClient) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.probe(client)
+            except Exception as e:  # never let the prober die
+                logger.error(f"upstream_probe_failed error={str(e)}")
+
+    def status(self) -> dict:
+        """Per-instance load and outlier state (for /debug/proxy/upstreams)."""
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "instances": [instance.status(now) for instance in self.instances],
+        }
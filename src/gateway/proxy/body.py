@@ -0,0 +1,192 @@
+"""Request body forwarding strategies for the upstream proxy."""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Literal, Mapping
+
+from starlette.requests import Request
+
+BodyMode = Literal["buffer", "stream", "spool"]
+
+BODY_MODES: frozenset[str] = frozenset({"buffer", "stream", "spool"})
+
+
+def validate_body_mode(mode: str) -> BodyMode:
+    """Validate a request body mode name (from env/config) and return it."""
+    if mode not in BODY_MODES:
+        raise ValueError(
+            f"Invalid PROXY_REQUEST_BODY_MODE: {mode} (expected one of {sorted(BODY_MODES)})"
+        )
+    return mode  # type: ignore[return-value]
+
+
+def request_has_body(headers: Mapping[str, str]) -> bool:
+    """
+    Whether the client announced a request body.
+
+    A GET without Content-Length/Transfer-Encoding must not be turned into a
+    chunked upload just because we hand httpx an iterator.
+    """
+    if "transfer-encoding" in headers:
+        return True
+    content_length = headers.get("content-length")
+    return content_length is not None and content_length.strip() not in ("", "0")
+
+
+@dataclass
+class UpstreamRequestBody:
+    """
+    Request body as handed to httpx.
+
+    Modes:
+    - buffer: whole body read into memory (``await request.body()``), replayable
+    - stream: ``request.stream()`` piped straight into httpx, single use
+    - spool:  body copied into a SpooledTemporaryFile (memory up to a threshold,
+              then disk), replayable for retries
+    """
+
+    mode: BodyMode
+    data: bytes | None = None
+    _stream: AsyncIterator[bytes] | None = field(default=None, repr=False)
+    _spool: SpooledTemporaryFile | None = field(default=None, repr=False)
+    # Whether the spool went past its memory threshold and rolled over to disk
+    _spooled_to_disk: bool = field(default=False, repr=False)
+    size: int | None = None
+
+    @property
+    def replayable(self) -> bool:
+        """Whether ``content()`` may be called more than once."""
+        return self.mode != "stream"
+
+    def content(self, chunk_size: int = 64 * 1024) -> bytes | AsyncIterator[bytes] | None:
+        """
+        Content argument for httpx.
+
+        For spooled bodies each call returns a fresh iterator over the spool, so the
+        same body can be sent again on retry.
+        """
+        if self.mode == "buffer":
+            return self.data or None
+        if self.mode == "stream":
+            return self._stream
+        if self._spool is None or not self.size:
+            return None
+        return self._iter_spool(chunk_size)
+
+    def snapshot(self, max_bytes: int) -> bytes | None:
+        """
+        A bytes copy of the body for a second consumer (shadow mirroring).
+
+        Returns None when that would mean touching the network or disk: streamed
+        bodies, spools that rolled over to a file, or bodies over ``max_bytes``.
+        Must be called before the body is sent upstream.
+        """
+        if self.mode == "stream":
+            return b"" if self._stream is None else None
+        if self.size is not None and self.size > max_bytes:
+            return None
+        if self.mode == "buffer":
+            return self.data or b""
+        if self._spool is None or not self.size:
+            return b""
+        if self._spooled_to_disk:
+            return None
+        self._spool.seek(0)
+        return self._spool.read()
+
+    async def _iter_spool(self, chunk_size: int) -> AsyncIterator[bytes]:
+        spool = self._spool
+        assert spool is not None
+        on_disk = self._spooled_to_disk
+        spool.seek(0)
+        while True:
+            if on_disk:
+                chunk = await asyncio.to_thread(spool.read, chunk_size)
+            else:
+                chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    async def aclose(self) -> None:
+        """Release the spool file (no-op for other modes)."""
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+
+async def read_request_body(
+    request: Request,
+    mode: BodyMode,
+    spool_max_memory: int = 1024 * 1024,
+) -> UpstreamRequestBody:
+    """
+    Prepare the inbound request body for forwarding.
+
+    Args:
+        request: Inbound request
+        mode: "buffer", "stream" or "spool"
+        spool_max_memory: Bytes kept in memory before a spooled body rolls over to disk
+
+    Returns:
+        UpstreamRequestBody (call ``aclose()`` once the upstream call is finished)
+    """
+    if mode == "buffer":
+        # Request.body() caches, so routes that already parsed the body still work
+        data = await request.body()
+        return UpstreamRequestBody(mode="buffer", data=data, size=len(data))
+    return await read_body_stream(request.headers, request.stream(), mode, spool_max_memory)
+
+
+async def read_body_stream(
+    headers: Mapping[str, str],
+    stream: AsyncIterator[bytes],
+    mode: BodyMode,
+    spool_max_memory: int = 1024 * 1024,
+) -> UpstreamRequestBody:
+    """
+    Prepare a request body from a raw chunk stream (see read_request_body).
+
+    Args:
+        headers: Inbound request headers (lowercase lookups)
+        stream: Body chunks as received from the client
+        mode: "buffer", "stream" or "spool"
+        spool_max_memory: Bytes kept in memory before a spooled body rolls over to disk
+
+    Returns:
+        UpstreamRequestBody (call ``aclose()`` once the upstream call is finished)
+    """
+    if mode == "buffer":
+        data = b"".join([chunk async for chunk in stream])
+        return UpstreamRequestBody(mode="buffer", data=data, size=len(data))
+
+    if not request_has_body(headers):
+        return UpstreamRequestBody(mode=mode, size=0)
+
+    if mode == "stream":
+        # Content-Length (if the client sent one) is forwarded as a regular header,
+        # which makes httpx send a sized body instead of switching to chunked encoding.
+        return UpstreamRequestBody(mode="stream", _stream=stream)
+
+    spool = SpooledTemporaryFile(max_size=spool_max_memory)
+    size = 0
+    try:
+        async for chunk in stream:
+            if not chunk:
+                continue
+            size += len(chunk)
+            # The spool rolls over to disk in the write that takes it past
+            # max_size; that write and all later ones happen off the event loop
+            if size > spool_max_memory:
+                await asyncio.to_thread(spool.write, chunk)
+            else:
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    return UpstreamRequestBody(
+        mode="spool", _spool=spool, _spooled_to_disk=size > spool_max_memory, size=size
+    )
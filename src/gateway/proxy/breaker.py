@@ -0,0 +1,209 @@
+"""Per-upstream circuit breakers: fail fast instead of waiting out a dead upstream."""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from typing import Literal
+
+import httpx
+
+from gateway.proxy.metrics import SlidingWindow
+
+logger = logging.getLogger(__name__)
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+# Upstream statuses that count against the breaker (the upstream is there but
+# cannot serve); other 5xx are application errors and count as successes
+_FAILURE_STATUS = frozenset({502, 503, 504})
+
+# Repeated trips back off up to this multiple of open_seconds
+_MAX_OPEN_MULTIPLIER = 8
+
+
+def is_breaker_failure(error: Exception | None = None, status_code: int | None = None) -> bool:
+    """Whether an upstream outcome counts as a failure: transport errors and 502/503/504."""
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+    return status_code in _FAILURE_STATUS
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one upstream.
+
+    - closed: requests flow. The breaker opens when, within ``window_seconds``
+      and with at least ``min_requests`` results, the failure rate reaches
+      ``failure_rate`` - or after ``consecutive_failures`` transport failures
+      in a row, which catches a dead upstream long before slow connect
+      timeouts fill a window. 502/503/504 responses only count toward the
+      rate: a few in a row can come from one failing route of a healthy
+      upstream.
+    - open: requests fail fast for ``open_seconds`` (doubling per repeated
+      trip, up to 8x).
+    - half_open: up to ``half_open_requests`` trial requests go through. A
+      success closes the breaker; a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_requests: int = 20,
+        window_seconds: float = 10.0,
+        consecutive_failures: int = 5,
+        open_seconds: float = 30.0,
+        half_open_requests: int = 1,
+    ):
+        """
+        Args:
+            name: Upstream name ("legacy" or "canary")
+            failure_rate: Failure ratio (0-1] that opens the breaker
+            min_requests: Results needed in the window before the rate is trusted
+            window_seconds: Length of the sliding failure-rate window
+            consecutive_failures: Failures in a row that open the breaker outright
+            open_seconds: How long an open breaker rejects requests
+            half_open_requests: Concurrent trial requests while half-open
+        """
+        if not 0 < failure_rate <= 1:
+            raise ValueError(f"Invalid PROXY_BREAKER_FAILURE_RATE: {failure_rate}")
+        if min_requests < 1:
+            raise ValueError(f"Invalid PROXY_BREAKER_MIN_REQUESTS: {min_requests}")
+        if consecutive_failures < 1:
+            raise ValueError(f"Invalid PROXY_BREAKER_CONSECUTIVE_FAILURES: {consecutive_failures}")
+        if open_seconds <= 0:
+            raise ValueError(f"Invalid PROXY_BREAKER_OPEN_SECONDS: {open_seconds}")
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self.half_open_requests = half_open_requests
+        self._window = SlidingWindow(window_seconds, slots=10)
+        self.state: BreakerState = "closed"
+        self._failures_in_row = 0
+        self._opened_until = 0.0
+        self._trips_in_row = 0
+        self._trials = 0
+        self.trip_count = 0
+        self.rejected = 0
+
+    def admits(self, now: float | None = None) -> bool:
+        """
+        Whether a request may go to this upstream now (counts rejections).
+
+        Unlike allow(), takes no half-open trial slot: routing decisions use
+        this, and each attempt takes its slot with allow() right before it is
+        sent, so a request that never reaches the upstream holds none.
+        """
+        if self._available(now):
+            return True
+        self.rejected += 1
+        return False
+
+    def allow(self, now: float | None = None) -> bool:
+        """
+        Admit one attempt (counts rejections); while half-open this takes a
+        trial slot, given back by the attempt's record() or cancelled().
+        """
+        if not self._available(now):
+            self.rejected += 1
+            return False
+        if self.state == "half_open":
+            self._trials += 1
+        return True
+
+    def _available(self, now: float | None) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic() if now is None else now
+        if self.state == "open":
+            if now < self._opened_until:
+                return False
+            self.state = "half_open"
+            self._trials = 0
+            logger.info(f"circuit_breaker_half_open upstream={self.name}")
+        return self._trials < self.half_open_requests
+
+    def retry_after(self, now: float | None = None) -> int:
+        """Whole seconds until the breaker lets a trial request through."""
+        now = time.monotonic() if now is None else now
+        return max(1, math.ceil(self._opened_until - now))
+
+    def record(self, failure: bool, now: float | None = None, transport: bool = True) -> None:
+        """
+        Record the outcome of one upstream attempt.
+
+        Args:
+            failure: Whether the attempt failed (see is_breaker_failure)
+            now: time.monotonic() of the outcome
+            transport: Whether a failure was a transport error or timeout; only
+                       those count toward the consecutive_failures streak
+        """
+        now = time.monotonic() if now is None else now
+        if self.state == "open":
+            # Stragglers admitted before the trip don't move an open breaker
+            return
+        if self.state == "half_open":
+            self._trials = max(0, self._trials - 1)
+            if failure:
+                self._open(now, cause="half_open_failure")
+            else:
+                self._close()
+            return
+
+        self._window.record(0.0, failure, now)
+        if not failure:
+            self._failures_in_row = 0
+            self._trips_in_row = 0
+            return
+        if transport:
+            self._failures_in_row += 1
+        if self._failures_in_row >= self.consecutive_failures:
+            self._open(now, cause="consecutive_failures")
+            return
+        requests, failures = self._window.totals(now)
+        if requests >= self.min_requests and failures / requests >= self.failure_rate:
+            self._open(now, cause="failure_rate")
+
+    def cancelled(self) -> None:
+        """An admitted attempt ended without an outcome (e.g. the client went away)."""
+        if self.state == "half_open":
+            self._trials = max(0, self._trials - 1)
+
+    def _open(self, now: float, cause: str) -> None:
+        self._trips_in_row += 1
+        multiplier = min(2 ** (self._trips_in_row - 1), _MAX_OPEN_MULTIPLIER)
+        duration = self.open_seconds * multiplier
+        self.state = "open"
+        self._opened_until = now + duration
+        self._failures_in_row = 0
+        self.trip_count += 1
+        logger.warning(
+            f"circuit_breaker_opened upstream={self.name} cause={cause} "
+            f"open_seconds={duration} window={self._window.totals(now)}"
+        )
+
+    def _close(self) -> None:
+        self.state = "closed"
+        self._failures_in_row = 0
+        self._window = SlidingWindow(self._window.window_seconds, slots=self._window.slots)
+        logger.info(f"circuit_breaker_closed upstream={self.name}")
+
+    def status(self) -> dict:
+        """State, window totals and trip counters (for /debug/proxy/breakers)."""
+        now = time.monotonic()
+        requests, failures = self._window.totals(now)
+        return {
+            "state": self.state,
+            "open_for_seconds": round(max(0.0, self._opened_until - now), 1)
+            if self.state == "open"
+            else 0.0,
+            "window_requests": requests,
+            "window_failures": failures,
+            "consecutive_failures": self._failures_in_row,
+            "trip_count": self.trip_count,
+            "rejected": self.rejected,
+        }
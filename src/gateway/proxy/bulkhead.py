@@ -0,0 +1,112 @@
+"""Bulkheads: route groups isolated on their own connection pools and concurrency caps."""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+import httpx
+
+from gateway.proxy.metrics import CounterSet
+from gateway.proxy.policy import BulkheadSpec
+from gateway.proxy.pool import build_upstream_client
+
+
+class Bulkhead:
+    """
+    One route group's httpx client plus its concurrency cap.
+
+    The client has its own pool, so a slow upstream behaviour on this group
+    can only exhaust this group's connections. With ``max_concurrency``, a
+    request beyond the cap is rejected at once instead of queueing for a
+    connection. A request holds its slot until its body has been relayed.
+    """
+
+    def __init__(self, spec: BulkheadSpec, timeout: httpx.Timeout):
+        """
+        Args:
+            spec: The group's definition (from proxy_policy.json)
+            timeout: Proxy-wide timeouts; the spec may override each of them
+        """
+        self.spec = spec
+        self.name = spec.name
+        self.timeout = httpx.Timeout(
+            connect=spec.connect_timeout if spec.connect_timeout is not None else timeout.connect,
+            read=spec.read_timeout if spec.read_timeout is not None else timeout.read,
+            write=spec.write_timeout if spec.write_timeout is not None else timeout.write,
+            pool=spec.pool_timeout if spec.pool_timeout is not None else timeout.pool,
+        )
+        self.client, self.pool = build_upstream_client(
+            f"bulkhead:{spec.name}",
+            self.timeout,
+            httpx.Limits(
+                max_connections=spec.max_connections,
+                max_keepalive_connections=spec.max_keepalive_connections,
+                keepalive_expiry=spec.keepalive_expiry,
+            ),
+        )
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.counters = CounterSet()
+
+    def try_acquire(self) -> bool:
+        """Take a slot; False (counted) when the group is at max_concurrency."""
+        if self.spec.max_concurrency and self.in_flight >= self.spec.max_concurrency:
+            self.counters.inc("rejected")
+            return False
+        self.in_flight += 1
+        if self.in_flight > self.peak_in_flight:
+            self.peak_in_flight = self.in_flight
+        self.counters.inc("requests")
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    def status(self) -> dict:
+        """Usage against the caps, for sizing (for /debug/proxy/bulkheads)."""
+        cap = self.spec.max_concurrency or self.spec.max_connections
+        return {
+            "tags": sorted(self.spec.tags),
+            "path_prefixes": list(self.spec.path_prefixes),
+            "max_concurrency": self.spec.max_concurrency,
+            "timeout": {
+                "connect": self.timeout.connect,
+                "read": self.timeout.read,
+                "write": self.timeout.write,
+                "pool": self.timeout.pool,
+            },
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": round(self.in_flight / cap, 3),
+            "peak_saturation": round(self.peak_in_flight / cap, 3),
+            **self.counters.snapshot(),
+            "pool": self.pool.status(),
+        }
+
+
+class Bulkheads:
+    """Configured bulkheads in order; requests matching none use the shared client."""
+
+    def __init__(self, specs: Iterable[BulkheadSpec] = (), timeout: httpx.Timeout | None = None):
+        timeout = timeout or httpx.Timeout(30.0)
+        self.bulkheads = [Bulkhead(spec, timeout) for spec in specs]
+
+    def __len__(self) -> int:
+        return len(self.bulkheads)
+
+    def match(self, tags: Iterable[str], path: str) -> Bulkhead | None:
+        """First bulkhead covering the route's tags or the path, else None."""
+        if not self.bulkheads:
+            return None
+        tags = tuple(tags)
+        for bulkhead in self.bulkheads:
+            if bulkhead.spec.matches(tags, path):
+                return bulkhead
+        return None
+
+    async def aclose(self) -> None:
+        for bulkhead in self.bulkheads:
+            await bulkhead.client.aclose()
+
+    def status(self) -> dict:
+        return {bulkhead.name: bulkhead.status() for bulkhead in self.bulkheads}
@@ -0,0 +1,294 @@
+"""In-memory TTL/LRU cache for idempotent proxied GET responses."""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+from urllib.parse import parse_qsl, urlencode
+
+from gateway.proxy.headers import RawHeaders
+from gateway.proxy.metrics import CounterSet
+
+_MULTI_SLASH = re.compile(r"/{2,}")
+
+# Per-request ids must never be replayed from cache; the current request's id is substituted
+_REQUEST_ID_HEADERS = frozenset({b"request-id", b"x-request-id"})
+
+# Request headers that carry caller credentials: bearer tokens, partner
+# access tokens (see UPSTREAM_EXPECTATIONS.md) and session cookies
+CREDENTIAL_HEADERS = (b"authorization", b"access_token", b"cookie")
+
+# Rough per-entry overhead (key, headers list, bookkeeping) counted against max_bytes
+_ENTRY_OVERHEAD = 256
+
+
+def request_credentials(raw_headers: Iterable[tuple[bytes, bytes]]) -> bytes | None:
+    """Every CREDENTIAL_HEADERS value of a request, as one canonical value (None without any)."""
+    found = sorted((name, value) for name, value in raw_headers if name in CREDENTIAL_HEADERS)
+    if not found:
+        return None
+    return b"\n".join(name + b":" + value for name, value in found)
+
+
+def request_accept_encoding(raw_headers: Iterable[tuple[bytes, bytes]]) -> str:
+    """The request's Accept-Encoding, normalized: lowercased, unspaced, codings sorted."""
+    value = _header(raw_headers, b"accept-encoding")
+    if not value:
+        return "-"
+    codings = {part.replace(b" ", b"").lower() for part in value.split(b",")}
+    return b",".join(sorted(codings - {b""})).decode("latin-1") or "-"
+
+
+def cache_key(
+    upstream: str,
+    path: str,
+    query_string: str,
+    credentials: bytes | None,
+    accept_encoding: str = "-",
+) -> str:
+    """
+    Cache key for a GET: upstream + normalized path + sorted query + credentials
+    + Accept-Encoding.
+
+    The credential part is a hash of the full credential values
+    (request_credentials(): Authorization, access_token and Cookie) - not an
+    unverified JWT subject - so a response is only ever replayed to a caller
+    presenting the exact same credentials. Accept-Encoding is forwarded
+    upstream, so it can select the body's content coding even when the
+    upstream sends no ``Vary: Accept-Encoding``.
+    """
+    path = _MULTI_SLASH.sub("/", path)
+    if query_string:
+        query_string = urlencode(sorted(parse_qsl(query_string, keep_blank_values=True)))
+    subject = hashlib.sha256(credentials).hexdigest()[:32] if credentials else "-"
+    return f"{upstream} {path}?{query_string} {subject} {accept_encoding}"
+
+
+def _directives(value: bytes | None) -> dict[str, str | None]:
+    """Parse a Cache-Control header value into {directive: argument}."""
+    if not value:
+        return {}
+    out: dict[str, str | None] = {}
+    for part in value.decode("latin-1").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            out[name.lower()] = arg.strip('"') or None
+    return out
+
+
+def _header(headers: Iterable[tuple[bytes, bytes]], name: bytes) -> bytes | None:
+    values = [value for key, value in headers if key == name]
+    return b", ".join(values) if values else None
+
+
+def request_allows_cache(raw_headers: Iterable[tuple[bytes, bytes]]) -> bool:
+    """False when the client asked to bypass caches (no-cache / no-store / Pragma: no-cache)."""
+    raw_headers = list(raw_headers)
+    directives = _directives(_header(raw_headers, b"cache-control"))
+    if "no-cache" in directives or "no-store" in directives or directives.get("max-age") == "0":
+        return False
+    pragma = _header(raw_headers, b"pragma")
+    return not (pragma and b"no-cache" in pragma.lower())
+
+
+def response_ttl(status_code: int, headers: RawHeaders, route_ttl: float) -> float:
+    """
+    Seconds the response may be cached (0 = not cacheable).
+
+    Upstream Cache-Control can only shorten the route TTL, never extend it:
+    no-store/no-cache/private disable caching, s-maxage/max-age cap it.
+    Responses with Set-Cookie or ``Vary: *`` are never cached.
+    """
+    if status_code != 200 or route_ttl <= 0:
+        return 0.0
+    if _header(headers, b"set-cookie") is not None:
+        return 0.0
+    vary = _header(headers, b"vary")
+    if vary is not None and b"*" in vary:
+        return 0.0
+    directives = _directives(_header(headers, b"cache-control"))
+    if "no-store" in directives or "no-cache" in directives or "private" in directives:
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return max(0.0, min(route_ttl, float(directives[name] or 0)))
+            except ValueError:
+                return 0.0
+    return route_ttl
+
+
+def vary_names(headers: RawHeaders) -> tuple[bytes, ...]:
+    """Lowercased request header names listed in the response's Vary."""
+    vary = _header(headers, b"vary")
+    if not vary:
+        return ()
+    return tuple(sorted({name.strip().lower() for name in vary.split(b",") if name.strip()}))
+
+
+def vary_values(
+    raw_headers: Iterable[tuple[bytes, bytes]], names: tuple[bytes, ...]
+) -> tuple[bytes | None, ...]:
+    if not names:
+        return ()
+    raw_headers = list(raw_headers)
+    return tuple(_header(raw_headers, name) for name in names)
+
+
+@dataclass(slots=True)
+class CachedResponse:
+    """A stored upstream response."""
+
+    status_code: int
+    headers: RawHeaders
+    body: bytes
+    stored_at: float
+    expires_at: float
+    vary: tuple[bytes, ...] = ()
+    vary_values: tuple[bytes | None, ...] = ()
+    # Which request-id headers the upstream sent (re-added with the current id on replay)
+    request_id_headers: tuple[bytes, ...] = ()
+
+    @classmethod
+    def build(
+        cls,
+        status_code: int,
+        headers: RawHeaders,
+        body: bytes,
+        now: float,
+        ttl: float = 0.0,
+        request_headers: Iterable[tuple[bytes, bytes]] = (),
+    ) -> CachedResponse:
+        """Snapshot an upstream response; request-id headers are stripped for replay."""
+        names = vary_names(headers)
+        return cls(
+            status_code=status_code,
+            headers=[(k, v) for k, v in headers if k not in _REQUEST_ID_HEADERS],
+            body=body,
+            stored_at=now,
+            expires_at=now + ttl,
+            vary=names,
+            vary_values=vary_values(request_headers, names),
+            request_id_headers=tuple(k for k, _ in headers if k in _REQUEST_ID_HEADERS),
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers) + _ENTRY_OVERHEAD
+
+    def response_headers(self, request_id: str, now: float | None = None) -> RawHeaders:
+        """Headers to replay for request_id; with ``now``, an Age header is added."""
+        headers = list(self.headers)
+        if now is not None:
+            headers.append((b"age", str(int(now - self.stored_at)).encode("latin-1")))
+        for name in self.request_id_headers:
+            headers.append((name, request_id.encode("latin-1")))
+        return headers
+
+
+class ResponseCache:
+    """
+    Byte-bounded LRU of GET responses with per-entry expiry.
+
+    Entries are evicted least-recently-used first once the total size would
+    exceed ``max_bytes``. Expired entries are dropped when looked up. The cache
+    is per worker process; all access happens on the event loop.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int = 1024 * 1024):
+        """
+        Args:
+            max_bytes: Total budget for cached bodies and headers
+            max_entry_bytes: Responses larger than this are not cached
+        """
+        if max_bytes <= 0:
+            raise ValueError(f"Invalid PROXY_CACHE_MAX_BYTES: {max_bytes}")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.counters = CounterSet()
+        # route policy name -> hits/misses
+        self.routes: dict[str, CounterSet] = {}
+        self.bytes_used = 0
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        key: str,
+        raw_headers: Iterable[tuple[bytes, bytes]],
+        route: str,
+        now: float | None = None,
+    ) -> CachedResponse | None:
+        """Fresh entry for key whose Vary headers match this request, else None (a miss)."""
+        now = time.time() if now is None else now
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            self.counters.inc("expired")
+            entry = None
+        if entry is not None and entry.vary:
+            if vary_values(raw_headers, entry.vary) != entry.vary_values:
+                entry = None
+        route_counters = self.routes.get(route)
+        if route_counters is None:
+            route_counters = self.routes[route] = CounterSet()
+        if entry is None:
+            self.counters.inc("misses")
+            route_counters.inc("misses")
+            return None
+        self._entries.move_to_end(key)
+        self.counters.inc("hits")
+        route_counters.inc("hits")
+        return entry
+
+    def put(
+        self,
+        key: str,
+        status_code: int,
+        headers: RawHeaders,
+        body: bytes,
+        ttl: float,
+        request_headers: Iterable[tuple[bytes, bytes]],
+        now: float | None = None,
+    ) -> bool:
+        """Store a response (replacing any previous variant). Returns False if it doesn't fit."""
+        now = time.time() if now is None else now
+        entry = CachedResponse.build(status_code, headers, body, now, ttl, request_headers)
+        size = entry.size
+        if size > self.max_entry_bytes:
+            self.counters.inc("too_large")
+            return False
+        self._remove(key)
+        while self._entries and self.bytes_used + size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.counters.inc("evictions")
+        self._entries[key] = entry
+        self.bytes_used += size
+        self.counters.inc("stores")
+        return True
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry.size
+
+    def status(self) -> dict:
+        """Size and hit/miss counters (for /debug/proxy/cache)."""
+        counters = self.counters.snapshot()
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "entries": len(self._entries),
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "max_entry_bytes": self.max_entry_bytes,
+            "hit_ratio": round(counters.get("hits", 0) / lookups, 4) if lookups else None,
+            **counters,
+            "routes": {route: c.snapshot() for route, c in self.routes.items()},
+        }
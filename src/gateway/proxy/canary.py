@@ -2,18 +2,77 @@
 
 from __future__ import annotations
 
+import base64
+import hashlib
 import json
 import logging
 import os
 import random
 import re
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Literal
 
+from gateway.proxy.rollback import CanaryHealth, RollbackPolicy
+
 logger = logging.getLogger(__name__)
 
 
+# Sticky assignment resolution: 0.01% of traffic per bucket
+STICKY_BUCKETS = 10_000
+
+STICKY_KEYS = frozenset({"partner", "request_id", "auth_subject"})
+_PATH_KEY_PREFIX = "path:"
+
+
+def sticky_bucket(salt: str, key: str) -> int:
+    """
+    Map a subject key to a stable bucket in [0, STICKY_BUCKETS).
+
+    Uses blake2b rather than hash() so every worker and every restart agrees.
+    """
+    digest = hashlib.blake2b(f"{salt}\x00{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % STICKY_BUCKETS
+
+
+def _jwt_subject(token: str) -> str | None:
+    """Unverified 'sub' claim of a JWT - only used to pick a bucket, never to authorize."""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    payload = parts[1]
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (ValueError, TypeError):
+        return None
+    sub = claims.get("sub") if isinstance(claims, dict) else None
+    return str(sub) if sub else None
+
+
+@dataclass(slots=True)
+class CanarySubject:
+    """Per-request values a sticky rule can hash on."""
+
+    request_id: str | None = None
+    authorization: bytes | None = None
+
+    def auth_subject(self) -> str | None:
+        """JWT 'sub' of a bearer token, else the raw Authorization credentials."""
+        if not self.authorization:
+            return None
+        value = self.authorization.decode("latin-1").strip()
+        scheme, _, credentials = value.partition(" ")
+        if scheme.lower() == "bearer" and credentials:
+            return _jwt_subject(credentials.strip()) or credentials.strip()
+        return value
+
+
+def _is_regex_pattern(pattern: str) -> bool:
+    """Endpoint patterns starting with ^ or containing .* are regexes, others are prefixes."""
+    return pattern.startswith("^") or ".*" in pattern
+
+
 @dataclass
 class CanaryRule:
     """A single canary routing rule."""
@@ -23,6 +82,80 @@ class CanaryRule:
     method: str | None = None
     percentage: int = 0
     # Note: require_idempotency removed - upstream has no idempotency mechanism
+    # Sticky bucketing: "partner", "request_id", "auth_subject" or "path:<regex group>".
+    # None keeps the per-request random roll.
+    sticky_key: str | None = None
+    # Hash salt; defaults to the rule identity. Changing it reshuffles subjects.
+    salt: str | None = None
+
+    # Compiled once from endpoint_pattern (None for prefix patterns)
+    _regex: re.Pattern[str] | None = field(default=None, init=False, repr=False, compare=False)
+    _invalid: bool = field(default=False, init=False, repr=False, compare=False)
+    _identity: str = field(default="", init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._identity = f"{self.partner or '*'}|{self.endpoint_pattern or '*'}|{self.method or '*'}"
+        if self.sticky_key is not None and not (
+            self.sticky_key in STICKY_KEYS or self.sticky_key.startswith(_PATH_KEY_PREFIX)
+        ):
+            raise ValueError(f"Invalid sticky_key: {self.sticky_key}")
+        if self.endpoint_pattern is not None and _is_regex_pattern(self.endpoint_pattern):
+            try:
+                self._regex = re.compile(self.endpoint_pattern)
+            except re.error:
+                logger.warning(f"Invalid regex pattern: {self.endpoint_pattern}")
+                self._invalid = True
+        if self.sticky_key is not None and self.sticky_key.startswith(_PATH_KEY_PREFIX):
+            group = self.sticky_key[len(_PATH_KEY_PREFIX):]
+            if self._regex is not None and group not in self._regex.groupindex:
+                raise ValueError(
+                    f"sticky_key {self.sticky_key} names no group in {self.endpoint_pattern}"
+                )
+            if self._regex is None and not self._invalid:
+                raise ValueError(f"sticky_key {self.sticky_key} requires a regex endpoint_pattern")
+
+    @property
+    def identity(self) -> str:
+        """What the rule matches (partner|pattern|method) - unchanged by percentage edits."""
+        return self._identity
+
+    @property
+    def hash_salt(self) -> str:
+        """Salt for sticky buckets - stable across percentage changes."""
+        if self.salt is not None:
+            return self.salt
+        return self._identity
+
+    def sticky_value(
+        self,
+        partner: str | None,
+        path: str,
+        subject: CanarySubject | None,
+    ) -> str | None:
+        """
+        Resolve this rule's sticky key for a request.
+
+        Returns None when the key is unavailable (e.g. no Authorization header),
+        in which case the caller falls back to a random roll.
+        """
+        key = self.sticky_key
+        if key == "partner":
+            return partner.lower() if partner else None
+        if key is not None and key.startswith(_PATH_KEY_PREFIX):
+            match = self._regex.search(path) if self._regex is not None else None
+            return match.group(key[len(_PATH_KEY_PREFIX):]) if match else None
+        if subject is None:
+            return None
+        if key == "request_id":
+            return subject.request_id
+        if key == "auth_subject":
+            return subject.auth_subject()
+        return None
+
+    @property
+    def is_regex(self) -> bool:
+        """Whether endpoint_pattern is matched as a regex (vs. a path prefix)."""
+        return self._regex is not None or self._invalid
 
     def matches(
         self,
@@ -54,38 +187,214 @@ class CanaryRule:
                 return False
 
         # Endpoint pattern match
-        if self.endpoint_pattern is not None:
-            # Support both prefix and regex patterns
-            if self.endpoint_pattern.startswith("^") or ".*" in self.endpoint_pattern:
-                # Regex pattern
-                try:
-                    pattern = re.compile(self.endpoint_pattern)
-                    if not pattern.search(path):
-                        return False
-                except re.error:
-                    logger.warning(f"Invalid regex pattern: {self.endpoint_pattern}")
-                    return False
-            else:
-                # Prefix pattern
-                if not path.startswith(self.endpoint_pattern):
-                    return False
-
-        return True
+        return self.matches_path(path)
+
+    def matches_path(self, path: str) -> bool:
+        """Check only the endpoint pattern (prefix or precompiled regex)."""
+        if self.endpoint_pattern is None:
+            return True
+        if self._invalid:
+            return False
+        if self._regex is not None:
+            return self._regex.search(path) is not None
+        return path.startswith(self.endpoint_pattern)
+
+
+class _PrefixTrie:
+    """Character trie of prefix patterns; walking a path yields every rule whose prefix it has."""
+
+    __slots__ = ("children", "rule_indexes")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _PrefixTrie] = {}
+        self.rule_indexes: list[int] = []
+
+    def insert(self, prefix: str, rule_index: int) -> None:
+        node = self
+        for char in prefix:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _PrefixTrie()
+            node = child
+        node.rule_indexes.append(rule_index)
+
+    def collect(self, path: str, out: list[int]) -> None:
+        node = self
+        out.extend(node.rule_indexes)
+        for char in path:
+            node = node.children.get(char)
+            if node is None:
+                return
+            out.extend(node.rule_indexes)
+
+
+class _RuleBucket:
+    """Rules sharing one (method, partner) key, split by pattern kind."""
+
+    __slots__ = ("trie", "regex_rules")
+
+    def __init__(self) -> None:
+        # Rules without a pattern live at the trie root (empty prefix)
+        self.trie = _PrefixTrie()
+        self.regex_rules: list[tuple[int, CanaryRule]] = []
+
+    def collect(self, path: str, out: list[int]) -> None:
+        self.trie.collect(path, out)
+        for rule_index, rule in self.regex_rules:
+            if rule.matches_path(path):
+                out.append(rule_index)
+
+
+_ANY = None  # wildcard key for rules without method/partner
+
+_BucketKey = tuple[str | None, str | None]
+
+
+def _compile_rule_index(rules: list[CanaryRule]) -> dict[_BucketKey, _RuleBucket]:
+    """
+    Index rules by (METHOD, lowercase partner), with None as the wildcard.
+
+    A request then only looks at (at most) four buckets - exact, any-partner,
+    any-method, any-any - and inside each bucket prefix rules cost one trie walk
+    over the path instead of one startswith per rule.
+    """
+    index: dict[_BucketKey, _RuleBucket] = {}
+    for rule_index, rule in enumerate(rules):
+        key = (
+            rule.method.upper() if rule.method is not None else _ANY,
+            rule.partner.lower() if rule.partner is not None else _ANY,
+        )
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index[key] = _RuleBucket()
+        if rule.is_regex:
+            bucket.regex_rules.append((rule_index, rule))
+        else:
+            bucket.trie.insert(rule.endpoint_pattern or "", rule_index)
+    return index
+
+
+@dataclass(frozen=True, slots=True)
+class CanaryDecision:
+    """Outcome of CanaryRouter.decide."""
+
+    use_canary: bool
+    reason: str
+    # Rule that decided (None when no rule was involved); upstream results are
+    # recorded against it for automatic rollback
+    rule: CanaryRule | None = None
+
+
+def _lookup(
+    index: dict[_BucketKey, _RuleBucket],
+    rules: list[CanaryRule],
+    partner: str | None,
+    path: str,
+    method: str,
+) -> list[CanaryRule]:
+    """Rules from a compiled index matching a request, in config order."""
+    method_key = method.upper()
+    partner_key = partner.lower() if partner is not None else None
+    keys: list[_BucketKey] = [(method_key, _ANY), (_ANY, _ANY)]
+    if partner_key is not None:
+        keys += [(method_key, partner_key), (_ANY, partner_key)]
+
+    rule_indexes: list[int] = []
+    for key in keys:
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.collect(path, rule_indexes)
+
+    if len(rule_indexes) > 1:
+        rule_indexes.sort()
+    return [rules[i] for i in rule_indexes]
 
 
 class CanaryRouter:
     """Router for canary traffic selection."""
 
-    def __init__(self, rules: list[CanaryRule], canary_enabled: bool = True):
+    def __init__(
+        self,
+        rules: list[CanaryRule],
+        canary_enabled: bool = True,
+        version: str | None = None,
+        shadow_rules: list[CanaryRule] | None = None,
+        rollback: RollbackPolicy | None = None,
+    ):
         """
         Initialize canary router.
 
+        Rules are compiled into an index once, here; should_use_canary never
+        compiles patterns or scans the full rule list. A router is never mutated
+        after construction - reloads build a new one and swap the reference.
+
         Args:
             rules: List of canary rules
             canary_enabled: Whether canary routing is enabled
+            version: Identifier of the config the rules came from (content hash)
+            shadow_rules: Rules selecting requests to mirror to canary (any method);
+                          percentage is the share of matching requests mirrored
+            rollback: Thresholds for automatically pulling back unhealthy rules
+                      (None = percentages are static)
         """
         self.rules = rules
         self.canary_enabled = canary_enabled
+        self.version = version
+        self.shadow_rules = shadow_rules or []
+        self._index = _compile_rule_index(rules)
+        self._shadow_index = _compile_rule_index(self.shadow_rules)
+        self.health = CanaryHealth(rollback) if rollback is not None else None
+
+    def adopt_state(self, previous: CanaryRouter) -> None:
+        """Keep rollback windows/trips of the router this one replaces on reload."""
+        if self.health is not None:
+            self.health.adopt(previous.health)
+
+    def record_outcome(
+        self, decision: CanaryDecision, status_code: int, latency_ms: float
+    ) -> None:
+        """Feed an upstream result into the deciding rule's rollback windows."""
+        if self.health is not None and decision.rule is not None:
+            self.health.record(
+                decision.rule.identity,
+                decision.use_canary,
+                status_code,
+                latency_ms,
+                time.monotonic(),
+            )
+
+    def matching_rules(self, partner: str | None, path: str, method: str) -> list[CanaryRule]:
+        """
+        Return the rules matching a request, in config order.
+
+        Args:
+            partner: Partner ID from URL path or None
+            path: Request path
+            method: HTTP method
+
+        Returns:
+            Matching rules (first configured rule first)
+        """
+        return _lookup(self._index, self.rules, partner, path, method)
+
+    def shadow_rule(self, partner: str | None, path: str, method: str) -> CanaryRule | None:
+        """
+        Pick the shadow rule that mirrors this request, if any.
+
+        Unlike should_use_canary this applies to every method: the primary
+        request still goes to legacy, canary only sees a discarded copy.
+
+        Returns:
+            First matching shadow rule whose percentage roll succeeds, else None
+        """
+        if not self.canary_enabled or not self.shadow_rules:
+            return None
+        for rule in _lookup(self._shadow_index, self.shadow_rules, partner, path, method):
+            if rule.percentage >= 100 or (
+                rule.percentage > 0 and random.randint(1, 100) <= rule.percentage
+            ):
+                return rule
+        return None
 
     def should_use_canary(
         self,
@@ -93,24 +402,52 @@ class CanaryRouter:
         path: str,
         method: str,
         has_idempotency_key: bool = False,
+        subject: CanarySubject | None = None,
     ) -> tuple[bool, str]:
         """
         Determine if request should go to canary upstream.
+
+        Tuple form of decide(), see there.
+
+        Returns:
+            Tuple of (use_canary, reason)
+        """
+        decision = self.decide(partner, path, method, has_idempotency_key, subject)
+        return decision.use_canary, decision.reason
+
+    def decide(
+        self,
+        partner: str | None,
+        path: str,
+        method: str,
+        has_idempotency_key: bool = False,
+        subject: CanarySubject | None = None,
+    ) -> CanaryDecision:
+        """
+        Determine if request should go to canary upstream.
         
         SAFETY: Upstream has NO idempotency mechanism (per UPSTREAM_EXPECTATIONS.md).
         Therefore, canary routing for POST/PUT/PATCH/DELETE is BLOCKED.
 
+        Rules with a sticky_key hash that key into a fixed bucket, so the same
+        subject always gets the same answer and raising a rule's percentage only
+        adds subjects to canary (nobody already on canary moves back).
+
+        With a rollback policy, a rule that tripped is skipped ("rollback:<cause>")
+        or throttled ("rollback_throttle:<cause>:<p>%") until its cooldown ends.
+
         Args:
             partner: Partner ID from URL path or None
             path: Request path
             method: HTTP method
             has_idempotency_key: Ignored (upstream has no idempotency mechanism)
+            subject: Request values for sticky rules (request id, Authorization)
 
         Returns:
-            Tuple of (use_canary, reason)
+            CanaryDecision (use_canary, reason, deciding rule)
         """
         if not self.canary_enabled:
-            return False, "canary_disabled"
+            return CanaryDecision(False, "canary_disabled")
 
         # Safety: Upstream has NO idempotency mechanism
         # BLOCK canary routing for all non-idempotent methods
@@ -118,30 +455,68 @@ class CanaryRouter:
         
         if not is_idempotent_method:
             # Upstream has no idempotency mechanism - BLOCK canary for POST/PUT/PATCH/DELETE
-            return False, "non_get_blocked_no_idempotency"
+            return CanaryDecision(False, "non_get_blocked_no_idempotency")
 
-        # For GET/HEAD only: find matching rules
-        matching_rules = [
-            rule
-            for rule in self.rules
-            if rule.matches(partner, path, method, has_idempotency_key=False)
-        ]
+        # For GET/HEAD only: find matching rules (indexed lookup, config order)
+        matching_rules = self.matching_rules(partner, path, method)
 
         if not matching_rules:
-            return False, "no_matching_rule"
+            return CanaryDecision(False, "no_matching_rule")
+
+        now = time.monotonic() if self.health is not None else 0.0
+        # Legacy decision to report if no rule picks canary
+        fallback: CanaryDecision | None = None
 
         # For GET/HEAD: apply percentage if specified
         for rule in matching_rules:
+            trip = self.health.trip_for(rule.identity, now) if self.health is not None else None
+            if trip is not None:
+                if trip.action == "disable" or trip.throttle_percentage == 0:
+                    fallback = fallback or CanaryDecision(False, f"rollback:{trip.cause}", rule)
+                    continue
+                # Explicit rules (percentage 0) mean 100%
+                percentage = min(rule.percentage or 100, trip.throttle_percentage)
+                reason = f"rollback_throttle:{trip.cause}:{percentage}%"
+                if self._roll(rule, percentage, partner, path, subject)[0]:
+                    return CanaryDecision(True, reason, rule)
+                fallback = fallback or CanaryDecision(False, reason, rule)
+                continue
+
             if rule.percentage > 0:
-                # Apply percentage-based routing
-                roll = random.randint(1, 100)
-                if roll <= rule.percentage:
-                    return True, f"percentage:{rule.percentage}%"
+                selected, sticky = self._roll(rule, rule.percentage, partner, path, subject)
+                if selected and sticky:
+                    return CanaryDecision(True, f"sticky:{rule.sticky_key}:{rule.percentage}%", rule)
+                if selected:
+                    return CanaryDecision(True, f"percentage:{rule.percentage}%", rule)
             elif rule.percentage == 0:
                 # Explicit rule without percentage = always route
-                return True, f"explicit_rule:{rule.partner or 'any'}"
+                return CanaryDecision(True, f"explicit_rule:{rule.partner or 'any'}", rule)
+            fallback = fallback or CanaryDecision(False, "percentage_not_met", rule)
 
-        return False, "percentage_not_met"
+        return fallback or CanaryDecision(False, "percentage_not_met")
+
+    @staticmethod
+    def _roll(
+        rule: CanaryRule,
+        percentage: int,
+        partner: str | None,
+        path: str,
+        subject: CanarySubject | None,
+    ) -> tuple[bool, bool]:
+        """
+        Sticky bucket check when the rule's key resolves, otherwise a random roll.
+
+        Returns:
+            Tuple of (selected, decided_by_sticky_bucket)
+        """
+        if rule.sticky_key is not None:
+            sticky_value = rule.sticky_value(partner, path, subject)
+            if sticky_value is not None:
+                # Bucket < threshold: monotonic in percentage, so ramps never reshuffle
+                bucket = sticky_bucket(rule.hash_salt, sticky_value)
+                return bucket < percentage * (STICKY_BUCKETS // 100), True
+        # Apply percentage-based routing
+        return random.randint(1, 100) <= percentage, False
 
 
 def load_canary_config(config_path: str | None = None) -> CanaryRouter:
@@ -162,7 +537,8 @@ def load_canary_config(config_path: str | None = None) -> CanaryRouter:
                 "partner": "intuit",
                 "endpoint_pattern": "^/api/v1/.*",
                 "method": "GET",
-                "percentage": 5
+                "percentage": 5,
+                "sticky_key": "auth_subject"
             },
             {
                 "partner": "nav",
@@ -173,6 +549,16 @@ def load_canary_config(config_path: str | None = None) -> CanaryRouter:
         ]
     }
 
+    An optional "shadow_rules" list (same fields, "percentage" defaults to 100)
+    selects requests of ANY method to mirror to canary while legacy serves them.
+
+    An optional "rollback" object (see RollbackPolicy) enables automatic
+    rollback of rules whose canary error rate or p99 degrades against legacy.
+
+    A top-level "sticky_key" applies to every rule that does not set its own.
+    Sticky rules keep subjects in place while "percentage" is ramped, as long as
+    the rule's partner/endpoint_pattern/method (or explicit "salt") stay the same.
+
     Args:
         config_path: Path to config file. If None, uses CANARY_CONFIG_PATH env var
                      or defaults to "canary_config.json" in current directory.
@@ -190,26 +576,101 @@ def load_canary_config(config_path: str | None = None) -> CanaryRouter:
         return CanaryRouter(rules=[], canary_enabled=False)
 
     try:
-        with open(config_file, "r") as f:
-            config = json.load(f)
-
-        enabled = config.get("enabled", True)
-        rules_data = config.get("rules", [])
-
-        rules = []
-        for rule_data in rules_data:
-            # Ignore require_idempotency if present (upstream has no idempotency mechanism)
-            rule = CanaryRule(
-                partner=rule_data.get("partner"),
-                endpoint_pattern=rule_data.get("endpoint_pattern"),
-                method=rule_data.get("method"),
-                percentage=rule_data.get("percentage", 0),
-            )
-            rules.append(rule)
-
-        logger.info(f"Loaded canary config: {config_path} rules_count={len(rules)}")
-        return CanaryRouter(rules=rules, canary_enabled=enabled)
+        router = parse_canary_config(config_file.read_bytes())
+        logger.info(
+            f"Loaded canary config: {config_path} rules_count={len(router.rules)} "
+            f"version={router.version}"
+        )
+        return router
 
     except Exception as e:
         logger.error(f"Failed to load canary config: {config_path} error={str(e)}")
         return CanaryRouter(rules=[], canary_enabled=False)
+
+
+def config_version(raw: bytes) -> str:
+    """Short content hash identifying a canary config file."""
+    return hashlib.sha256(raw).hexdigest()[:12]
+
+
+def parse_canary_config(raw: bytes) -> CanaryRouter:
+    """
+    Validate and compile canary config file contents (see load_canary_config).
+
+    Strict: any malformed rule, out-of-range percentage or invalid regex rejects
+    the whole config, so a bad edit can never partially apply.
+
+    Args:
+        raw: Config file contents (JSON)
+
+    Returns:
+        CanaryRouter with version set to the content hash
+
+    Raises:
+        ValueError: If the config is invalid
+    """
+    config = json.loads(raw)
+    if not isinstance(config, dict):
+        raise ValueError("Canary config must be a JSON object")
+
+    enabled = config.get("enabled", True)
+    rules_data = config.get("rules", [])
+    default_sticky_key = config.get("sticky_key")
+    if not isinstance(enabled, bool):
+        raise ValueError(f"Invalid enabled: {enabled!r}")
+    if not isinstance(rules_data, list):
+        raise ValueError("Canary config 'rules' must be a list")
+
+    shadow_data = config.get("shadow_rules", [])
+    if not isinstance(shadow_data, list):
+        raise ValueError("Canary config 'shadow_rules' must be a list")
+
+    rules = [
+        _parse_rule(
+            rule_data,
+            f"Rule {position}",
+            default_percentage=0,
+            default_sticky_key=default_sticky_key,
+        )
+        for position, rule_data in enumerate(rules_data)
+    ]
+    shadow_rules = [
+        _parse_rule(rule_data, f"Shadow rule {position}", default_percentage=100)
+        for position, rule_data in enumerate(shadow_data)
+    ]
+
+    rollback_data = config.get("rollback")
+    rollback = RollbackPolicy.from_config(rollback_data) if rollback_data is not None else None
+
+    return CanaryRouter(
+        rules=rules,
+        canary_enabled=enabled,
+        version=config_version(raw),
+        shadow_rules=shadow_rules,
+        rollback=rollback,
+    )
+
+
+def _parse_rule(
+    rule_data: object,
+    label: str,
+    default_percentage: int,
+    default_sticky_key: str | None = None,
+) -> CanaryRule:
+    if not isinstance(rule_data, dict):
+        raise ValueError(f"{label} must be an object")
+    percentage = rule_data.get("percentage", default_percentage)
+    if not isinstance(percentage, int) or isinstance(percentage, bool) or not 0 <= percentage <= 100:
+        raise ValueError(f"{label}: invalid percentage {percentage!r}")
+    # Ignore require_idempotency if present (upstream has no idempotency mechanism)
+    rule = CanaryRule(
+        partner=rule_data.get("partner"),
+        endpoint_pattern=rule_data.get("endpoint_pattern"),
+        method=rule_data.get("method"),
+        percentage=percentage,
+        sticky_key=rule_data.get("sticky_key", default_sticky_key),
+        salt=rule_data.get("salt"),
+    )
+    if rule._invalid:
+        raise ValueError(f"{label}: invalid regex {rule.endpoint_pattern!r}")
+    return rule
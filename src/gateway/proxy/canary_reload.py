@@ -0,0 +1,199 @@
+"""Hot reload of the canary config file without restarting workers."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from dataclasses import dataclass
+
+from gateway.proxy.canary import CanaryRouter, load_canary_config, parse_canary_config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class _FileStamp:
+    """What we compare to notice a changed file (mtime alone misses same-second edits)."""
+
+    mtime_ns: int
+    size: int
+    inode: int
+
+
+def _stat(path: str) -> _FileStamp | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return _FileStamp(mtime_ns=st.st_mtime_ns, size=st.st_size, inode=st.st_ino)
+
+
+def _read_and_compile(path: str) -> tuple[CanaryRouter, _FileStamp | None]:
+    """Read, validate and compile the config. Runs in a worker thread."""
+    stamp = _stat(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    return parse_canary_config(raw), stamp
+
+
+class CanaryConfigReloader:
+    """
+    Owns the active CanaryRouter and replaces it when the config file changes.
+
+    Reload triggers:
+    - the file's mtime/size/inode changes (polled every ``poll_interval`` seconds)
+    - SIGHUP
+
+    Reading, JSON parsing, validation and rule-index compilation all happen in a
+    worker thread; the event loop only swaps one reference. Requests read
+    ``router`` once and keep using that instance, so in-flight decisions never
+    block and never see a half-applied config. A config that fails validation is
+    logged and ignored - the last good router stays active.
+    """
+
+    def __init__(self, config_path: str, poll_interval: float = 5.0):
+        """
+        Args:
+            config_path: Path to the canary config file
+            poll_interval: Seconds between mtime checks; 0 disables polling
+                           (SIGHUP still reloads)
+        """
+        if poll_interval < 0:
+            raise ValueError(f"Invalid CANARY_CONFIG_RELOAD_INTERVAL: {poll_interval}")
+        self.config_path = config_path
+        self.poll_interval = poll_interval
+
+        # Startup load keeps the historical lenient behaviour (missing/invalid -> disabled)
+        self._stamp = _stat(config_path)
+        self._router = load_canary_config(config_path)
+        self.loaded_at = time.time()
+        self.reload_count = 0
+        self.last_error: str | None = None
+        self.last_error_at: float | None = None
+
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # The loop only keeps weak references to tasks
+        self._sighup_tasks: set[asyncio.Task] = set()
+        self._sighup_installed = False
+
+    @property
+    def router(self) -> CanaryRouter:
+        """The active router (swapped atomically on reload)."""
+        return self._router
+
+    async def reload(self, force: bool = False) -> bool:
+        """
+        Reload the config if the file changed (or unconditionally with force).
+
+        Returns:
+            True if a new router was swapped in
+        """
+        async with self._lock:
+            stamp = await asyncio.to_thread(_stat, self.config_path)
+            if stamp is None:
+                if force or self._stamp is not None:
+                    self._record_error("config file not found")
+                self._stamp = None
+                return False
+            if not force and stamp == self._stamp:
+                return False
+
+            try:
+                router, stamp = await asyncio.to_thread(_read_and_compile, self.config_path)
+            except Exception as e:
+                # Remember the stamp so a broken file is reported once, not every poll
+                self._stamp = stamp
+                self._record_error(str(e))
+                return False
+
+            previous = self._router.version
+            router.adopt_state(self._router)
+            self._router = router
+            self._stamp = stamp
+            self.loaded_at = time.time()
+            self.reload_count += 1
+            self.last_error = None
+            self.last_error_at = None
+
+        logger.info(
+            f"canary_config_reloaded path={self.config_path} "
+            f"version={router.version} previous_version={previous} "
+            f"rules_count={len(router.rules)} enabled={router.canary_enabled}"
+        )
+        return True
+
+    def _record_error(self, error: str) -> None:
+        self.last_error = error
+        self.last_error_at = time.time()
+        logger.error(
+            f"canary_config_reload_failed path={self.config_path} error={error} "
+            f"active_version={self._router.version}"
+        )
+
+    def start(self) -> None:
+        """Start polling and install the SIGHUP handler (call from the running loop)."""
+        loop = asyncio.get_running_loop()
+        if not self._sighup_installed and hasattr(signal, "SIGHUP"):
+            try:
+                loop.add_signal_handler(signal.SIGHUP, self._on_sighup)
+                self._sighup_installed = True
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Not the main thread / unsupported platform - polling still works
+                logger.info("canary_config_sighup_unavailable")
+        if self.poll_interval > 0 and self._task is None:
+            self._task = loop.create_task(self._poll())
+
+    async def stop(self) -> None:
+        """Stop polling and remove the SIGHUP handler."""
+        if self._sighup_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._sighup_installed = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._sighup_tasks):
+            task.cancel()
+        await asyncio.gather(*self._sighup_tasks, return_exceptions=True)
+
+    def _on_sighup(self) -> None:
+        logger.info(f"canary_config_sighup path={self.config_path}")
+        task = asyncio.get_running_loop().create_task(self.reload(force=True))
+        self._sighup_tasks.add(task)
+        task.add_done_callback(self._sighup_done)
+
+    def _sighup_done(self, task: asyncio.Task) -> None:
+        self._sighup_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"canary_config_sighup_failed error={str(task.exception())}")
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reload()
+            except Exception as e:  # never let the watcher die
+                logger.error(f"canary_config_poll_failed error={str(e)}")
+
+    def status(self) -> dict:
+        """Active config version and reload state (for /debug/canary)."""
+        router = self._router
+        return {
+            "config_path": self.config_path,
+            "version": router.version,
+            "enabled": router.canary_enabled,
+            "rules_count": len(router.rules),
+            "loaded_at": self.loaded_at,
+            "reload_count": self.reload_count,
+            "poll_interval": self.poll_interval,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "rollback": router.health.status(time.monotonic()) if router.health else None,
+        }
@@ -4,11 +4,32 @@ from __future__ import annotations
 
 import os
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable
 
 import httpx
 
-from gateway.proxy.canary import CanaryRouter, load_canary_config
+from gateway.proxy.balancer import UpstreamPool, parse_upstream_urls
+from gateway.proxy.body import validate_body_mode
+from gateway.proxy.breaker import CircuitBreaker
+from gateway.proxy.bulkhead import Bulkheads
+from gateway.proxy.cache import ResponseCache
+from gateway.proxy.canary import CanaryRouter
+from gateway.proxy.canary_reload import CanaryConfigReloader
+from gateway.proxy.coalesce import Coalescer
+from gateway.proxy.compress import ResponseCompressor
+from gateway.proxy.deadline import (
+    DEFAULT_REQUEST_START_HEADER,
+    DEFAULT_TIMEOUT_HEADER,
+    DeadlinePolicy,
+)
+from gateway.proxy.disconnect import AbandonedRequests
+from gateway.proxy.fairqueue import FairQueue
+from gateway.proxy.limiter import AdaptiveLimiter
+from gateway.proxy.policy import load_route_policies
+from gateway.proxy.pool import InstrumentedTransport, build_upstream_client, pool_limits
+from gateway.proxy.retry import RetryBudget, RetryEngine
+from gateway.proxy.shadow import ShadowMirror
+from gateway.proxy.warmup import ConnectionWarmer, WarmTarget
 
 
 class ProxyClient:
@@ -24,12 +45,65 @@ class ProxyClient:
         read_timeout: float = 30.0,
         write_timeout: float = 10.0,
         pool_timeout: float = 5.0,
+        deadline_header: str = DEFAULT_TIMEOUT_HEADER,
+        request_start_header: str = DEFAULT_REQUEST_START_HEADER,
+        lb_timeout: float = 0.0,
+        pool_max_connections: int = 100,
+        pool_max_keepalive_connections: int = 20,
+        pool_keepalive_expiry: float = 5.0,
+        canary_pool_max_connections: int | None = None,
+        canary_pool_max_keepalive_connections: int | None = None,
+        canary_pool_keepalive_expiry: float | None = None,
+        warm_connections: int = 0,
+        warm_timeout: float = 5.0,
+        stream_chunk_size: int = 64 * 1024,
+        response_passthrough: bool = True,
+        compression_enabled: bool = False,
+        compression_min_size: int = 1024,
+        compression_level: int = 6,
+        compression_min_level: int = 1,
+        request_body_mode: str = "buffer",
+        cancel_on_disconnect: bool = True,
+        spool_max_memory: int = 1024 * 1024,
+        canary_reload_interval: float = 5.0,
+        shadow_queue_size: int = 1000,
+        shadow_workers: int = 4,
+        shadow_max_body_size: int = 1024 * 1024,
+        balancer_strategy: str = "least_outstanding",
+        outlier_consecutive_failures: int = 5,
+        outlier_ejection_seconds: float = 30.0,
+        probe_path: str = "/",
+        probe_interval: float = 5.0,
+        route_policy_path: str | None = None,
+        cache_max_bytes: int = 0,
+        cache_max_entry_bytes: int = 1024 * 1024,
+        coalesce_max_wait: float = 0.0,
+        coalesce_max_body_bytes: int = 1024 * 1024,
+        retry_budget_percent: float = 10.0,
+        retry_budget_min_per_second: float = 1.0,
+        breaker_enabled: bool = False,
+        breaker_failure_rate: float = 0.5,
+        breaker_min_requests: int = 20,
+        breaker_window_seconds: float = 10.0,
+        breaker_consecutive_failures: int = 5,
+        breaker_open_seconds: float = 30.0,
+        concurrency_limit_enabled: bool = False,
+        concurrency_limit_initial: int = 20,
+        concurrency_limit_min: int = 4,
+        concurrency_limit_max: int = 500,
+        concurrency_queue_size: int = 100,
+        concurrency_max_wait: float = 1.0,
+        fair_queue_threshold: int = 0,
+        fair_queue_size: int = 100,
+        fair_queue_max_wait: float = 5.0,
+        partner_weight: Callable[[str], float] | None = None,
     ):
         """
         Initialize proxy client.
 
         Args:
-            upstream_base_url: Base URL for legacy/current upstream API
+            upstream_base_url: Base URL for legacy/current upstream API; several
+                               comma-separated instances are balanced client-side
             upstream_canary_base_url: Optional base URL for canary upstream API
             canary_config_path: Path to canary config file (defaults to CANARY_CONFIG_PATH env var)
             debug_mode: Whether debug headers are enabled (defaults to GATEWAY_DEBUG_PROXY env var)
@@ -37,12 +111,92 @@ class ProxyClient:
             read_timeout: Read timeout in seconds
             write_timeout: Write timeout in seconds
             pool_timeout: Pool timeout in seconds
+            deadline_header: Inbound header with the caller's remaining budget in
+                             seconds; it caps upstream timeouts and is forwarded
+                             with what is left of it
+            request_start_header: Header in which the load balancer stamps when it
+                                  received the request
+            lb_timeout: Seconds the load balancer waits for a response; with a
+                        request start header this gives every request a deadline
+                        (0 = disabled)
+            pool_max_connections: Connection pool size for the legacy upstream
+            pool_max_keepalive_connections: Idle connections kept open for reuse
+            pool_keepalive_expiry: Seconds an idle connection is kept open
+            canary_pool_max_connections: With any canary_pool_* setting, the canary
+                                         upstream gets its own pool (else it shares
+                                         the legacy one); unset settings follow legacy
+            canary_pool_max_keepalive_connections: Idle canary connections kept open
+            canary_pool_keepalive_expiry: Seconds an idle canary connection is kept open
+            warm_connections: Connections opened to each upstream (every legacy
+                              instance and canary) before the worker reports
+                              ready, and kept open while idle (0 = disabled)
+            warm_timeout: Timeout of a single warming request (seconds)
+            stream_chunk_size: Max bytes buffered per response chunk while streaming
+                               the upstream body downstream
+            response_passthrough: Relay content-encoded (gzip, br, ...) upstream bodies
+                                  byte-for-byte; if False they are decoded and sent
+                                  without Content-Encoding/Content-Length
+            compression_enabled: gzip/deflate uncompressed text-like responses for
+                                 clients that accept it
+            compression_min_size: Smaller bodies (by Content-Length) are not compressed
+            compression_level: zlib level while the worker's CPU is not busy
+            compression_min_level: zlib level the CPU-adaptive level falls to under load
+            request_body_mode: Default request body forwarding mode: "buffer" (read fully),
+                               "stream" (pipe chunks upstream) or "spool" (replayable,
+                               spills to disk)
+            cancel_on_disconnect: Cancel the upstream call of a request whose client
+                                  disconnects before response headers arrive
+                                  (buffered and spooled bodies only)
+            spool_max_memory: Bytes of a spooled request body kept in memory before
+                              rolling over to a temporary file
+            canary_reload_interval: Seconds between canary config mtime checks once
+                                    start() has run (0 = reload on SIGHUP only)
+            shadow_queue_size: Max mirrored requests waiting for a shadow worker;
+                               beyond that shadow copies are dropped
+            shadow_workers: Concurrent shadow requests to the canary upstream
+            shadow_max_body_size: Larger request bodies are not mirrored
+            balancer_strategy: "least_outstanding" or "p2c" (power of two choices)
+            outlier_consecutive_failures: Connect errors/timeouts in a row that eject
+                                          an upstream instance
+            outlier_ejection_seconds: Base ejection time (doubles per repeat ejection)
+            probe_path: Path probed on an ejected instance before it is reinstated
+            probe_interval: Seconds between probes of ejected instances
+            route_policy_path: Path to the per-route policy file (defaults to
+                               PROXY_POLICY_PATH env var)
+            cache_max_bytes: Response cache budget in bytes (0 = cache disabled)
+            cache_max_entry_bytes: Responses larger than this are never cached
+            coalesce_max_wait: Seconds a duplicate GET/HEAD waits for an identical
+                               in-flight request (0 = coalescing disabled)
+            coalesce_max_body_bytes: Larger responses are not shared between
+                                     coalesced requests
+            retry_budget_percent: Retries and hedges allowed, as a percentage of
+                                  upstream requests (route policies opt in)
+            retry_budget_min_per_second: Retries/hedges allowed per second regardless
+            breaker_enabled: Whether legacy and canary get circuit breakers (opt-in)
+            breaker_failure_rate: Failure ratio (transport errors, 502/503/504) that
+                                  opens a breaker
+            breaker_min_requests: Results needed in the window before the rate counts
+            breaker_window_seconds: Sliding window for the failure rate
+            breaker_consecutive_failures: Transport failures in a row that open a breaker
+                                          outright
+            breaker_open_seconds: How long an open breaker fails fast (doubles per
+                                  repeated trip)
+            concurrency_limit_enabled: Whether upstream calls go through adaptive
+                                       concurrency limiters (one per upstream)
+            concurrency_limit_initial: Starting concurrency limit
+            concurrency_limit_min: Lowest the limit adapts down to
+            concurrency_limit_max: Highest the limit adapts up to
+            concurrency_queue_size: Requests allowed to wait for a slot
+            concurrency_max_wait: Longest a request waits for a slot before 503
+            fair_queue_threshold: Proxied requests in flight above which further
+                                  requests are queued per partner and served by
+                                  weighted round robin (0 = disabled)
+            fair_queue_size: Requests one partner may have waiting
+            fair_queue_max_wait: Longest a queued request waits before 503
+            partner_weight: Partner -> fair queuing weight (default: equal weights)
         """
         # Validate URLs with httpx.URL to fail fast with clear errors
-        try:
-            httpx.URL(upstream_base_url)
-        except Exception as e:
-            raise ValueError(f"Invalid UPSTREAM_BASE_URL: {upstream_base_url}") from e
+        upstream_base_urls = parse_upstream_urls(upstream_base_url)
         
         if upstream_canary_base_url:
             try:
@@ -50,40 +204,243 @@ class ProxyClient:
             except Exception as e:
                 raise ValueError(f"Invalid UPSTREAM_CANARY_BASE_URL: {upstream_canary_base_url}") from e
 
-        self.upstream_base_url = upstream_base_url.rstrip("/")
+        # First instance - what get_upstream_url returns for legacy
+        self.upstream_base_url = upstream_base_urls[0]
+        self.upstream_pool = UpstreamPool(
+            upstream_base_urls,
+            strategy=balancer_strategy,
+            consecutive_failures=outlier_consecutive_failures,
+            ejection_seconds=outlier_ejection_seconds,
+            probe_path=probe_path,
+            probe_interval=probe_interval,
+        )
         self.upstream_canary_base_url = (
             upstream_canary_base_url.rstrip("/") if upstream_canary_base_url else None
         )
 
-        # Load canary config once at initialization
+        # One breaker per upstream; legacy instances are also ejected individually
+        self.breakers: dict[str, CircuitBreaker] = {}
+        if breaker_enabled:
+            upstream_names = ["legacy", "canary"] if self.upstream_canary_base_url else ["legacy"]
+            for name in upstream_names:
+                self.breakers[name] = CircuitBreaker(
+                    name,
+                    failure_rate=breaker_failure_rate,
+                    min_requests=breaker_min_requests,
+                    window_seconds=breaker_window_seconds,
+                    consecutive_failures=breaker_consecutive_failures,
+                    open_seconds=breaker_open_seconds,
+                )
+
+        # Adaptive concurrency limit per upstream, in front of the httpx pool
+        self.limiters: dict[str, AdaptiveLimiter] = {}
+        if concurrency_limit_enabled:
+            upstream_names = ["legacy", "canary"] if self.upstream_canary_base_url else ["legacy"]
+            for name in upstream_names:
+                self.limiters[name] = AdaptiveLimiter(
+                    name,
+                    initial_limit=concurrency_limit_initial,
+                    min_limit=concurrency_limit_min,
+                    max_limit=concurrency_limit_max,
+                    queue_size=concurrency_queue_size,
+                    max_wait=concurrency_max_wait,
+                )
+
+        # Fair share of upstream capacity between partners, once it runs out
+        if fair_queue_threshold < 0:
+            raise ValueError(f"Invalid PROXY_FAIR_QUEUE_THRESHOLD: {fair_queue_threshold}")
+        self.fair_queue = (
+            FairQueue(
+                fair_queue_threshold,
+                queue_size=fair_queue_size,
+                max_wait=fair_queue_max_wait,
+                weight=partner_weight,
+            )
+            if fair_queue_threshold > 0
+            else None
+        )
+
+        # Load canary config at initialization; start() enables hot reload
         if canary_config_path is None:
             canary_config_path = os.getenv("CANARY_CONFIG_PATH", "canary_config.json")
-        self.canary_router = load_canary_config(canary_config_path)
+        self.canary_config = CanaryConfigReloader(
+            canary_config_path, poll_interval=canary_reload_interval
+        )
+
+        # Per-route policies; a route opts into response caching with cache_ttl
+        self.route_policies = load_route_policies(route_policy_path)
+        if cache_max_bytes < 0:
+            raise ValueError(f"Invalid PROXY_CACHE_MAX_BYTES: {cache_max_bytes}")
+        self.response_cache = (
+            ResponseCache(cache_max_bytes, max_entry_bytes=cache_max_entry_bytes)
+            if cache_max_bytes > 0
+            else None
+        )
+
+        self.retry_engine = RetryEngine(
+            RetryBudget(retry_budget_percent, min_per_second=retry_budget_min_per_second)
+        )
+        self.coalescer = (
+            Coalescer(coalesce_max_wait, max_body_bytes=coalesce_max_body_bytes)
+            if coalesce_max_wait > 0
+            else None
+        )
 
         # Compute debug mode once at initialization
         if debug_mode is None:
             debug_mode = os.getenv("GATEWAY_DEBUG_PROXY", "").lower() in {"1", "true", "yes"}
         self.debug_mode = debug_mode
 
-        # Create httpx client with explicit timeouts and no retries
-        self.client = httpx.AsyncClient(
-            timeout=httpx.Timeout(
-                connect=connect_timeout,
-                read=read_timeout,
-                write=write_timeout,
-                pool=pool_timeout,
+        if stream_chunk_size <= 0:
+            raise ValueError(f"Invalid PROXY_STREAM_CHUNK_SIZE: {stream_chunk_size}")
+        self.stream_chunk_size = stream_chunk_size
+        self.response_passthrough = response_passthrough
+        self.response_compressor = (
+            ResponseCompressor(
+                min_size=compression_min_size,
+                min_level=compression_min_level,
+                max_level=compression_level,
+            )
+            if compression_enabled
+            else None
+        )
+        self.request_body_mode = validate_body_mode(request_body_mode)
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.abandoned = AbandonedRequests()
+        self.spool_max_memory = spool_max_memory
+
+        # Caller deadlines (per-route timeouts are in route_policies)
+        self.deadlines = DeadlinePolicy(
+            timeout_header=deadline_header,
+            request_start_header=request_start_header,
+            lb_timeout=lb_timeout,
+        )
+
+        timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=write_timeout,
+            pool=pool_timeout,
+        )
+
+        # Create httpx client with explicit timeouts and no transport retries
+        # (retries and hedging are per route policy, see gateway.proxy.retry).
+        # Redirects are not followed - they are passed through.
+        self.client, legacy_pool = build_upstream_client(
+            "legacy",
+            timeout,
+            pool_limits(
+                pool_max_connections, pool_max_keepalive_connections, pool_keepalive_expiry,
+                "PROXY_POOL",
             ),
-            follow_redirects=False,  # Don't follow redirects, pass them through
         )
+        # upstream name -> instrumented pool (for /debug/proxy/pools)
+        self.pools: dict[str, InstrumentedTransport] = {"legacy": legacy_pool}
+        # Canary shares the legacy pool unless it has pool settings of its own
+        self.canary_client: httpx.AsyncClient | None = None
+        canary_pool_settings = (
+            canary_pool_max_connections,
+            canary_pool_max_keepalive_connections,
+            canary_pool_keepalive_expiry,
+        )
+        if self.upstream_canary_base_url and any(v is not None for v in canary_pool_settings):
+            self.canary_client, self.pools["canary"] = build_upstream_client(
+                "canary",
+                timeout,
+                pool_limits(
+                    canary_pool_max_connections
+                    if canary_pool_max_connections is not None
+                    else pool_max_connections,
+                    canary_pool_max_keepalive_connections
+                    if canary_pool_max_keepalive_connections is not None
+                    else pool_max_keepalive_connections,
+                    canary_pool_keepalive_expiry
+                    if canary_pool_keepalive_expiry is not None
+                    else pool_keepalive_expiry,
+                    "PROXY_CANARY_POOL",
+                ),
+            )
+
+        # Route groups with their own pools (proxy_policy.json "bulkheads");
+        # everything else shares self.client
+        self.bulkheads = Bulkheads(self.route_policies.bulkheads, timeout=timeout)
+        for bulkhead in self.bulkheads.bulkheads:
+            self.pools[f"bulkhead:{bulkhead.name}"] = bulkhead.pool
+
+        # Connections opened at startup and kept warm (HEAD probe_path)
+        if warm_connections < 0:
+            raise ValueError(f"Invalid PROXY_WARM_CONNECTIONS: {warm_connections}")
+        self.warmer: ConnectionWarmer | None = None
+        if warm_connections > 0:
+            targets = [
+                WarmTarget("legacy", instance.base_url, self.client, legacy_pool)
+                for instance in self.upstream_pool.instances
+            ]
+            if self.upstream_canary_base_url:
+                targets.append(
+                    WarmTarget(
+                        "canary",
+                        self.upstream_canary_base_url,
+                        self.canary_client or self.client,
+                        self.pools.get("canary", legacy_pool),
+                    )
+                )
+            self.warmer = ConnectionWarmer(
+                targets, warm_connections, path=probe_path, timeout=warm_timeout
+            )
+
+        # Shadow mirroring needs somewhere to mirror to
+        self.shadow_mirror = (
+            ShadowMirror(
+                self.upstream_canary_base_url,
+                queue_size=shadow_queue_size,
+                workers=shadow_workers,
+                max_body_size=shadow_max_body_size,
+                timeout=timeout,
+            )
+            if self.upstream_canary_base_url
+            else None
+        )
+
+    @property
+    def canary_router(self) -> CanaryRouter:
+        """Active canary router. Read it once per request - reloads swap it."""
+        return self.canary_config.router
+
+    def start(self) -> None:
+        """Start background tasks (config watcher, shadow workers) on the running loop."""
+        self.canary_config.start()
+        self.upstream_pool.start(self.client)
+        if self.shadow_mirror is not None:
+            self.shadow_mirror.start()
+        if self.warmer is not None:
+            self.warmer.start()
+
+    async def warm_up(self) -> None:
+        """Open the configured warm connections to every upstream (no-op when disabled)."""
+        if self.warmer is not None:
+            await self.warmer.warm()
 
     async def close(self) -> None:
-        """Close the httpx client."""
+        """Stop background tasks and close the httpx clients."""
+        await self.canary_config.stop()
+        await self.upstream_pool.stop()
+        if self.warmer is not None:
+            await self.warmer.stop()
+        if self.shadow_mirror is not None:
+            await self.shadow_mirror.stop()
+        await self.bulkheads.aclose()
+        if self.canary_client is not None:
+            await self.canary_client.aclose()
         await self.client.aclose()
 
     def get_upstream_url(self, path: str, use_canary: bool = False) -> str:
         """
         Get full upstream URL for a path.
 
+        With several legacy instances this returns the first one; requests pick
+        their instance through upstream_pool instead.
+
         Args:
             path: Request path (should start with /)
             use_canary: Whether to use canary upstream
@@ -108,6 +465,12 @@ def get_proxy_client() -> ProxyClient:
     return _proxy_client
 
 
+def _optional_env(parse: Callable[[str], object], name: str):
+    """Parsed env var, or None when it is unset or empty."""
+    value = os.getenv(name, "").strip()
+    return parse(value) if value else None
+
+
 def init_proxy_client() -> ProxyClient:
     """
     Initialize the global proxy client from environment variables.
@@ -117,6 +480,9 @@ def init_proxy_client() -> ProxyClient:
     """
     global _proxy_client
 
+    # Imported here: gateway.partners imports proxy helpers at module level
+    from gateway.partners.policies import POLICY_PROVIDER
+
     upstream_base_url = os.getenv("UPSTREAM_BASE_URL")
     if not upstream_base_url:
         raise ValueError("UPSTREAM_BASE_URL environment variable is required")
@@ -124,12 +490,125 @@ def init_proxy_client() -> ProxyClient:
     upstream_canary_base_url = os.getenv("UPSTREAM_CANARY_BASE_URL")
     canary_config_path = os.getenv("CANARY_CONFIG_PATH", "canary_config.json")
     debug_mode = os.getenv("GATEWAY_DEBUG_PROXY", "").lower() in {"1", "true", "yes"}
+    stream_chunk_size = int(os.getenv("PROXY_STREAM_CHUNK_SIZE", str(64 * 1024)))
+    response_passthrough = os.getenv(
+        "PROXY_RESPONSE_PASSTHROUGH", "true"
+    ).lower() in {"1", "true", "yes"}
+    compression_enabled = os.getenv(
+        "PROXY_COMPRESSION_ENABLED", ""
+    ).lower() in {"1", "true", "yes"}
+    compression_min_size = int(os.getenv("PROXY_COMPRESSION_MIN_SIZE", "1024"))
+    compression_level = int(os.getenv("PROXY_COMPRESSION_LEVEL", "6"))
+    compression_min_level = int(os.getenv("PROXY_COMPRESSION_MIN_LEVEL", "1"))
+    request_body_mode = os.getenv("PROXY_REQUEST_BODY_MODE", "buffer").lower()
+    cancel_on_disconnect = os.getenv(
+        "PROXY_CANCEL_ON_DISCONNECT", "true"
+    ).lower() in {"1", "true", "yes"}
+    spool_max_memory = int(os.getenv("PROXY_REQUEST_SPOOL_MAX_MEMORY", str(1024 * 1024)))
+    canary_reload_interval = float(os.getenv("CANARY_CONFIG_RELOAD_INTERVAL", "5"))
+    shadow_queue_size = int(os.getenv("PROXY_SHADOW_QUEUE_SIZE", "1000"))
+    shadow_workers = int(os.getenv("PROXY_SHADOW_WORKERS", "4"))
+    shadow_max_body_size = int(os.getenv("PROXY_SHADOW_MAX_BODY_SIZE", str(1024 * 1024)))
+    balancer_strategy = os.getenv("PROXY_BALANCER", "least_outstanding").lower()
+    outlier_consecutive_failures = int(os.getenv("PROXY_OUTLIER_CONSECUTIVE_FAILURES", "5"))
+    outlier_ejection_seconds = float(os.getenv("PROXY_OUTLIER_EJECTION_SECONDS", "30"))
+    probe_path = os.getenv("PROXY_PROBE_PATH", "/")
+    probe_interval = float(os.getenv("PROXY_PROBE_INTERVAL", "5"))
+    route_policy_path = os.getenv("PROXY_POLICY_PATH", "proxy_policy.json")
+    cache_max_bytes = int(os.getenv("PROXY_CACHE_MAX_BYTES", "0"))
+    cache_max_entry_bytes = int(os.getenv("PROXY_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+    coalesce_max_wait = float(os.getenv("PROXY_COALESCE_MAX_WAIT", "0"))
+    coalesce_max_body_bytes = int(os.getenv("PROXY_COALESCE_MAX_BODY_BYTES", str(1024 * 1024)))
+    retry_budget_percent = float(os.getenv("PROXY_RETRY_BUDGET_PERCENT", "10"))
+    retry_budget_min_per_second = float(os.getenv("PROXY_RETRY_BUDGET_MIN_PER_SECOND", "1"))
+    breaker_enabled = os.getenv("PROXY_BREAKER_ENABLED", "false").lower() in {"1", "true", "yes"}
+    breaker_failure_rate = float(os.getenv("PROXY_BREAKER_FAILURE_RATE", "0.5"))
+    breaker_min_requests = int(os.getenv("PROXY_BREAKER_MIN_REQUESTS", "20"))
+    breaker_window_seconds = float(os.getenv("PROXY_BREAKER_WINDOW_SECONDS", "10"))
+    breaker_consecutive_failures = int(os.getenv("PROXY_BREAKER_CONSECUTIVE_FAILURES", "5"))
+    breaker_open_seconds = float(os.getenv("PROXY_BREAKER_OPEN_SECONDS", "30"))
+    deadline_header = os.getenv("PROXY_DEADLINE_HEADER", DEFAULT_TIMEOUT_HEADER)
+    request_start_header = os.getenv("PROXY_REQUEST_START_HEADER", DEFAULT_REQUEST_START_HEADER)
+    lb_timeout = float(os.getenv("PROXY_LB_TIMEOUT", "0"))
+    pool_max_connections = int(os.getenv("PROXY_POOL_MAX_CONNECTIONS", "100"))
+    pool_max_keepalive_connections = int(os.getenv("PROXY_POOL_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    pool_keepalive_expiry = float(os.getenv("PROXY_POOL_KEEPALIVE_EXPIRY", "5"))
+    canary_pool_max_connections = _optional_env(int, "PROXY_CANARY_POOL_MAX_CONNECTIONS")
+    canary_pool_max_keepalive_connections = _optional_env(
+        int, "PROXY_CANARY_POOL_MAX_KEEPALIVE_CONNECTIONS"
+    )
+    canary_pool_keepalive_expiry = _optional_env(float, "PROXY_CANARY_POOL_KEEPALIVE_EXPIRY")
+    warm_connections = int(os.getenv("PROXY_WARM_CONNECTIONS", "0"))
+    warm_timeout = float(os.getenv("PROXY_WARM_TIMEOUT", "5"))
+    concurrency_limit_enabled = os.getenv(
+        "PROXY_CONCURRENCY_LIMIT_ENABLED", ""
+    ).lower() in {"1", "true", "yes"}
+    concurrency_limit_initial = int(os.getenv("PROXY_CONCURRENCY_LIMIT_INITIAL", "20"))
+    concurrency_limit_min = int(os.getenv("PROXY_CONCURRENCY_LIMIT_MIN", "4"))
+    concurrency_limit_max = int(os.getenv("PROXY_CONCURRENCY_LIMIT_MAX", "500"))
+    concurrency_queue_size = int(os.getenv("PROXY_CONCURRENCY_QUEUE_SIZE", "100"))
+    concurrency_max_wait = float(os.getenv("PROXY_CONCURRENCY_MAX_WAIT", "1"))
+    fair_queue_threshold = int(os.getenv("PROXY_FAIR_QUEUE_THRESHOLD", "0"))
+    fair_queue_size = int(os.getenv("PROXY_FAIR_QUEUE_SIZE", "100"))
+    fair_queue_max_wait = float(os.getenv("PROXY_FAIR_QUEUE_MAX_WAIT", "5"))
 
     _proxy_client = ProxyClient(
         upstream_base_url=upstream_base_url,
         upstream_canary_base_url=upstream_canary_base_url,
         canary_config_path=canary_config_path,
         debug_mode=debug_mode,
+        deadline_header=deadline_header,
+        request_start_header=request_start_header,
+        lb_timeout=lb_timeout,
+        pool_max_connections=pool_max_connections,
+        pool_max_keepalive_connections=pool_max_keepalive_connections,
+        pool_keepalive_expiry=pool_keepalive_expiry,
+        canary_pool_max_connections=canary_pool_max_connections,
+        canary_pool_max_keepalive_connections=canary_pool_max_keepalive_connections,
+        canary_pool_keepalive_expiry=canary_pool_keepalive_expiry,
+        warm_connections=warm_connections,
+        warm_timeout=warm_timeout,
+        stream_chunk_size=stream_chunk_size,
+        response_passthrough=response_passthrough,
+        compression_enabled=compression_enabled,
+        compression_min_size=compression_min_size,
+        compression_level=compression_level,
+        compression_min_level=compression_min_level,
+        request_body_mode=request_body_mode,
+        cancel_on_disconnect=cancel_on_disconnect,
+        spool_max_memory=spool_max_memory,
+        canary_reload_interval=canary_reload_interval,
+        shadow_queue_size=shadow_queue_size,
+        shadow_workers=shadow_workers,
+        shadow_max_body_size=shadow_max_body_size,
+        balancer_strategy=balancer_strategy,
+        outlier_consecutive_failures=outlier_consecutive_failures,
+        outlier_ejection_seconds=outlier_ejection_seconds,
+        probe_path=probe_path,
+        probe_interval=probe_interval,
+        route_policy_path=route_policy_path,
+        cache_max_bytes=cache_max_bytes,
+        cache_max_entry_bytes=cache_max_entry_bytes,
+        coalesce_max_wait=coalesce_max_wait,
+        coalesce_max_body_bytes=coalesce_max_body_bytes,
+        retry_budget_percent=retry_budget_percent,
+        retry_budget_min_per_second=retry_budget_min_per_second,
+        breaker_enabled=breaker_enabled,
+        breaker_failure_rate=breaker_failure_rate,
+        breaker_min_requests=breaker_min_requests,
+        breaker_window_seconds=breaker_window_seconds,
+        breaker_consecutive_failures=breaker_consecutive_failures,
+        breaker_open_seconds=breaker_open_seconds,
+        concurrency_limit_enabled=concurrency_limit_enabled,
+        concurrency_limit_initial=concurrency_limit_initial,
+        concurrency_limit_min=concurrency_limit_min,
+        concurrency_limit_max=concurrency_limit_max,
+        concurrency_queue_size=concurrency_queue_size,
+        concurrency_max_wait=concurrency_max_wait,
+        fair_queue_threshold=fair_queue_threshold,
+        fair_queue_size=fair_queue_size,
+        fair_queue_max_wait=fair_queue_max_wait,
+        partner_weight=lambda partner: POLICY_PROVIDER.get(partner).weight,
     )
 
     return _proxy_client
@@ -140,11 +619,16 @@ async def proxy_client_lifespan() -> AsyncGenerator[ProxyClient, None]:
     """
     Lifespan context manager for proxy client.
 
+    With PROXY_WARM_CONNECTIONS set, startup completes (and the worker reports
+    ready) only once the warm connections have been opened or have failed.
+
     Usage:
         app = FastAPI(lifespan=proxy_client_lifespan)
     """
     client = init_proxy_client()
+    client.start()
     try:
+        await client.warm_up()
         yield client
     finally:
         await client.close()
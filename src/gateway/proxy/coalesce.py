@@ -0,0 +1,152 @@
+"""Request coalescing (singleflight) for identical concurrent upstream GET/HEADs."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Iterable
+
+from gateway.proxy.cache import CREDENTIAL_HEADERS, CachedResponse
+from gateway.proxy.headers import RawHeaders
+from gateway.proxy.metrics import CounterSet
+
+logger = logging.getLogger(__name__)
+
+COALESCE_METHODS: frozenset[str] = frozenset({"GET", "HEAD"})
+
+# Request headers that can select a different representation, and the
+# caller's credentials; a follower only joins a flight whose leader sent the
+# same values
+_KEY_HEADERS = (b"accept", b"accept-encoding", b"accept-language") + CREDENTIAL_HEADERS
+
+
+def coalesce_key(method: str, base_key: str, raw_headers: Iterable[tuple[bytes, bytes]]) -> str:
+    """
+    Flight key: method + the response cache key (upstream, normalized URL,
+    credentials) + a digest of the representation-selecting and credential
+    request headers.
+    """
+    digest = hashlib.sha256()
+    for name, value in sorted((k, v) for k, v in raw_headers if k in _KEY_HEADERS):
+        digest.update(name + b":" + value + b"\n")
+    return f"{method} {base_key} {digest.hexdigest()[:16]}"
+
+
+class Flight:
+    """One in-progress upstream call that concurrent identical requests wait on."""
+
+    __slots__ = ("key", "started", "followers", "_future")
+
+    def __init__(self, key: str, now: float):
+        self.key = key
+        self.started = now
+        self.followers = 0
+        self._future: asyncio.Future[CachedResponse | None] = (
+            asyncio.get_running_loop().create_future()
+        )
+
+    def _finish(self, response: CachedResponse | None) -> None:
+        if not self._future.done():
+            self._future.set_result(response)
+
+
+class Coalescer:
+    """
+    Lets concurrent identical GET/HEAD requests share one upstream call.
+
+    The first request for a key becomes the leader and goes upstream; requests
+    arriving while it is in flight become followers and wait (at most
+    ``max_wait`` seconds) for the leader's buffered response. Followers fall
+    back to their own upstream call when the wait times out, the body turns
+    out larger than ``max_body_bytes``, the response sets cookies, or the
+    leader's relay fails or is abandoned - coalescing never changes what a
+    client receives, only how many upstream calls produce it.
+    """
+
+    def __init__(self, max_wait: float, max_body_bytes: int = 1024 * 1024):
+        """
+        Args:
+            max_wait: Seconds a follower waits for the leader before going upstream itself
+            max_body_bytes: Responses larger than this are not shared
+        """
+        if max_wait <= 0:
+            raise ValueError(f"Invalid PROXY_COALESCE_MAX_WAIT: {max_wait}")
+        if max_body_bytes <= 0:
+            raise ValueError(f"Invalid PROXY_COALESCE_MAX_BODY_BYTES: {max_body_bytes}")
+        self.max_wait = max_wait
+        self.max_body_bytes = max_body_bytes
+        self.counters = CounterSet()
+        self._flights: dict[str, Flight] = {}
+
+    def join(self, key: str) -> tuple[Flight, bool]:
+        """Flight for key and whether the caller leads it (True) or follows it."""
+        now = time.monotonic()
+        flight = self._flights.get(key)
+        # A flight older than max_wait is no use to new followers (and a leader
+        # cancelled before it could release its flight must not block the key)
+        if flight is not None and now - flight.started < self.max_wait:
+            flight.followers += 1
+            self.counters.inc("followers")
+            return flight, False
+        flight = self._flights[key] = Flight(key, now)
+        self.counters.inc("leaders")
+        return flight, True
+
+    async def follow(self, flight: Flight) -> CachedResponse | None:
+        """Wait for the leader's response; None means the caller must go upstream itself."""
+        try:
+            response = await asyncio.wait_for(asyncio.shield(flight._future), self.max_wait)
+        except TimeoutError:
+            self.counters.inc("timeouts")
+            return None
+        if response is None:
+            self.counters.inc("fallbacks")
+        return response
+
+    def shareable(self, headers: RawHeaders) -> bool:
+        """Whether a response with these headers may be handed to followers at all."""
+        for name, value in headers:
+            if name == b"set-cookie":
+                self.counters.inc("not_shared")
+                return False
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body_bytes:
+                self.counters.inc("too_large")
+                return False
+        return True
+
+    def complete(
+        self, flight: Flight, status_code: int, headers: RawHeaders, body: bytes | None
+    ) -> None:
+        """Hand the leader's full response to followers (body None = relay failed)."""
+        self._release(flight)
+        if body is None:
+            flight._finish(None)
+            return
+        if len(body) > self.max_body_bytes:
+            self.counters.inc("too_large")
+            flight._finish(None)
+            return
+        flight._finish(CachedResponse.build(status_code, headers, body, time.time()))
+        if flight.followers:
+            self.counters.inc("shared", flight.followers)
+
+    def abandon(self, flight: Flight) -> None:
+        """Release followers without a response (idempotent; safe on any exit path)."""
+        self._release(flight)
+        flight._finish(None)
+
+    def _release(self, flight: Flight) -> None:
+        # New requests from here on start a fresh flight
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def status(self) -> dict:
+        """In-flight keys and leader/follower counters (for /debug/proxy/coalescing)."""
+        return {
+            "max_wait": self.max_wait,
+            "max_body_bytes": self.max_body_bytes,
+            "in_flight": len(self._flights),
+            **self.counters.snapshot(),
+        }
@@ -0,0 +1,274 @@
+"""Gateway-side gzip/deflate compression of uncompressed upstream responses."""
+
+from __future__ import annotations
+
+import time
+import zlib
+from typing import AsyncIterator, Callable, Iterable
+
+from gateway.proxy.headers import RawHeaders, content_encoded
+from gateway.proxy.metrics import CounterSet
+
+# Preferred first when the client weighs them equally
+ENCODINGS = ("gzip", "deflate")
+_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+# Text-like media types worth compressing; images, archives, PDFs and
+# octet-streams are usually compressed already
+_COMPRESSIBLE_PREFIXES = (b"text/", b"application/json", b"application/xml", b"application/javascript")
+_COMPRESSIBLE_SUFFIXES = (b"+json", b"+xml")
+
+_ACCEPT_ENCODING = b"accept-encoding"
+_CACHE_CONTROL = b"cache-control"
+_CONTENT_ENCODING = b"content-encoding"
+_CONTENT_LENGTH = b"content-length"
+_CONTENT_RANGE = b"content-range"
+_CONTENT_TYPE = b"content-type"
+_ETAG = b"etag"
+_VARY = b"vary"
+
+
+def negotiate(accept_encoding: bytes | None) -> str | None:
+    """
+    Encoding to use for a client's Accept-Encoding value, or None for identity.
+
+    Honours q-values (``q=0`` refuses a coding) and ``*``; on a tie gzip wins.
+    """
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for part in accept_encoding.decode("latin-1").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    best, best_weight = None, 0.0
+    for coding in ENCODINGS:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def _compressible(content_type: bytes | None) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(b";", 1)[0].strip().lower()
+    return media_type.startswith(_COMPRESSIBLE_PREFIXES) or media_type.endswith(_COMPRESSIBLE_SUFFIXES)
+
+
+class CpuLoad:
+    """This process's CPU utilization (0..1 of one core), sampled at most once per ``interval``."""
+
+    def __init__(
+        self,
+        interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        cpu_clock: Callable[[], float] = time.process_time,
+    ):
+        self.interval = interval
+        self._clock = clock
+        self._cpu_clock = cpu_clock
+        self._wall = clock()
+        self._cpu = cpu_clock()
+        self.value = 0.0
+
+    def utilization(self) -> float:
+        now = self._clock()
+        elapsed = now - self._wall
+        if elapsed >= self.interval:
+            cpu = self._cpu_clock()
+            sample = min(1.0, (cpu - self._cpu) / elapsed)
+            # Smoothed, so one busy second does not swing the level
+            self.value = sample if not self.value else 0.5 * self.value + 0.5 * sample
+            self._wall, self._cpu = now, cpu
+        return self.value
+
+
+class ResponseCompressor:
+    """
+    Compresses uncompressed, text-like upstream responses for clients that accept it.
+
+    A response is compressed when the client accepts gzip or deflate, the
+    body is at least ``min_size`` bytes (by Content-Length; bodies of unknown
+    length are compressed), its type is text-like, and it is not already
+    encoded, a range, or marked ``Cache-Control: no-transform``.
+
+    Bodies are compressed chunk by chunk as they are relayed, so memory stays
+    bounded by the chunk size plus zlib's window. Every chunk is flushed, so
+    a streamed response still reaches the client as the upstream sends it.
+
+    The level follows this worker's CPU utilization: ``max_level`` while it
+    is below ``cpu_low``, ``min_level`` above ``cpu_high``, and linear in
+    between, so compression gives way when the worker is busy.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1024,
+        min_level: int = 1,
+        max_level: int = 6,
+        cpu_low: float = 0.5,
+        cpu_high: float = 0.9,
+        cpu_load: CpuLoad | None = None,
+    ):
+        """
+        Args:
+            min_size: Smaller bodies (by Content-Length) are sent uncompressed
+            min_level: zlib level used when the worker's CPU is saturated
+            max_level: zlib level used when the worker's CPU is idle
+            cpu_low: CPU utilization up to which max_level is used
+            cpu_high: CPU utilization from which min_level is used
+            cpu_load: CPU utilization source (default: this process)
+        """
+        if min_size < 0:
+            raise ValueError(f"Invalid PROXY_COMPRESSION_MIN_SIZE: {min_size}")
+        if not 1 <= max_level <= 9:
+            raise ValueError(f"Invalid PROXY_COMPRESSION_LEVEL: {max_level}")
+        if not 1 <= min_level <= max_level:
+            raise ValueError(f"Invalid PROXY_COMPRESSION_MIN_LEVEL: {min_level}")
+        if not 0 <= cpu_low < cpu_high:
+            raise ValueError(f"Invalid compression CPU thresholds: {cpu_low}, {cpu_high}")
+        self.min_size = min_size
+        self.min_level = min_level
+        self.max_level = max_level
+        self.cpu_low = cpu_low
+        self.cpu_high = cpu_high
+        self.cpu_load = cpu_load or CpuLoad()
+        self.counters = CounterSet()
+
+    def level(self) -> int:
+        """zlib level for a response starting now."""
+        utilization = self.cpu_load.utilization()
+        if utilization <= self.cpu_low:
+            return self.max_level
+        if utilization >= self.cpu_high:
+            return self.min_level
+        share = (utilization - self.cpu_low) / (self.cpu_high - self.cpu_low)
+        return round(self.max_level - share * (self.max_level - self.min_level))
+
+    def prepare(
+        self,
+        method: str,
+        status_code: int,
+        request_headers: Iterable[tuple[bytes, bytes]],
+        response_headers: RawHeaders,
+    ) -> tuple[str | None, RawHeaders]:
+        """
+        Decide whether to compress a response.
+
+        Returns:
+            The encoding to apply (None = send as is) and the response headers
+            to send: with Vary: Accept-Encoding whenever the choice depended on
+            it, and when compressing, Content-Encoding set, Content-Length
+            dropped and a strong ETag weakened
+        """
+        if method == "HEAD" or status_code < 200 or status_code in (204, 206, 304):
+            return None, response_headers
+        content_type = content_length = cache_control = None
+        for name, value in response_headers:
+            if name == _CONTENT_TYPE:
+                content_type = value
+            elif name == _CONTENT_LENGTH:
+                content_length = value
+            elif name == _CACHE_CONTROL:
+                cache_control = value
+            elif name == _CONTENT_RANGE:
+                return None, response_headers
+        if content_encoded(response_headers):
+            self.counters.inc("skipped_encoded")
+            return None, response_headers
+        if not _compressible(content_type):
+            self.counters.inc("skipped_type")
+            return None, response_headers
+        if cache_control is not None and b"no-transform" in cache_control.lower():
+            return None, response_headers
+        if content_length is not None:
+            try:
+                if int(content_length) < self.min_size:
+                    self.counters.inc("skipped_small")
+                    return None, response_headers
+            except ValueError:
+                pass
+
+        headers = _add_vary(response_headers)
+        accept_encoding = None
+        for name, value in request_headers:
+            if name == _ACCEPT_ENCODING:
+                accept_encoding = value if accept_encoding is None else accept_encoding + b"," + value
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return None, headers
+
+        out: RawHeaders = []
+        for name, value in headers:
+            if name in (_CONTENT_LENGTH, _CONTENT_ENCODING):
+                continue
+            if name == _ETAG and not value.startswith(b"W/"):
+                value = b"W/" + value
+            out.append((name, value))
+        out.append((_CONTENT_ENCODING, encoding.encode("latin-1")))
+        self.counters.inc(f"compressed_{encoding}")
+        return encoding, out
+
+    async def compress_stream(self, chunks: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+        """Compress a relayed body chunk by chunk (closes ``chunks`` however it ends)."""
+        compressor = zlib.compressobj(self.level(), zlib.DEFLATED, _WBITS[encoding])
+        try:
+            async for chunk in chunks:
+                self.counters.inc("bytes_in", len(chunk))
+                out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                self.counters.inc("bytes_out", len(out))
+                yield out
+            out = compressor.flush()
+            self.counters.inc("bytes_out", len(out))
+            yield out
+        finally:
+            await chunks.aclose()
+
+    def compress_body(self, body: bytes, encoding: str) -> bytes:
+        """Compress a complete body (cache hits and coalesced followers)."""
+        compressor = zlib.compressobj(self.level(), zlib.DEFLATED, _WBITS[encoding])
+        out = compressor.compress(body) + compressor.flush()
+        self.counters.inc("bytes_in", len(body))
+        self.counters.inc("bytes_out", len(out))
+        return out
+
+    def status(self) -> dict:
+        """Settings, current level and counters (for /debug/proxy/compression)."""
+        counters = self.counters.snapshot()
+        bytes_in = counters.get("bytes_in", 0)
+        return {
+            "min_size": self.min_size,
+            "min_level": self.min_level,
+            "max_level": self.max_level,
+            "cpu_utilization": round(self.cpu_load.value, 3),
+            "level": self.level(),
+            "ratio": round(counters.get("bytes_out", 0) / bytes_in, 3) if bytes_in else None,
+            **counters,
+        }
+
+
+def _add_vary(headers: RawHeaders) -> RawHeaders:
+    """Headers with Accept-Encoding listed in Vary (merged into an existing Vary)."""
+    out: RawHeaders = []
+    found = False
+    for name, value in headers:
+        if name == _VARY and not found:
+            found = True
+            names = {v.strip().lower() for v in value.split(b",")}
+            if b"*" not in names and _ACCEPT_ENCODING not in names:
+                value = value + b", Accept-Encoding"
+        out.append((name, value))
+    if not found:
+        out.append((_VARY, b"Accept-Encoding"))
+    return out
@@ -0,0 +1,213 @@
+"""Request deadlines from the caller's remaining time budget, and per-attempt httpx timeouts."""
+
+from __future__ import annotations
+
+import time
+from typing import Iterable
+
+import httpx
+
+from gateway.proxy.headers import RawHeaders
+from gateway.proxy.metrics import CounterSet, LatencyWindow
+
+DEFAULT_TIMEOUT_HEADER = "X-Request-Timeout"
+DEFAULT_REQUEST_START_HEADER = "X-Request-Start"
+
+
+def parse_timeout(value: bytes) -> float | None:
+    """Seconds from a timeout header value ("2.5" or "2500ms"); None if invalid or negative."""
+    text = value.decode("latin-1").strip().lower()
+    scale = 1.0
+    if text.endswith("ms"):
+        text, scale = text[:-2], 0.001
+    elif text.endswith("s"):
+        text = text[:-1]
+    try:
+        seconds = float(text) * scale
+    except ValueError:
+        return None
+    return seconds if seconds >= 0 else None
+
+
+def parse_request_start(value: bytes) -> float | None:
+    """
+    Unix time (seconds) from a load balancer's request start header.
+
+    Accepts NGINX/Heroku style ``t=1700000000.123`` and bare timestamps in
+    seconds, milliseconds or microseconds, told apart by magnitude.
+    """
+    text = value.decode("latin-1").strip()
+    if text.startswith("t="):
+        text = text[2:]
+    try:
+        stamp = float(text)
+    except ValueError:
+        return None
+    if stamp > 1e14:
+        return stamp / 1e6
+    if stamp > 1e11:
+        return stamp / 1e3
+    return stamp if stamp > 0 else None
+
+
+def request_age(raw_headers: Iterable[tuple[bytes, bytes]], header: bytes, wall: float) -> float | None:
+    """Seconds since the load balancer received the request (never negative), if it said."""
+    for name, value in raw_headers:
+        if name == header:
+            started = parse_request_start(value)
+            if started is None:
+                return None
+            # Clocks of the load balancer and this host may disagree slightly
+            return max(0.0, wall - started)
+    return None
+
+
+class DeadlinePolicy:
+    """
+    Works out when the upstream call of a request stops being useful.
+
+    A request's deadline is the earlier of:
+
+    - the caller's budget in the timeout header (``X-Request-Timeout: 2.5``),
+      less the time the request queued behind the load balancer
+    - the load balancer's request start (``X-Request-Start``) plus
+      ``lb_timeout``, the time the load balancer waits before giving up
+
+    Deadlines are time.monotonic() values. The remaining budget caps every
+    httpx timeout of an attempt (pool wait included) and is forwarded
+    upstream in the timeout header, so the upstream can give up in time too.
+    """
+
+    def __init__(
+        self,
+        timeout_header: str = DEFAULT_TIMEOUT_HEADER,
+        request_start_header: str = DEFAULT_REQUEST_START_HEADER,
+        lb_timeout: float = 0.0,
+    ):
+        """
+        Args:
+            timeout_header: Inbound header carrying the caller's remaining seconds
+                            (forwarded upstream with what is left of them)
+            request_start_header: Header in which the load balancer stamps the
+                                  time it received the request
+            lb_timeout: Seconds the load balancer waits for a response
+                        (0 = do not derive a deadline from the request start)
+        """
+        if lb_timeout < 0:
+            raise ValueError(f"Invalid PROXY_LB_TIMEOUT: {lb_timeout}")
+        self.timeout_header = timeout_header.lower().encode("latin-1")
+        self.request_start_header = request_start_header.lower().encode("latin-1")
+        self.lb_timeout = lb_timeout
+        self.counters = CounterSet()
+        self.dropped_age_ms = LatencyWindow()
+
+    def _caller_budget(self, raw_headers: Iterable[tuple[bytes, bytes]]) -> float | None:
+        for name, value in raw_headers:
+            if name == self.timeout_header:
+                return parse_timeout(value)
+        return None
+
+    def age(self, raw_headers: Iterable[tuple[bytes, bytes]], wall: float | None = None) -> float | None:
+        """Seconds the request spent queued since the load balancer received it, if it said."""
+        return request_age(raw_headers, self.request_start_header, time.time() if wall is None else wall)
+
+    def remaining(self, raw_headers: Iterable[tuple[bytes, bytes]], age: float | None) -> float | None:
+        """
+        Seconds left of the request's budget (<= 0 once expired), or None without a deadline.
+
+        The caller's budget started when it sent the request, so time queued
+        behind the load balancer (``age``) is spent from it.
+        """
+        budgets = []
+        caller_budget = self._caller_budget(raw_headers)
+        if caller_budget is not None:
+            budgets.append(caller_budget - (age or 0.0))
+        if self.lb_timeout and age is not None:
+            budgets.append(self.lb_timeout - age)
+        return min(budgets) if budgets else None
+
+    def deadline(
+        self,
+        raw_headers: Iterable[tuple[bytes, bytes]],
+        now: float | None = None,
+        wall: float | None = None,
+    ) -> float | None:
+        """time.monotonic() after which the request's upstream call is pointless, or None."""
+        now = time.monotonic() if now is None else now
+        age = self.age(raw_headers, wall)
+        remaining = self.remaining(raw_headers, age)
+        if remaining is None:
+            return None
+        if self._caller_budget(raw_headers) is not None:
+            self.counters.inc("caller_deadlines")
+        if self.lb_timeout and age is not None:
+            self.counters.inc("lb_deadlines")
+        return now + remaining
+
+    def expired(self) -> None:
+        """Count a request that ran out of time before (or while) calling upstream."""
+        self.counters.inc("expired")
+
+    def dropped(self, age: float | None) -> None:
+        """Count a request that had expired by the time the gateway received it."""
+        self.counters.inc("dropped")
+        if age is not None:
+            self.dropped_age_ms.add(age * 1000)
+
+    def propagate(self, headers: RawHeaders, deadline: float, now: float) -> RawHeaders:
+        """Upstream headers with the timeout header set to the remaining budget."""
+        remaining = max(0.0, deadline - now)
+        out = [(name, value) for name, value in headers if name != self.timeout_header]
+        out.append((self.timeout_header, f"{remaining:.3f}".encode("latin-1")))
+        return out
+
+    def status(self) -> dict:
+        return {
+            "timeout_header": self.timeout_header.decode("latin-1"),
+            "request_start_header": self.request_start_header.decode("latin-1"),
+            "lb_timeout": self.lb_timeout,
+            **self.counters.snapshot(),
+            "dropped_age_ms": self.dropped_age_ms.snapshot(),
+        }
+
+
+def attempt_timeout(
+    timeout: httpx.Timeout,
+    connect: float | None = None,
+    read: float | None = None,
+    remaining: float | None = None,
+) -> httpx.Timeout:
+    """
+    An attempt's httpx timeouts: ``timeout`` with the route's connect/read
+    overrides, each of the four capped by the remaining deadline budget.
+    """
+
+    def cap(value: float | None) -> float | None:
+        if remaining is None:
+            return value
+        return remaining if value is None else min(value, remaining)
+
+    return httpx.Timeout(
+        connect=cap(connect if connect is not None else timeout.connect),
+        read=cap(read if read is not None else timeout.read),
+        write=cap(timeout.write),
+        pool=cap(timeout.pool),
+    )
+
+
+_TIMEOUT_PHASES = (
+    (httpx.ConnectTimeout, "connect"),
+    (httpx.ReadTimeout, "read"),
+    (httpx.WriteTimeout, "write"),
+    (httpx.PoolTimeout, "pool"),
+)
+
+
+def deadline_caused(error: Exception, uncapped: httpx.Timeout, capped: httpx.Timeout) -> bool:
+    """Whether an httpx timeout fired early because the deadline had shortened it."""
+    for error_type, phase in _TIMEOUT_PHASES:
+        if isinstance(error, error_type):
+            limit = getattr(capped, phase)
+            full = getattr(uncapped, phase)
+            return limit is not None and (full is None or limit < full)
+    return False
@@ -0,0 +1,45 @@
+"""Client disconnect detection: stop upstream work nobody will read."""
+
+from __future__ import annotations
+
+from starlette.types import Receive
+
+from gateway.proxy.metrics import CounterSet
+
+
+async def wait_for_disconnect(receive: Receive) -> None:
+    """
+    Return once the client has disconnected.
+
+    Only for a request whose body has been read completely: from then on
+    ``http.disconnect`` is the only message an ASGI server delivers, and
+    receive() blocks until it does.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class AbandonedRequests:
+    """
+    Requests whose client disconnected before their response was relayed.
+
+    Counted per route policy, and by the phase the request was in:
+    ``before_headers`` (waiting for a slot or for upstream response headers;
+    the upstream call is cancelled and its connection released) or
+    ``during_body`` (relaying the response body; the upstream stream is closed).
+    """
+
+    def __init__(self):
+        self.counters = CounterSet()
+        self.routes = CounterSet()
+
+    def record(self, route: str, phase: str) -> None:
+        self.counters.inc("abandoned")
+        self.counters.inc(phase)
+        self.routes.inc(route)
+
+    def status(self) -> dict:
+        """Abandoned requests overall, per phase and per route policy (for /debug/proxy/disconnects)."""
+        return {**self.counters.snapshot(), "routes": self.routes.snapshot()}
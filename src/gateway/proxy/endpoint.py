@@ -5,7 +5,9 @@ from __future__ import annotations
 from fastapi import Request
 from starlette.responses import Response
 
+from gateway.proxy.body import BodyMode
 from gateway.proxy.canary import CanaryRouter
+from gateway.proxy.client import get_proxy_client
 from gateway.proxy.handler import proxy_handler
 
 
@@ -14,6 +16,7 @@ async def proxy_to_upstream(
     upstream_path: str,
     canary_router: CanaryRouter | None = None,
     debug_mode: bool | None = None,
+    body_mode: BodyMode | None = None,
 ) -> Response:
     """
     Thin wrapper over proxy_handler for contract-first endpoints.
@@ -28,18 +31,20 @@ async def proxy_to_upstream(
       body may differ from the original byte-for-byte (e.g., key ordering, formatting).
     - For byte-preserving forwarding, endpoints should accept Request only and
       not use Pydantic Body() models.
+    - body_mode="stream" pipes the inbound body upstream as it arrives (large
+      uploads); body_mode="spool" buffers it to a SpooledTemporaryFile so it can
+      be replayed. Both only apply when the body has not already been read.
     
     Args:
         request: FastAPI request object
         upstream_path: Path to forward to upstream (e.g., "/api/v1/leads")
         canary_router: Optional canary router (if None, uses get_proxy_client().canary_router)
         debug_mode: Optional debug mode (if None, uses get_proxy_client().debug_mode)
+        body_mode: Optional request body mode (if None, uses PROXY_REQUEST_BODY_MODE)
         
     Returns:
         Response from upstream (reuses shared httpx client from lifespan)
     """
-    from gateway.proxy.client import get_proxy_client
-    
     # Get canary router and debug mode from proxy client if not provided
     # These are loaded once at startup, avoiding per-request config loading
     proxy_client = get_proxy_client()
@@ -62,6 +67,7 @@ async def proxy_to_upstream(
         full_path=full_path,
         canary_router=canary_router,
         debug_mode=debug_mode,
+        body_mode=body_mode,
     )
 
 
@@ -0,0 +1,186 @@
+"""Weighted fair queuing of upstream requests across partners (deficit round robin)."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable
+
+from gateway.proxy.metrics import CounterSet
+
+# Partner key for requests that carry no partner identity
+ANONYMOUS = "-"
+
+
+class _PartnerQueue:
+    """Waiting requests of one partner and its DRR deficit."""
+
+    __slots__ = ("partner", "weight", "deficit", "waiters")
+
+    def __init__(self, partner: str, weight: float):
+        self.partner = partner
+        self.weight = weight
+        self.deficit = 0.0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+
+
+class FairQueue:
+    """
+    Shares upstream capacity between partners once it runs out.
+
+    While fewer than ``threshold`` proxied requests are in flight, requests go
+    straight through - one comparison and an increment. Above it, each request
+    waits in its partner's FIFO queue, and freed slots are handed out by
+    deficit round robin: every visit tops a partner's deficit up by its
+    weight and each request it sends costs 1, so over time partners get slots
+    in proportion to their weights however many requests each has queued.
+
+    A partner's queue holds at most ``queue_size`` requests and a request
+    waits at most ``max_wait`` seconds (or until its own deadline, if sooner);
+    requests over either get a 503.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        queue_size: int = 100,
+        max_wait: float = 5.0,
+        weight: Callable[[str], float] | None = None,
+    ):
+        """
+        Args:
+            threshold: In-flight requests above which requests are queued per partner
+            queue_size: Requests one partner may have waiting
+            max_wait: Longest a request waits for a slot (seconds)
+            weight: Partner -> scheduling weight (default: 1 for everyone)
+        """
+        if threshold < 1:
+            raise ValueError(f"Invalid PROXY_FAIR_QUEUE_THRESHOLD: {threshold}")
+        if queue_size < 0:
+            raise ValueError(f"Invalid PROXY_FAIR_QUEUE_SIZE: {queue_size}")
+        if max_wait < 0:
+            raise ValueError(f"Invalid PROXY_FAIR_QUEUE_MAX_WAIT: {max_wait}")
+        self.threshold = threshold
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._weight = weight or (lambda partner: 1.0)
+        self.in_flight = 0
+        self.queued = 0
+        self.counters = CounterSet()
+        # Partners with waiting requests, in round-robin order
+        self._active: deque[_PartnerQueue] = deque()
+        self._queues: dict[str, _PartnerQueue] = {}
+
+    async def acquire(self, partner: str, deadline: float | None = None) -> bool:
+        """
+        Take an in-flight slot, queueing behind the partner's earlier requests if needed.
+
+        Args:
+            partner: Scheduling partner (ANONYMOUS without one)
+            deadline: time.monotonic() by which the request must have a slot
+
+        Returns:
+            False if the request was rejected (partner queue full, max_wait or deadline passed)
+        """
+        if self.in_flight < self.threshold and not self.queued:
+            self.in_flight += 1
+            return True
+        timeout = self.max_wait
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                self.counters.inc("rejected_timeout")
+                return False
+
+        queue = self._queues.get(partner)
+        if queue is None:
+            queue = _PartnerQueue(partner, self._weight(partner))
+        if len(queue.waiters) >= self.queue_size:
+            self.counters.inc("rejected_queue_full")
+            return False
+        if not queue.waiters:
+            self._queues[partner] = queue
+            self._active.append(queue)
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        queue.waiters.append(waiter)
+        self.queued += 1
+        self.counters.inc("waited")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except TimeoutError:
+            if waiter.done():
+                # Granted in the same tick the wait ran out: keep the slot
+                return True
+            self._forget(queue, waiter)
+            self.counters.inc("rejected_timeout")
+            return False
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._forget(queue, waiter)
+            raise
+        return True
+
+    def _forget(self, queue: _PartnerQueue, waiter: asyncio.Future[None]) -> None:
+        waiter.cancel()
+        try:
+            queue.waiters.remove(waiter)
+        except ValueError:
+            return
+        self.queued -= 1
+        if not queue.waiters:
+            self._deactivate(queue)
+
+    def _deactivate(self, queue: _PartnerQueue) -> None:
+        # An idle partner keeps no credit into its next busy period
+        queue.deficit = 0.0
+        try:
+            self._active.remove(queue)
+        except ValueError:
+            pass
+        if self._queues.get(queue.partner) is queue:
+            del self._queues[queue.partner]
+
+    def release(self) -> None:
+        """Give a slot back; the next partner in the round gets it."""
+        self.in_flight -= 1
+        while self.in_flight < self.threshold and self.queued:
+            self._grant_next()
+
+    def _grant_next(self) -> None:
+        while True:
+            queue = self._active[0]
+            if queue.deficit < 1:
+                # A new turn: top up, and move on if the weight is still short of a request
+                queue.deficit += queue.weight
+                if queue.deficit < 1:
+                    self._active.rotate(-1)
+                    continue
+            queue.deficit -= 1
+            waiter = queue.waiters.popleft()
+            self.queued -= 1
+            self.in_flight += 1
+            waiter.set_result(None)
+            if not queue.waiters:
+                self._deactivate(queue)
+            elif queue.deficit < 1:
+                self._active.rotate(-1)
+            return
+
+    def status(self) -> dict:
+        """Threshold, in-flight and queued requests per partner (for /debug/proxy/fair-queue)."""
+        return {
+            "threshold": self.threshold,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queue_size": self.queue_size,
+            "max_wait": self.max_wait,
+            **self.counters.snapshot(),
+            "partners": {
+                queue.partner: {"weight": queue.weight, "queued": len(queue.waiters)}
+                for queue in self._active
+            },
+        }
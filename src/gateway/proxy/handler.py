@@ -2,58 +2,52 @@
 
 from __future__ import annotations
 
-import time
-import uuid
+import asyncio
+import logging
 import re
+import time
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Awaitable, Callable, Iterable, TypeVar
 
-import logging
+import httpx
 from fastapi import Request, Response
+from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
+from starlette.types import Receive
 
-from gateway.proxy.canary import CanaryRouter, load_canary_config
-from gateway.proxy.client import get_proxy_client
+from gateway.proxy.body import BodyMode, UpstreamRequestBody, read_request_body
+from gateway.proxy.breaker import CircuitBreaker, is_breaker_failure
+from gateway.proxy.bulkhead import Bulkhead
+from gateway.proxy.cache import (
+    CachedResponse,
+    ResponseCache,
+    cache_key,
+    request_accept_encoding,
+    request_allows_cache,
+    request_credentials,
+    response_ttl,
+)
+from gateway.proxy.canary import CanaryDecision, CanaryRouter, CanarySubject
+from gateway.proxy.client import ProxyClient, get_proxy_client
+from gateway.proxy.coalesce import COALESCE_METHODS, Coalescer, Flight, coalesce_key
+from gateway.proxy.compress import ResponseCompressor
+from gateway.proxy.deadline import attempt_timeout, deadline_caused
+from gateway.proxy.disconnect import wait_for_disconnect
+from gateway.proxy.fairqueue import ANONYMOUS
+from gateway.proxy.headers import (  # noqa: F401 - HOP_BY_HOP_HEADERS re-exported
+    HOP_BY_HOP_HEADERS,
+    RawHeaders,
+    build_upstream_headers,
+    content_encoded,
+    filter_response_headers,
+    strip_content_coding,
+)
+from gateway.proxy.policy import RoutePolicy
+from gateway.proxy.retry import RETRYABLE_STATUS, RetryEngine
 
 logger = logging.getLogger(__name__)
 
-# Hop-by-hop headers that should not be forwarded
-HOP_BY_HOP_HEADERS = {
-    "connection",
-    "keep-alive",
-    "transfer-encoding",
-    "upgrade",
-    "proxy-authenticate",
-    "proxy-authorization",
-    "te",
-    "trailer",
-}
-
-
-def _get_request_id(request: Request) -> str:
-    """
-    Get or generate request-id header.
-    
-    Upstream uses 'request-id' (lowercase, hyphenated) as per:
-    src/common/FrontendAPI.py:37 and src/Core.py:47-48
-    
-    Gateway compatibility behavior:
-    - If incoming request has 'x-request-id' but not 'request-id', copy it to 'request-id'
-    - If neither exists, generate new 'request-id'
-    """
-    # Check for request-id (upstream format) first
-    request_id = request.headers.get("request-id")
-    
-    # Gateway compatibility: bridge x-request-id to request-id
-    if not request_id:
-        request_id = (
-            request.headers.get("X-Request-ID")
-            or request.headers.get("X-Correlation-Id")
-        )
-    
-    # Generate if still not found
-    if not request_id:
-        request_id = str(uuid.uuid4())
-    
-    return request_id
+_T = TypeVar("_T")
 
 
 def _extract_partner_from_path(path: str) -> str | None:
@@ -73,200 +67,1029 @@ def _extract_partner_from_path(path: str) -> str | None:
     return None
 
 
-def _filter_hop_by_hop_headers(headers: dict[str, str]) -> dict[str, str]:
-    """Remove hop-by-hop headers from headers dict."""
-    return {
-        k: v
-        for k, v in headers.items()
-        if k.lower() not in HOP_BY_HOP_HEADERS
-    }
+def _scheduling_partner(raw_headers: RawHeaders, path_partner: str | None) -> str:
+    """Partner a request is queued as: X-Partner, else the /partners/{partner}/ segment."""
+    for name, value in raw_headers:
+        if name == b"x-partner":
+            partner = value.decode("latin-1").strip()
+            if partner:
+                return partner.lower()
+    return path_partner.lower() if path_partner else ANONYMOUS
 
 
-def _get_forwarded_headers(request: Request) -> dict[str, str]:
+async def proxy_handler(
+    request: Request,
+    full_path: str,
+    canary_router: CanaryRouter | None = None,
+    debug_mode: bool = False,
+    body_mode: BodyMode | None = None,
+) -> Response:
     """
-    Build headers to forward to upstream.
+    Handle reverse proxy request.
     
-    Pure transport layer - no DB dependencies, no gateway-specific context headers.
-    Only forwards existing headers and adds standard proxy headers.
+    Pure transport layer - no DB dependencies. Forwards requests transparently.
 
     Args:
         request: FastAPI request
+        full_path: Full path to forward (including query string)
+        canary_router: Optional canary router for traffic splitting
+        debug_mode: If True, add X-Gateway-Upstream header to response
+        body_mode: Request body forwarding mode ("buffer", "stream", "spool");
+                   defaults to the proxy client's PROXY_REQUEST_BODY_MODE
 
     Returns:
-        Headers dict for upstream request
+        Response from upstream
     """
-    headers = dict(request.headers)
-
-    # Remove hop-by-hop headers (but preserve Host - it's not hop-by-hop)
-    # Host header will be replaced by httpx with the upstream host, but we forward
-    # the original host in X-Forwarded-Host
-    headers = _filter_hop_by_hop_headers(headers)
-
-    # Ensure request-id is set (upstream format: lowercase, hyphenated)
-    # Gateway compatibility: bridge x-request-id to request-id if needed
-    request_id = _get_request_id(request)
-    headers["request-id"] = request_id
-
-    # Add X-Forwarded-* headers (standard proxy headers)
-    # Note: We forward the original Host in X-Forwarded-Host
-    # The actual Host header will be set by httpx to the upstream host
-    client_host = request.headers.get("host", "")
-    if client_host:
-        headers["X-Forwarded-Host"] = client_host
-
-    # Determine protocol
-    proto = "https"
-    if request.url.scheme:
-        proto = request.url.scheme
-    elif request.headers.get("x-forwarded-proto"):
-        proto = request.headers.get("x-forwarded-proto")
-    headers["X-Forwarded-Proto"] = proto
-
-    # X-Forwarded-For
-    forwarded_for = request.headers.get("x-forwarded-for", "")
-    client_ip = request.client.host if request.client else ""
-    if forwarded_for:
-        headers["X-Forwarded-For"] = f"{forwarded_for}, {client_ip}"
-    elif client_ip:
-        headers["X-Forwarded-For"] = client_ip
-
-    return headers
+    # Get proxy client
+    proxy_client = get_proxy_client()
 
+    # Build upstream URL - ensure query string is included
+    # full_path from router includes query string, but we also check request.url.query for safety
+    path_without_query, _, path_query = full_path.partition("?")
+    query_string = request.url.query or path_query
 
-async def proxy_handler(
-    request: Request,
-    full_path: str,
+    # Get request body (buffered, streamed through, or spooled for replay)
+    body = await read_request_body(
+        request,
+        mode=body_mode or proxy_client.request_body_mode,
+        spool_max_memory=proxy_client.spool_max_memory,
+    )
+
+    return await forward_request(
+        proxy_client,
+        method=request.method,
+        path=path_without_query,
+        query_string=query_string,
+        raw_headers=request.scope["headers"],
+        client_ip=request.client.host if request.client else "",
+        scheme=request.url.scheme,
+        body=body,
+        canary_router=canary_router,
+        debug_mode=debug_mode,
+        route_tags=getattr(request.scope.get("route"), "tags", None) or (),
+        receive=request.receive,
+    )
+
+
+async def forward_request(
+    proxy_client: ProxyClient,
+    method: str,
+    path: str,
+    query_string: str,
+    raw_headers: RawHeaders,
+    client_ip: str,
+    scheme: str,
+    body: UpstreamRequestBody,
     canary_router: CanaryRouter | None = None,
     debug_mode: bool = False,
+    route_tags: Iterable[str] = (),
+    receive: Receive | None = None,
 ) -> Response:
     """
-    Handle reverse proxy request.
-    
-    Pure transport layer - no DB dependencies. Forwards requests transparently.
+    Forward an already-parsed request to upstream.
+
+    Shared by proxy_handler (FastAPI routes) and the raw ASGI fast lane, so both
+    paths make identical routing, header and streaming decisions.
 
     Args:
-        request: FastAPI request
-        full_path: Full path to forward (including query string)
+        proxy_client: Proxy client holding the shared httpx client
+        method: HTTP method
+        path: Request path without query string
+        query_string: Raw query string ("" if none)
+        raw_headers: Inbound request headers as ASGI (name, value) byte pairs
+        client_ip: Address of the connecting client ("" if unknown)
+        scheme: Inbound URL scheme
+        body: Prepared request body (closed together with the upstream stream)
         canary_router: Optional canary router for traffic splitting
         debug_mode: If True, add X-Gateway-Upstream header to response
+        route_tags: Router tags of the matched contract-first route (selects the bulkhead)
+        receive: ASGI receive channel of the request, watched for a client disconnect
+                 while waiting for upstream headers (not used for a streamed body,
+                 which is still being read from it)
 
     Returns:
         Response from upstream
     """
     start_time = time.time()
-    request_id = _get_request_id(request)
+    route_tags = tuple(route_tags)
 
-    # Get proxy client
-    proxy_client = get_proxy_client()
+    # Build headers (pure transport - no gateway context headers); this also
+    # resolves the request-id, in the same pass over the inbound headers
+    forwarded = build_upstream_headers(raw_headers, client_ip=client_ip, scheme=scheme)
+    request_id = forwarded.request_id
+
+    # Catch-all route paths arrive without the leading slash
+    if not path.startswith("/"):
+        path = "/" + path
+    path_without_query = path
 
     # Extract partner from URL path if needed (no DB required)
     # Supports /partners/{partner}/... pattern
-    partner_id = _extract_partner_from_path(full_path.split("?")[0])
+    partner_id = _extract_partner_from_path(path_without_query)
 
     # Determine upstream (canary or legacy)
-    use_canary = False
-    upstream_reason = "default"
+    decision = CanaryDecision(use_canary=False, reason="default")
     if canary_router and proxy_client.upstream_canary_base_url:
         # Upstream has NO idempotency mechanism (per UPSTREAM_EXPECTATIONS.md)
         # So we pass has_idempotency_key=False always
-        use_canary, upstream_reason = canary_router.should_use_canary(
+        decision = canary_router.decide(
             partner=partner_id,
-            path=full_path.split("?")[0],  # Path without query
-            method=request.method,
+            path=path_without_query,  # Path without query
+            method=method,
             has_idempotency_key=False,  # Upstream has no idempotency mechanism
+            subject=CanarySubject(
+                request_id=request_id, authorization=forwarded.authorization
+            ),
         )
+    if decision.use_canary:
+        canary_breaker = proxy_client.breakers.get("canary")
+        if canary_breaker is not None and not canary_breaker.admits():
+            # Canary is failing fast: legacy serves the request instead
+            decision = CanaryDecision(use_canary=False, reason="circuit_open:canary")
+    use_canary = decision.use_canary
+    upstream_reason = decision.reason
 
-    # Build upstream URL - ensure query string is included
-    # full_path from router includes query string, but we also check request.url.query for safety
-    path_without_query = full_path.split("?")[0]
-    query_string = request.url.query
     if query_string:
         upstream_path = f"{path_without_query}?{query_string}"
     else:
-        upstream_path = full_path
-    
-    upstream_url = proxy_client.get_upstream_url(upstream_path, use_canary=use_canary)
+        upstream_path = path_without_query
 
-    # Build headers (pure transport - no gateway context headers)
-    upstream_headers = _get_forwarded_headers(request)
+    # Response cache (opt-in per route policy): hits never touch the httpx pool
+    response_cache = proxy_client.response_cache
+    route_policy = proxy_client.route_policies.match(method, path_without_query, route_tags)
+    # When the caller stops waiting (X-Request-Timeout, or the load balancer's timeout)
+    deadline = proxy_client.deadlines.deadline(raw_headers)
+    response_cache_key = None
+    if (
+        response_cache is not None
+        and method == "GET"
+        and route_policy.cache_ttl > 0
+        and request_allows_cache(raw_headers)
+    ):
+        response_cache_key = cache_key(
+            "canary" if use_canary else "legacy",
+            path_without_query,
+            query_string,
+            request_credentials(raw_headers),
+            request_accept_encoding(raw_headers),
+        )
+        cached = response_cache.get(response_cache_key, raw_headers, route_policy.name)
+        if cached is not None:
+            await body.aclose()
+            _log_replayed(request_id, partner_id, method, path_without_query, use_canary,
+                          upstream_reason, cached.status_code, "cache=hit", start_time)
+            return _compress_replayed(
+                _replayed_response(
+                    cached, request_id, time.time(),
+                    _debug_headers(use_canary, upstream_reason, b"x-gateway-cache", b"hit")
+                    if debug_mode else None,
+                ),
+                proxy_client.response_compressor, method, raw_headers,
+            )
 
-    # Get request body
-    body = await request.body()
+    # Once the body has been read, waits are cut short when the client disconnects
+    watch_disconnect = (
+        receive is not None and body.mode != "stream" and proxy_client.cancel_on_disconnect
+    )
 
-    # Make upstream request with streaming support
-    try:
-        # Use stream=True for true streaming support
-        async with proxy_client.client.stream(
-            method=request.method,
-            url=upstream_url,
-            headers=upstream_headers,
-            content=body if body else None,
-        ) as upstream_response:
-
-            # Read response status and headers
-            await upstream_response.aread()  # Read headers
-            
-            latency_ms = int((time.time() - start_time) * 1000)
-
-            # Log request
-            logger.info(
-                f"proxy_request request_id={request_id} partner={partner_id or 'none'} "
-                f"method={request.method} path={path_without_query} "
-                f"chosen_upstream={'canary' if use_canary else 'legacy'} "
-                f"upstream_reason={upstream_reason} upstream_status={upstream_response.status_code} "
-                f"latency_ms={latency_ms}"
+    # Request coalescing: identical concurrent GET/HEADs share one upstream call
+    coalescer = proxy_client.coalescer
+    flight = None
+    if coalescer is not None and method in COALESCE_METHODS:
+        base_key = response_cache_key or cache_key(
+            "canary" if use_canary else "legacy",
+            path_without_query,
+            query_string,
+            request_credentials(raw_headers),
+            request_accept_encoding(raw_headers),
+        )
+        flight, leader = coalescer.join(coalesce_key(method, base_key, raw_headers))
+        if not leader:
+            following = coalescer.follow(flight)
+            flight = None
+            try:
+                if watch_disconnect:
+                    shared = await _unless_disconnected(following, receive)
+                else:
+                    shared = await following
+            except _ClientDisconnected:
+                await body.aclose()
+                proxy_client.abandoned.record(route_policy.name, "before_headers")
+                return _abandoned_response(
+                    request_id, partner_id, method, path_without_query, start_time
+                )
+            if shared is not None:
+                await body.aclose()
+                _log_replayed(request_id, partner_id, method, path_without_query, use_canary,
+                              upstream_reason, shared.status_code, "coalesced=follower", start_time)
+                return _compress_replayed(
+                    _replayed_response(
+                        shared, request_id, None,
+                        _debug_headers(
+                            use_canary, upstream_reason, b"x-gateway-coalesced", b"follower"
+                        )
+                        if debug_mode else None,
+                    ),
+                    proxy_client.response_compressor, method, raw_headers,
+                )
+            # Leader failed, overflowed or took too long: go upstream ourselves
+
+    # Legacy circuit open: fail fast rather than wait out connect timeouts
+    if not use_canary:
+        legacy_breaker = proxy_client.breakers.get("legacy")
+        if legacy_breaker is not None and not legacy_breaker.admits():
+            await body.aclose()
+            if flight is not None:
+                coalescer.abandon(flight)
+            return _circuit_open_response(
+                legacy_breaker, request_id, partner_id, method, path_without_query
             )
 
-            # Build response headers (filter hop-by-hop)
-            response_headers = _filter_hop_by_hop_headers(dict(upstream_response.headers))
+    # Shadow copy for canary: captured now (before the body is consumed), queued
+    # once the legacy result is known so the two can be compared
+    shadow_job = None
+    shadow_mirror = proxy_client.shadow_mirror
+    if not use_canary and canary_router and shadow_mirror is not None:
+        shadow_rule = canary_router.shadow_rule(partner_id, path_without_query, method)
+        if shadow_rule is not None:
+            shadow_job = shadow_mirror.prepare(
+                shadow_rule,
+                method=method,
+                url=proxy_client.get_upstream_url(upstream_path, use_canary=True),
+                headers=forwarded.headers,
+                body=body,
+                request_id=request_id,
+            )
 
-            # Add debug header if enabled
-            if debug_mode:
-                response_headers["X-Gateway-Upstream"] = "canary" if use_canary else "legacy"
-                response_headers["X-Gateway-Upstream-Reason"] = upstream_reason
+    # Open the upstream stream. The stream is NOT scoped to this function: it must
+    # stay open while Starlette iterates the body, so it is owned by an exit stack
+    # that is closed once the downstream response has finished (or failed).
+    upstream_stream = AsyncExitStack()
+    upstream_stream.push_async_callback(body.aclose)
+    bulkhead = proxy_client.bulkheads.match(route_tags, path_without_query)
+    if flight is not None:
+        # Followers are released on every exit path; a completed flight ignores this
+        upstream_stream.callback(coalescer.abandon, flight)
+    async def admit_and_open() -> _UpstreamAttempt:
+        # Route group isolation: its own pool, and a cap that fails fast
+        if bulkhead is not None:
+            if not bulkhead.try_acquire():
+                raise _Overloaded(
+                    "canary" if use_canary else "legacy",
+                    "bulkhead",
+                    f"bulkhead={bulkhead.name} max_concurrency={bulkhead.spec.max_concurrency}",
+                )
+            upstream_stream.callback(bulkhead.release)
+        # Fair queuing across partners: only engaged once the threshold is reached
+        fair_queue = proxy_client.fair_queue
+        if fair_queue is not None:
+            fair_partner = _scheduling_partner(raw_headers, partner_id)
+            if not await fair_queue.acquire(fair_partner, deadline=deadline):
+                raise _Overloaded(
+                    "canary" if use_canary else "legacy",
+                    "fair_queue",
+                    f"fair_partner={fair_partner} in_flight={fair_queue.in_flight} "
+                    f"queued={fair_queue.queued}",
+                )
+            # Held until the body has been relayed, like the pool slot
+            upstream_stream.callback(fair_queue.release)
+        return await _open_upstream(
+            proxy_client,
+            route_policy,
+            method=method,
+            upstream_path=upstream_path,
+            use_canary=use_canary,
+            headers=forwarded.headers,
+            body=body,
+            request_id=request_id,
+            bulkhead=bulkhead,
+            deadline=deadline,
+        )
+
+    try:
+        # A caller that has already given up gets no upstream call at all
+        if deadline is not None and time.monotonic() >= deadline:
+            raise _DeadlineExceeded("canary" if use_canary else "legacy", "stage=before_upstream")
+        # A client that disconnects while queued for a slot leaves the queue at once
+        if watch_disconnect:
+            attempt = await _unless_disconnected(admit_and_open(), receive)
+        else:
+            attempt = await admit_and_open()
+    except _UpstreamFailed as failed:
+        await upstream_stream.aclose()
+        error_response = _upstream_error_response(
+            failed.error,
+            request_id=request_id,
+            partner_id=partner_id,
+            method=method,
+            path=path_without_query,
+            upstream_url=failed.url,
+            start_time=start_time,
+        )
+        elapsed_ms = (time.time() - start_time) * 1000
+        if decision.rule is not None:
+            canary_router.record_outcome(decision, error_response.status_code, elapsed_ms)
+        if shadow_job is not None:
+            shadow_mirror.submit(shadow_job, error_response.status_code, elapsed_ms)
+        return error_response
+    except _Overloaded as overloaded:
+        await upstream_stream.aclose()
+        return _overloaded_response(overloaded, request_id, partner_id, method, path_without_query)
+    except _CircuitOpen as circuit_open:
+        await upstream_stream.aclose()
+        return _circuit_open_response(
+            circuit_open.breaker, request_id, partner_id, method, path_without_query
+        )
+    except _DeadlineExceeded as exceeded:
+        await upstream_stream.aclose()
+        proxy_client.deadlines.expired()
+        return _deadline_response(exceeded, request_id, partner_id, method, path_without_query)
+    except _ClientDisconnected:
+        await upstream_stream.aclose()
+        proxy_client.abandoned.record(route_policy.name, "before_headers")
+        return _abandoned_response(request_id, partner_id, method, path_without_query, start_time)
+    except BaseException:
+        await upstream_stream.aclose()
+        raise
+    upstream_stream.push_async_callback(attempt.stack.aclose)
+    upstream_response = attempt.response
 
-            # Always use streaming for true streaming support
-            async def stream_content():
-                async for chunk in upstream_response.aiter_bytes():
-                    yield chunk
+    # Status and headers are available here; the body has not been read yet
+    elapsed_ms = (time.time() - start_time) * 1000
+    latency_ms = int(elapsed_ms)
+    if decision.rule is not None:
+        # Time to headers feeds automatic rollback of the deciding rule
+        canary_router.record_outcome(decision, upstream_response.status_code, elapsed_ms)
+    if shadow_job is not None:
+        shadow_mirror.submit(shadow_job, upstream_response.status_code, elapsed_ms)
 
-            return StreamingResponse(
-                stream_content(),
-                status_code=upstream_response.status_code,
-                headers=response_headers,
-                media_type=upstream_response.headers.get("content-type"),
-            )
+    # Log request
+    logger.info(
+        f"proxy_request request_id={request_id} partner={partner_id or 'none'} "
+        f"method={method} path={path_without_query} "
+        f"chosen_upstream={'canary' if use_canary else 'legacy'} "
+        f"upstream_reason={upstream_reason} upstream_status={upstream_response.status_code} "
+        f"latency_ms={latency_ms}"
+    )
 
-    except Exception as e:
-        latency_ms = int((time.time() - start_time) * 1000)
-        logger.error(
-            f"proxy_request_failed request_id={request_id} partner={partner_id or 'none'} "
-            f"method={request.method} path={path_without_query} "
-            f"upstream_url={upstream_url} error={str(e)} latency_ms={latency_ms}"
+    # Build response headers (filter hop-by-hop) straight from the raw upstream list
+    response_headers = filter_response_headers(upstream_response.headers.raw)
+    # A compressed body is relayed byte-for-byte (headers untouched) unless the
+    # proxy is configured to decode it, which invalidates its coding headers
+    raw_body = False
+    if content_encoded(response_headers):
+        if proxy_client.response_passthrough:
+            raw_body = True
+        else:
+            response_headers = strip_content_coding(response_headers)
+
+    # Tee the relayed body into the response cache and/or to coalesced followers
+    captures = []
+    capture_limit = 0
+    if response_cache_key is not None:
+        ttl = response_ttl(upstream_response.status_code, response_headers, route_policy.cache_ttl)
+        if ttl > 0:
+            captures.append(_cache_store(
+                response_cache, response_cache_key, upstream_response.status_code,
+                list(response_headers), ttl, raw_headers,
+            ))
+            capture_limit = response_cache.max_entry_bytes
+    if flight is not None:
+        if coalescer.shareable(response_headers):
+            captures.append(_flight_completion(
+                coalescer, flight, upstream_response.status_code, list(response_headers)
+            ))
+            capture_limit = max(capture_limit, coalescer.max_body_bytes)
+        else:
+            coalescer.abandon(flight)
+
+    # Opt-in compression of uncompressed bodies; the cache and coalesced
+    # followers above keep the identity body and compress it on replay
+    compressor = proxy_client.response_compressor
+    encoding = None
+    if compressor is not None:
+        encoding, response_headers = compressor.prepare(
+            method, upstream_response.status_code, raw_headers, response_headers
         )
-        
-        # Import here to avoid circular dependency
-        from httpx import ConnectError, TimeoutException
-        
-        # Return appropriate error response
-        if isinstance(e, ConnectError):
-            # Upstream connection failed - return 502 Bad Gateway
-            return Response(
-                content=f"Bad Gateway: Unable to connect to upstream at {upstream_url}",
-                status_code=502,
-                headers={"Content-Type": "text/plain"},
+
+    # Add debug header if enabled
+    if debug_mode:
+        response_headers.append((b"x-gateway-upstream", b"canary" if use_canary else b"legacy"))
+        response_headers.append((b"x-gateway-upstream-reason", upstream_reason.encode("latin-1")))
+        if response_cache_key is not None:
+            response_headers.append((b"x-gateway-cache", b"miss"))
+        if flight is not None:
+            response_headers.append((b"x-gateway-coalesced", b"leader"))
+
+    # The background task closes the upstream stream after the last chunk is sent;
+    # the generator's own cleanup covers disconnects and errors mid-body.
+    body_chunks = _stream_upstream_body(
+        upstream_response,
+        upstream_stream,
+        chunk_size=proxy_client.stream_chunk_size,
+        request_id=request_id,
+        raw=raw_body,
+        capture=_fan_out(captures) if captures else None,
+        capture_limit=capture_limit,
+        abandoned=lambda: proxy_client.abandoned.record(route_policy.name, "during_body"),
+    )
+    if encoding is not None:
+        body_chunks = compressor.compress_stream(body_chunks, encoding)
+    response = StreamingResponse(
+        body_chunks,
+        status_code=upstream_response.status_code,
+        background=BackgroundTask(upstream_stream.aclose),
+    )
+    # Upstream headers (including Content-Type) are passed through as-is
+    response.raw_headers = response_headers
+    return response
+
+
+class _UpstreamAttempt:
+    """One upstream call with its headers read; ``stack`` closes it and frees its slot."""
+
+    __slots__ = ("url", "response", "stack")
+
+    def __init__(self, url: str, response: httpx.Response, stack: AsyncExitStack):
+        self.url = url
+        self.response = response
+        self.stack = stack
+
+
+class _Overloaded(Exception):
+    """The request was shed before reaching the upstream (concurrency limit or fair queue)."""
+
+    def __init__(self, upstream: str, reason: str, detail: str):
+        super().__init__(f"{upstream} upstream overloaded: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.detail = detail
+
+
+class _CircuitOpen(Exception):
+    """The upstream's breaker had no trial slot left for this attempt."""
+
+    def __init__(self, breaker: CircuitBreaker):
+        super().__init__(f"{breaker.name} upstream circuit is open")
+        self.breaker = breaker
+
+
+class _DeadlineExceeded(Exception):
+    """The caller's deadline passed before the upstream sent response headers."""
+
+    def __init__(self, upstream: str, detail: str):
+        super().__init__(detail)
+        self.upstream = upstream
+        self.detail = detail
+
+
+class _ClientDisconnected(Exception):
+    """The client disconnected before the upstream sent response headers."""
+
+
+class _UpstreamFailed(Exception):
+    """An upstream call failed before response headers arrived."""
+
+    def __init__(self, url: str, error: Exception):
+        super().__init__(str(error))
+        self.url = url
+        self.error = error
+
+
+async def _attempt_upstream(
+    proxy_client: ProxyClient,
+    method: str,
+    upstream_path: str,
+    use_canary: bool,
+    headers: RawHeaders,
+    body: UpstreamRequestBody,
+    bulkhead: Bulkhead | None = None,
+    route_policy: RoutePolicy | None = None,
+    deadline: float | None = None,
+) -> _UpstreamAttempt:
+    """Send the request once; legacy traffic is balanced across UPSTREAM_BASE_URL instances."""
+    pool = proxy_client.upstream_pool
+    upstream_name = "canary" if use_canary else "legacy"
+    breaker = proxy_client.breakers.get(upstream_name)
+    stack = AsyncExitStack()
+    limiter = proxy_client.limiters.get(upstream_name)
+    if limiter is not None:
+        if not await limiter.acquire(deadline):
+            raise _Overloaded(
+                upstream_name,
+                "concurrency_limit",
+                f"limit={int(limiter.limit)} in_flight={limiter.in_flight}",
             )
-        elif isinstance(e, TimeoutException):
-            # Upstream timeout - return 504 Gateway Timeout
-            return Response(
-                content=f"Gateway Timeout: Upstream at {upstream_url} did not respond in time",
-                status_code=504,
-                headers={"Content-Type": "text/plain"},
+        # The slot is held until the body has been relayed, like the pool slot
+        stack.callback(limiter.release)
+    if bulkhead is not None:
+        http_client = bulkhead.client
+    elif use_canary and proxy_client.canary_client is not None:
+        http_client = proxy_client.canary_client
+    else:
+        http_client = proxy_client.client
+    instance = None
+    if use_canary:
+        url = proxy_client.get_upstream_url(upstream_path, use_canary=True)
+    else:
+        instance = pool.pick()
+        url = instance.url(upstream_path)
+        # Outstanding until the body has been relayed (or the call failed)
+        pool.acquire(instance)
+        stack.callback(pool.release, instance)
+    started = time.monotonic()
+    # Route timeouts replace the client's; the deadline caps them all and is
+    # passed on upstream. Without either, the client's timeouts apply as is.
+    request_options = {}
+    uncapped = timeout = None
+    connect_timeout = route_policy.connect_timeout if route_policy is not None else None
+    read_timeout = route_policy.read_timeout if route_policy is not None else None
+    if deadline is not None or connect_timeout is not None or read_timeout is not None:
+        uncapped = attempt_timeout(http_client.timeout, connect_timeout, read_timeout)
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - started
+            if remaining <= 0:
+                await stack.aclose()
+                raise _DeadlineExceeded(upstream_name, "stage=before_attempt")
+            headers = proxy_client.deadlines.propagate(headers, deadline, started)
+        timeout = attempt_timeout(uncapped, remaining=remaining)
+        request_options["timeout"] = timeout
+    # Half-open trial slots are only taken by attempts that are actually sent,
+    # and every one is given back by record() or cancelled() below
+    if breaker is not None and not breaker.allow():
+        await stack.aclose()
+        raise _CircuitOpen(breaker)
+    try:
+        response = await stack.enter_async_context(
+            http_client.stream(
+                method=method,
+                url=url,
+                headers=headers,
+                content=body.content(proxy_client.stream_chunk_size),
+                **request_options,
             )
+        )
+    except Exception as e:
+        await stack.aclose()
+        if timeout is not None and deadline is not None and deadline_caused(e, uncapped, timeout):
+            # The caller's deadline, not the upstream, cut this attempt short
+            if breaker is not None:
+                breaker.cancelled()
+            raise _DeadlineExceeded(
+                upstream_name, f"stage=attempt error={type(e).__name__} url={url}"
+            ) from e
+        if instance is not None:
+            pool.record_failure(instance, e)
+        if breaker is not None:
+            breaker.record(is_breaker_failure(error=e))
+        if limiter is not None and isinstance(e, httpx.TimeoutException):
+            limiter.record((time.monotonic() - started) * 1000, dropped=True)
+        raise _UpstreamFailed(url, e) from e
+    except BaseException:
+        await stack.aclose()
+        if breaker is not None:
+            breaker.cancelled()
+        raise
+    if instance is not None:
+        pool.record_success(instance)
+    if breaker is not None:
+        breaker.record(is_breaker_failure(status_code=response.status_code), transport=False)
+    if limiter is not None:
+        limiter.record(
+            (time.monotonic() - started) * 1000, dropped=response.status_code in (503, 504)
+        )
+    return _UpstreamAttempt(url, response, stack)
+
+
+async def _open_upstream(
+    proxy_client: ProxyClient,
+    route_policy: RoutePolicy,
+    method: str,
+    upstream_path: str,
+    use_canary: bool,
+    headers: RawHeaders,
+    body: UpstreamRequestBody,
+    request_id: str,
+    bulkhead: Bulkhead | None = None,
+    deadline: float | None = None,
+) -> _UpstreamAttempt:
+    """
+    Get upstream response headers, retrying and hedging as the route policy allows.
+
+    No retry is started that could not finish its backoff before ``deadline``.
+
+    Raises:
+        _UpstreamFailed: The last attempt's error once no retry is left
+        _DeadlineExceeded: The deadline cut an attempt short
+        _CircuitOpen: The breaker had no half-open trial slot left for an attempt
+    """
+    engine = proxy_client.retry_engine
+    engine.budget.deposit()
+    breaker = proxy_client.breakers.get("canary" if use_canary else "legacy")
+    # Concurrent attempts need a body both can read: bytes, or nothing at all
+    can_hedge = body.mode == "buffer" or body.size == 0
+    retries = 0
+    while True:
+        started = time.monotonic()
+        hedge_delay = engine.hedge_delay(route_policy, method, started) if can_hedge else None
+        try:
+            if hedge_delay is None:
+                attempt = await _attempt_upstream(
+                    proxy_client, method, upstream_path, use_canary, headers, body, bulkhead,
+                    route_policy=route_policy, deadline=deadline,
+                )
+            else:
+                attempt = await _hedged(
+                    engine,
+                    hedge_delay,
+                    lambda: _attempt_upstream(
+                        proxy_client, method, upstream_path, use_canary, headers, body, bulkhead,
+                        route_policy=route_policy, deadline=deadline,
+                    ),
+                )
+        # No point retrying into an upstream whose breaker just opened, or
+        # for a caller that will have stopped waiting by then
+        except _UpstreamFailed as failed:
+            delay = engine.backoff(route_policy, retries + 1)
+            if (
+                (breaker is not None and breaker.state == "open")
+                or (deadline is not None and time.monotonic() + delay >= deadline)
+                or not engine.may_retry(
+                    route_policy, method, retries, body.replayable, error=failed.error
+                )
+            ):
+                raise
+            outcome = type(failed.error).__name__
         else:
-            # Other errors - return 502 Bad Gateway
-            return Response(
-                content=f"Bad Gateway: {str(e)}",
-                status_code=502,
-                headers={"Content-Type": "text/plain"},
-            )
+            now = time.monotonic()
+            engine.record_latency(route_policy, (now - started) * 1000, now)
+            status_code = attempt.response.status_code
+            delay = engine.backoff(route_policy, retries + 1)
+            if (
+                status_code not in RETRYABLE_STATUS
+                or (breaker is not None and breaker.state == "open")
+                or (deadline is not None and now + delay >= deadline)
+                or not engine.may_retry(
+                    route_policy, method, retries, body.replayable, status_code=status_code
+                )
+            ):
+                return attempt
+            await attempt.stack.aclose()
+            outcome = str(status_code)
+        retries += 1
+        logger.info(
+            f"proxy_upstream_retry request_id={request_id} route={route_policy.name} "
+            f"method={method} retry={retries} outcome={outcome} backoff_ms={int(delay * 1000)}"
+        )
+        await asyncio.sleep(delay)
+
+
+async def _hedged(
+    engine: RetryEngine,
+    delay: float,
+    attempt: Callable[[], Awaitable[_UpstreamAttempt]],
+) -> _UpstreamAttempt:
+    """
+    Start an attempt and, if it has no headers after ``delay`` seconds, a second
+    one (budget permitting). The first to get headers wins; the other is
+    cancelled or closed.
+    """
+    tasks = [asyncio.ensure_future(attempt())]
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and engine.budget.withdraw():
+            engine.counters.inc("hedges")
+            tasks.append(asyncio.ensure_future(attempt()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if winner is None and task.exception() is None:
+                    winner = task
+            if winner is not None:
+                if winner is not tasks[0]:
+                    engine.counters.inc("hedge_wins")
+                return winner.result()
+        raise tasks[0].exception()
+    finally:
+        losers = [task for task in tasks if task is not winner]
+        for task in losers:
+            task.cancel()
+        for result in await asyncio.gather(*losers, return_exceptions=True):
+            if isinstance(result, _UpstreamAttempt):
+                await result.stack.aclose()
+
+
+async def _unless_disconnected(opening: Awaitable[_T], receive: Receive) -> _T:
+    """
+    Wait for upstream headers (or a coalesced leader's response), unless the
+    client disconnects first.
+
+    On a disconnect the upstream call is cancelled wherever it is (fair
+    queue, limiter queue, retry backoff, hedges, the call itself), which
+    closes its httpx stream and gives back its connection and slots. A
+    coalescing follower stops waiting; the leader's call goes on.
+
+    Raises:
+        _ClientDisconnected: The client went away first
+    """
+    task = asyncio.ensure_future(opening)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnected = not task.done()
+        watcher.cancel()
+        task.cancel()
+        # Let the cancelled call clean up; headers that raced the cancel are closed
+        result, _ = await asyncio.gather(task, watcher, return_exceptions=True)
+        if disconnected and isinstance(result, _UpstreamAttempt):
+            await result.stack.aclose()
+    if disconnected:
+        raise _ClientDisconnected()
+    return task.result()
+
+
+async def _stream_upstream_body(
+    upstream_response: httpx.Response,
+    upstream_stream: AsyncExitStack,
+    chunk_size: int,
+    request_id: str,
+    raw: bool = False,
+    capture: Callable[[bytes | None], object] | None = None,
+    capture_limit: int = 0,
+    abandoned: Callable[[], object] | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Relay the upstream body downstream chunk by chunk.
+
+    At most ``chunk_size`` bytes of the body are held in gateway memory at a time,
+    regardless of the total body size. The upstream stream is closed when iteration
+    ends for any reason (completion, client disconnect, upstream read error).
+
+    With ``raw``, the body is relayed exactly as received, still content-encoded;
+    otherwise httpx decodes any Content-Encoding first.
+
+    With ``capture``, the relayed chunks are also collected and ``capture`` is
+    called exactly once: with the full body once it has been read, or with None
+    as soon as it exceeds ``capture_limit`` bytes or the relay fails.
+
+    ``abandoned`` is called if the relay is cancelled or closed before the
+    end of the body, i.e. the client disconnected mid-body.
+    """
+    captured: list[bytes] | None = [] if capture is not None else None
+    captured_size = 0
+    try:
+        chunks = (
+            upstream_response.aiter_raw(chunk_size)
+            if raw
+            else upstream_response.aiter_bytes(chunk_size)
+        )
+        async for chunk in chunks:
+            if captured is not None:
+                captured_size += len(chunk)
+                if captured_size > capture_limit:
+                    captured = None
+                    capture(None)
+                else:
+                    captured.append(chunk)
+            yield chunk
+        if captured is not None:
+            full_body, captured = b"".join(captured), None
+            capture(full_body)
+    except Exception as e:
+        # Headers are already on the wire - the only option left is to abort the body
+        logger.error(
+            f"proxy_stream_failed request_id={request_id} "
+            f"upstream_status={upstream_response.status_code} error={str(e)}"
+        )
+        raise
+    except (asyncio.CancelledError, GeneratorExit):
+        if abandoned is not None:
+            abandoned()
+        raise
+    finally:
+        if captured is not None:
+            capture(None)
+        await upstream_stream.aclose()
+
+
+def _fan_out(captures: list[Callable[[bytes | None], object]]) -> Callable[[bytes | None], object]:
+    """Single body capture callback feeding several consumers."""
+    if len(captures) == 1:
+        return captures[0]
+
+    def capture(body: bytes | None) -> None:
+        for consumer in captures:
+            consumer(body)
+
+    return capture
+
+
+def _cache_store(
+    response_cache: ResponseCache,
+    key: str,
+    status_code: int,
+    headers: RawHeaders,
+    ttl: float,
+    request_headers: Iterable[tuple[bytes, bytes]],
+) -> Callable[[bytes | None], object]:
+    """Capture callback storing a fully relayed body in the response cache."""
+
+    def store(body: bytes | None) -> None:
+        if body is not None:
+            response_cache.put(key, status_code, headers, body, ttl, request_headers)
+
+    return store
+
+
+def _flight_completion(
+    coalescer: Coalescer, flight: Flight, status_code: int, headers: RawHeaders
+) -> Callable[[bytes | None], object]:
+    """Capture callback handing the leader's body to coalesced followers."""
+
+    def complete(body: bytes | None) -> None:
+        coalescer.complete(flight, status_code, headers, body)
+
+    return complete
+
+
+def _debug_headers(use_canary: bool, upstream_reason: str, name: bytes, value: bytes) -> RawHeaders:
+    return [
+        (b"x-gateway-upstream", b"canary" if use_canary else b"legacy"),
+        (b"x-gateway-upstream-reason", upstream_reason.encode("latin-1")),
+        (name, value),
+    ]
+
+
+def _replayed_response(
+    stored: CachedResponse, request_id: str, now: float | None, debug_headers: RawHeaders | None
+) -> Response:
+    """Response for a request answered without its own upstream call (cache hit / follower)."""
+    response = Response(content=stored.body, status_code=stored.status_code)
+    response.raw_headers = stored.response_headers(request_id, now)
+    if debug_headers:
+        response.raw_headers += debug_headers
+    return response
+
+
+def _compress_replayed(
+    response: Response,
+    compressor: ResponseCompressor | None,
+    method: str,
+    request_headers: RawHeaders,
+) -> Response:
+    """Compress a replayed (cache hit / follower) response's body when the client accepts it."""
+    if compressor is None:
+        return response
+    encoding, headers = compressor.prepare(
+        method, response.status_code, request_headers, response.raw_headers
+    )
+    if encoding is not None:
+        response.body = compressor.compress_body(response.body, encoding)
+        headers.append((b"content-length", str(len(response.body)).encode("latin-1")))
+    response.raw_headers = headers
+    return response
+
+
+def _log_replayed(
+    request_id: str,
+    partner_id: str | None,
+    method: str,
+    path: str,
+    use_canary: bool,
+    upstream_reason: str,
+    status_code: int,
+    source: str,
+    start_time: float,
+) -> None:
+    logger.info(
+        f"proxy_request request_id={request_id} partner={partner_id or 'none'} "
+        f"method={method} path={path} "
+        f"chosen_upstream={'canary' if use_canary else 'legacy'} "
+        f"upstream_reason={upstream_reason} upstream_status={status_code} "
+        f"{source} latency_ms={int((time.time() - start_time) * 1000)}"
+    )
+
+
+def _circuit_open_response(
+    breaker: CircuitBreaker,
+    request_id: str,
+    partner_id: str | None,
+    method: str,
+    path: str,
+) -> Response:
+    """503 for a request rejected by an open circuit breaker, without calling upstream."""
+    retry_after = breaker.retry_after()
+    logger.warning(
+        f"proxy_request_rejected request_id={request_id} partner={partner_id or 'none'} "
+        f"method={method} path={path} reason=circuit_open upstream={breaker.name} "
+        f"retry_after={retry_after}"
+    )
+    return Response(
+        content=f"Service Unavailable: {breaker.name} upstream circuit is open",
+        status_code=503,
+        headers={"Content-Type": "text/plain", "Retry-After": str(retry_after)},
+    )
+
+
+def _overloaded_response(
+    overloaded: _Overloaded,
+    request_id: str,
+    partner_id: str | None,
+    method: str,
+    path: str,
+) -> Response:
+    """503 for a request the concurrency limiter or the fair queue could not admit in time."""
+    logger.warning(
+        f"proxy_request_rejected request_id={request_id} partner={partner_id or 'none'} "
+        f"method={method} path={path} reason={overloaded.reason} "
+        f"upstream={overloaded.upstream} {overloaded.detail}"
+    )
+    what = {"concurrency_limit": "concurrency limit", "bulkhead": "route group limit"}.get(
+        overloaded.reason, "capacity"
+    )
+    return Response(
+        content=f"Service Unavailable: {overloaded.upstream} upstream is at its {what}",
+        status_code=503,
+        headers={"Content-Type": "text/plain", "Retry-After": "1"},
+    )
+
+
+def _deadline_response(
+    exceeded: _DeadlineExceeded,
+    request_id: str,
+    partner_id: str | None,
+    method: str,
+    path: str,
+) -> Response:
+    """504 for a request whose caller's deadline passed before upstream headers arrived."""
+    logger.warning(
+        f"proxy_request_rejected request_id={request_id} partner={partner_id or 'none'} "
+        f"method={method} path={path} reason=deadline_exceeded "
+        f"upstream={exceeded.upstream} {exceeded.detail}"
+    )
+    return Response(
+        content="Gateway Timeout: request deadline exceeded",
+        status_code=504,
+        headers={"Content-Type": "text/plain"},
+    )
+
+
+def _abandoned_response(
+    request_id: str,
+    partner_id: str | None,
+    method: str,
+    path: str,
+    start_time: float,
+) -> Response:
+    """499 (client closed request): the client left before upstream headers arrived."""
+    logger.info(
+        f"proxy_request_abandoned request_id={request_id} partner={partner_id or 'none'} "
+        f"method={method} path={path} latency_ms={int((time.time() - start_time) * 1000)}"
+    )
+    # Never delivered: the ASGI server drops sends after a disconnect
+    return Response(status_code=499)
+
+
+def _upstream_error_response(
+    e: Exception,
+    request_id: str,
+    partner_id: str | None,
+    method: str,
+    path: str,
+    upstream_url: str,
+    start_time: float,
+) -> Response:
+    """Map an exception raised while opening the upstream request to a gateway response."""
+    latency_ms = int((time.time() - start_time) * 1000)
+    logger.error(
+        f"proxy_request_failed request_id={request_id} partner={partner_id or 'none'} "
+        f"method={method} path={path} "
+        f"upstream_url={upstream_url} error={str(e)} latency_ms={latency_ms}"
+    )
+
+    # Return appropriate error response
+    if isinstance(e, httpx.ConnectError):
+        # Upstream connection failed - return 502 Bad Gateway
+        return Response(
+            content=f"Bad Gateway: Unable to connect to upstream at {upstream_url}",
+            status_code=502,
+            headers={"Content-Type": "text/plain"},
+        )
+    elif isinstance(e, httpx.TimeoutException):
+        # Upstream timeout - return 504 Gateway Timeout
+        return Response(
+            content=f"Gateway Timeout: Upstream at {upstream_url} did not respond in time",
+            status_code=504,
+            headers={"Content-Type": "text/plain"},
+        )
+    else:
+        # Other errors - return 502 Bad Gateway
+        return Response(
+            content=f"Bad Gateway: {str(e)}",
+            status_code=502,
+            headers={"Content-Type": "text/plain"},
+        )
@@ -0,0 +1,171 @@
+"""Single-pass header processing on raw ASGI/httpx header lists."""
+
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass
+from typing import Iterable
+
+RawHeaders = list[tuple[bytes, bytes]]
+
+# Hop-by-hop headers that should not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "transfer-encoding",
+    "upgrade",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+}
+
+_HOP_BY_HOP = frozenset(name.encode("latin-1") for name in HOP_BY_HOP_HEADERS)
+
+_REQUEST_ID = b"request-id"
+_X_REQUEST_ID = b"x-request-id"
+_X_CORRELATION_ID = b"x-correlation-id"
+_HOST = b"host"
+_X_FORWARDED_HOST = b"x-forwarded-host"
+_X_FORWARDED_PROTO = b"x-forwarded-proto"
+_X_FORWARDED_FOR = b"x-forwarded-for"
+_AUTHORIZATION = b"authorization"
+_CONTENT_ENCODING = b"content-encoding"
+_CONTENT_LENGTH = b"content-length"
+
+
+@dataclass(slots=True)
+class UpstreamHeaders:
+    """Result of build_upstream_headers."""
+
+    headers: RawHeaders
+    request_id: str
+    # Inbound Authorization value, if any (used for sticky canary bucketing)
+    authorization: bytes | None = None
+
+
+def build_upstream_headers(
+    raw_headers: Iterable[tuple[bytes, bytes]],
+    client_ip: str,
+    scheme: str,
+) -> UpstreamHeaders:
+    """
+    Build the header list to forward upstream in one pass over the inbound headers.
+
+    Pure transport layer - no DB dependencies, no gateway-specific context headers.
+    Header names are expected lowercase, as ASGI servers deliver them; values are
+    never decoded except the handful we need to inspect.
+
+    In the same pass:
+    - hop-by-hop headers are dropped (Host is kept - httpx replaces it with the
+      upstream host, the original goes into X-Forwarded-Host)
+    - request-id is resolved. Upstream uses 'request-id' (lowercase, hyphenated)
+      as per src/common/FrontendAPI.py:37 and src/Core.py:47-48. Compatibility:
+      a missing or empty 'request-id' is bridged from 'x-request-id', then
+      X-Correlation-Id, else a new id is generated. Exactly one 'request-id'
+      is forwarded; 'x-request-id' is forwarded as received
+    - X-Forwarded-Host/Proto/For replace any inbound values; every inbound
+      X-Forwarded-For hop is kept, in order, ahead of the client address
+
+    Args:
+        raw_headers: Inbound headers as (name, value) byte pairs (ASGI scope["headers"])
+        client_ip: Address of the connecting client ("" if unknown)
+        scheme: Inbound URL scheme ("http"/"https")
+
+    Returns:
+        UpstreamHeaders with the outgoing header list and the resolved request id
+    """
+    out: RawHeaders = []
+    request_id: bytes | None = None
+    seen_request_id = False
+    x_request_id: bytes | None = None
+    correlation_id: bytes | None = None
+    host: bytes | None = None
+    inbound_forwarded_host: bytes | None = None
+    inbound_proto: bytes | None = None
+    forwarded_for: list[bytes] = []
+    authorization: bytes | None = None
+
+    for name, value in raw_headers:
+        if name in _HOP_BY_HOP:
+            continue
+        if name == _REQUEST_ID:
+            # The first one decides, as in Headers.get(); the resolved id is added below
+            if not seen_request_id:
+                seen_request_id = True
+                request_id = value or None
+            continue
+        if name == _X_REQUEST_ID:
+            if x_request_id is None:
+                x_request_id = value
+        if name == _X_FORWARDED_FOR:
+            if value.strip():
+                forwarded_for.append(value.strip())
+            continue
+        if name == _X_FORWARDED_PROTO:
+            inbound_proto = value
+            continue
+        if name == _X_FORWARDED_HOST:
+            inbound_forwarded_host = value
+            continue
+        if name == _HOST:
+            host = value
+        elif name == _X_CORRELATION_ID:
+            correlation_id = value
+        elif name == _AUTHORIZATION:
+            authorization = value
+        out.append((name, value))
+
+    # Gateway compatibility: bridge x-request-id to request-id
+    if request_id is None:
+        request_id = x_request_id or correlation_id or str(uuid.uuid4()).encode("latin-1")
+    out.append((_REQUEST_ID, request_id))
+
+    # Add X-Forwarded-* headers (standard proxy headers)
+    forwarded_host = host or inbound_forwarded_host
+    if forwarded_host:
+        out.append((_X_FORWARDED_HOST, forwarded_host))
+
+    if scheme:
+        out.append((_X_FORWARDED_PROTO, scheme.encode("latin-1")))
+    else:
+        out.append((_X_FORWARDED_PROTO, inbound_proto or b"https"))
+
+    client = client_ip.encode("latin-1")
+    if client:
+        forwarded_for.append(client)
+    if forwarded_for:
+        out.append((_X_FORWARDED_FOR, b", ".join(forwarded_for)))
+
+    return UpstreamHeaders(
+        headers=out,
+        request_id=request_id.decode("latin-1"),
+        authorization=authorization,
+    )
+
+
+def filter_response_headers(raw_headers: Iterable[tuple[bytes, bytes]]) -> RawHeaders:
+    """
+    Drop hop-by-hop headers from an upstream response header list.
+
+    Returns names lowercased, as ASGI requires for ``http.response.start``.
+    """
+    out: RawHeaders = []
+    for name, value in raw_headers:
+        name = name.lower()
+        if name not in _HOP_BY_HOP:
+            out.append((name, value))
+    return out
+
+
+def content_encoded(headers: RawHeaders) -> bool:
+    """True if a (lowercased) response header list declares a non-identity Content-Encoding."""
+    for name, value in headers:
+        if name == _CONTENT_ENCODING and value.strip().lower() not in (b"", b"identity"):
+            return True
+    return False
+
+
+def strip_content_coding(headers: RawHeaders) -> RawHeaders:
+    """Drop Content-Encoding and Content-Length, for a body relayed decoded."""
+    return [(name, value) for name, value in headers if name not in (_CONTENT_ENCODING, _CONTENT_LENGTH)]
@@ -0,0 +1,186 @@
+"""Adaptive concurrency limits for upstream calls (gradient algorithm)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+
+from gateway.proxy.metrics import CounterSet
+
+logger = logging.getLogger(__name__)
+
+# Exponential moving averages of time to headers: the short one follows the
+# last ~10 requests, the long one is the baseline the upstream is "fast" at
+_SHORT_ALPHA = 2 / (10 + 1)
+_LONG_ALPHA = 2 / (600 + 1)
+
+# A dropped request (timeout, 503/504) cuts the limit by this factor
+_BACKOFF_RATIO = 0.9
+
+
+class AdaptiveLimiter:
+    """
+    Bounds concurrent requests to one upstream and adapts the bound to its latency.
+
+    The limit follows a gradient: ``tolerance x long-term time to headers /
+    recent time to headers``, clamped to [0.5, 1]. While the upstream answers
+    as fast as usual the gradient is 1 and the limit grows by about
+    sqrt(limit) per update. As queueing inside the upstream makes it slower,
+    the gradient drops and the limit shrinks towards what the upstream
+    handles without queueing. Timeouts and 503/504s cut the limit by 10%.
+    The limit only grows while at least half of it is in use.
+
+    Requests over the limit wait in a FIFO queue of ``queue_size``, each for
+    at most ``max_wait`` seconds (or until its own deadline, if sooner). A
+    request that finds the queue full, or is still waiting at its deadline, is
+    rejected - the caller answers 503 without touching the upstream.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 20,
+        min_limit: int = 4,
+        max_limit: int = 500,
+        queue_size: int = 100,
+        max_wait: float = 1.0,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+    ):
+        """
+        Args:
+            name: Upstream name ("legacy" or "canary")
+            initial_limit: Starting concurrency limit
+            min_limit: The limit never drops below this
+            max_limit: The limit never grows above this
+            queue_size: Requests allowed to wait for a slot; more are rejected at once
+            max_wait: Longest a request waits for a slot (seconds)
+            tolerance: How much slower than the baseline counts as no slowdown
+            smoothing: Weight of each new limit estimate (0-1]
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(
+                f"Invalid PROXY_CONCURRENCY_LIMIT_MIN/INITIAL/MAX: {min_limit}/{initial_limit}/{max_limit}"
+            )
+        if queue_size < 0:
+            raise ValueError(f"Invalid PROXY_CONCURRENCY_QUEUE_SIZE: {queue_size}")
+        if max_wait < 0:
+            raise ValueError(f"Invalid PROXY_CONCURRENCY_MAX_WAIT: {max_wait}")
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.counters = CounterSet()
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._short_rtt = 0.0
+        self._long_rtt = 0.0
+
+    async def acquire(self, deadline: float | None = None) -> bool:
+        """
+        Take a slot, waiting in the queue if needed.
+
+        Args:
+            deadline: time.monotonic() by which the request must have a slot
+
+        Returns:
+            False if the request was rejected (queue full or deadline passed)
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.counters.inc("rejected_queue_full")
+            return False
+        timeout = self.max_wait
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            self.counters.inc("rejected_deadline")
+            return False
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counters.inc("waited")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except TimeoutError:
+            if waiter.done():
+                # Granted in the same tick the wait ran out: keep the slot
+                return True
+            self._forget(waiter)
+            self.counters.inc("rejected_deadline")
+            return False
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._forget(waiter)
+            raise
+        return True
+
+    def _forget(self, waiter: asyncio.Future[None]) -> None:
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        """Give a slot back and hand it to the oldest waiter that still wants it."""
+        self.in_flight -= 1
+        self._grant()
+
+    def _grant(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def record(self, rtt_ms: float, dropped: bool = False) -> None:
+        """Feed one upstream result (time to headers) into the limit."""
+        if dropped:
+            self.limit = max(float(self.min_limit), self.limit * _BACKOFF_RATIO)
+            self.counters.inc("drops")
+            return
+        if not self._long_rtt:
+            self._short_rtt = self._long_rtt = rtt_ms
+        else:
+            self._short_rtt += _SHORT_ALPHA * (rtt_ms - self._short_rtt)
+            self._long_rtt += _LONG_ALPHA * (rtt_ms - self._long_rtt)
+            # Let the baseline catch up quickly when the upstream got faster
+            if self._long_rtt > 2 * self._short_rtt:
+                self._long_rtt *= 0.95
+        if self._short_rtt <= 0:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self._long_rtt / self._short_rtt))
+        estimate = self.limit * gradient + math.sqrt(self.limit)
+        if estimate > self.limit and self.in_flight < self.limit / 2:
+            # App-limited: low traffic says nothing about how much more would fit
+            return
+        limit = (1 - self.smoothing) * self.limit + self.smoothing * estimate
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+        self._grant()
+
+    def status(self) -> dict:
+        """Limit, usage, queue and latency baselines (for /debug/proxy/limiters)."""
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "max_wait": self.max_wait,
+            "short_rtt_ms": round(self._short_rtt, 1),
+            "long_rtt_ms": round(self._long_rtt, 1),
+            **self.counters.snapshot(),
+        }
@@ -0,0 +1,161 @@
+"""Lightweight in-process metrics for the proxy (exposed via /debug/proxy/*)."""
+
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from collections import deque
+from typing import Iterable
+
+# Upper bounds (ms) of latency histogram bins; a final overflow bin catches the rest
+LATENCY_BOUNDS_MS: tuple[float, ...] = (
+    1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750,
+    1_000, 1_500, 2_000, 3_000, 5_000, 7_500, 10_000, 15_000, 30_000, 60_000,
+)
+
+
+def percentile(values: Iterable[float], p: float) -> float | None:
+    """Nearest-rank percentile (p in 0-100) of values, None if empty."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LatencyWindow:
+    """
+    Last ``size`` samples in a ring buffer.
+
+    O(1) to record; percentiles sort the window, so read them from debug
+    endpoints and periodic checks, not per request.
+    """
+
+    __slots__ = ("_samples", "count", "total")
+
+    def __init__(self, size: int = 1024):
+        self._samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, p: float) -> float | None:
+        return percentile(self._samples, p)
+
+    def snapshot(self) -> dict:
+        samples = list(self._samples)
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else None,
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+        }
+
+
+class CounterSet:
+    """Named counters, created on first use."""
+
+    __slots__ = ("_counts",)
+
+    def __init__(self) -> None:
+        self._counts: dict[str, int] = {}
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        self._counts[name] = self._counts.get(name, 0) + amount
+
+    def get(self, name: str) -> int:
+        return self._counts.get(name, 0)
+
+    def snapshot(self) -> dict[str, int]:
+        return dict(self._counts)
+
+
+class SlidingWindow:
+    """
+    Request count, error count and latency histogram over the last ``window_seconds``.
+
+    The window is a ring of ``slots`` time slices, each with a fixed-size
+    histogram allocated up front. Recording bumps a few integers in the current
+    slice; a slice is zeroed in place when the ring wraps onto it. Nothing is
+    allocated per sample, and memory does not grow with traffic. Percentiles are
+    read from the merged histogram (bin upper bound), so they are approximate.
+    """
+
+    __slots__ = (
+        "window_seconds", "slots", "bounds",
+        "_slot_seconds", "_epochs", "_counts", "_errors", "_hist",
+    )
+
+    def __init__(
+        self,
+        window_seconds: float = 60.0,
+        slots: int = 12,
+        bounds: tuple[float, ...] = LATENCY_BOUNDS_MS,
+    ):
+        if window_seconds <= 0 or slots <= 0:
+            raise ValueError(f"Invalid sliding window: {window_seconds}s / {slots} slots")
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self.bounds = bounds
+        self._slot_seconds = window_seconds / slots
+        self._epochs = [-1] * slots
+        self._counts = [0] * slots
+        self._errors = [0] * slots
+        self._hist = [[0] * (len(bounds) + 1) for _ in range(slots)]
+
+    def _slot(self, now: float) -> int:
+        epoch = int(now // self._slot_seconds)
+        index = epoch % self.slots
+        if self._epochs[index] != epoch:
+            self._epochs[index] = epoch
+            self._counts[index] = 0
+            self._errors[index] = 0
+            hist = self._hist[index]
+            for i in range(len(hist)):
+                hist[i] = 0
+        return index
+
+    def record(self, value: float, error: bool, now: float) -> None:
+        index = self._slot(now)
+        self._counts[index] += 1
+        if error:
+            self._errors[index] += 1
+        self._hist[index][bisect_left(self.bounds, value)] += 1
+
+    def _live(self, now: float) -> list[int]:
+        oldest = int(now // self._slot_seconds) - self.slots + 1
+        return [i for i in range(self.slots) if self._epochs[i] >= oldest]
+
+    def totals(self, now: float) -> tuple[int, int]:
+        """(requests, errors) inside the window."""
+        live = self._live(now)
+        return sum(self._counts[i] for i in live), sum(self._errors[i] for i in live)
+
+    def percentile(self, p: float, now: float) -> float | None:
+        """Approximate p-th percentile inside the window (None if empty)."""
+        live = self._live(now)
+        total = sum(self._counts[i] for i in live)
+        if not total:
+            return None
+        rank = max(1, math.ceil(p / 100 * total))
+        seen = 0
+        for b in range(len(self.bounds) + 1):
+            seen += sum(self._hist[i][b] for i in live)
+            if seen >= rank:
+                return self.bounds[b] if b < len(self.bounds) else math.inf
+        return math.inf
+
+    def snapshot(self, now: float) -> dict:
+        requests, errors = self.totals(now)
+        p99 = self.percentile(99, now)
+        return {
+            "requests": requests,
+            "errors": errors,
+            "error_rate": round(errors / requests, 4) if requests else None,
+            "p99_ms": None if p99 is None or p99 == math.inf else p99,
+        }
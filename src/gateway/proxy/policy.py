@@ -0,0 +1,277 @@
+"""Per-route proxy policies (proxy_policy.json)."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from gateway.proxy.canary import _is_regex_pattern
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    """
+    Proxy behaviour for one group of routes.
+
+    ``path`` follows the canary rule convention: a prefix, or a regex when it
+    starts with ^ or contains .* A policy with ``tags`` also covers requests
+    whose contract-first route carries one of those router tags.
+    """
+
+    name: str
+    path: str | None = None
+    methods: frozenset[str] | None = None
+    tags: frozenset[str] = frozenset()
+    # Seconds a cacheable GET response may be served from the response cache (0 = off)
+    cache_ttl: float = 0.0
+    # Extra attempts for GET/HEAD after a transport error or 502/503/504
+    retries: int = 0
+    # Extra attempts for any method when the connection failed before anything was sent
+    connect_retries: int = 0
+    # Full-jitter exponential backoff between retries (seconds)
+    retry_backoff: float = 0.05
+    retry_backoff_max: float = 1.0
+    # Send a second GET/HEAD once the first is slower than the route's observed p95
+    hedge: bool = False
+    hedge_min_delay_ms: float = 10.0
+    # Overrides of the proxy-wide (or bulkhead) httpx timeouts for this route (seconds)
+    connect_timeout: float | None = None
+    read_timeout: float | None = None
+
+    _regex: re.Pattern[str] | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.path is not None and _is_regex_pattern(self.path):
+            try:
+                object.__setattr__(self, "_regex", re.compile(self.path))
+            except re.error as e:
+                raise ValueError(f"Route policy {self.name}: invalid regex {self.path!r}") from e
+        for name in ("cache_ttl", "retries", "connect_retries", "retry_backoff",
+                     "retry_backoff_max", "hedge_min_delay_ms"):
+            if getattr(self, name) < 0:
+                raise ValueError(f"Route policy {self.name}: invalid {name} {getattr(self, name)!r}")
+        for name in ("connect_timeout", "read_timeout"):
+            value = getattr(self, name)
+            if value is not None and value <= 0:
+                raise ValueError(f"Route policy {self.name}: invalid {name} {value!r}")
+
+    def matches(self, method: str, path: str, tags: Iterable[str] = ()) -> bool:
+        if self.methods is not None and method.upper() not in self.methods:
+            return False
+        if self.tags and not self.tags.isdisjoint(tags):
+            return True
+        if self.path is None:
+            return not self.tags
+        if self._regex is not None:
+            return self._regex.search(path) is not None
+        return path.startswith(self.path)
+
+
+@dataclass(frozen=True)
+class BulkheadSpec:
+    """
+    A route group isolated on its own connection pool (a bulkhead).
+
+    A request belongs to the first bulkhead listing one of its route's router
+    tags (e.g. "Legacy: hooks") or a prefix of its path.
+    """
+
+    name: str
+    tags: frozenset[str] = frozenset()
+    path_prefixes: tuple[str, ...] = ()
+    # httpx pool limits for this group
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 5.0
+    # Concurrent requests admitted; more get an immediate 503 (0 = only the pool limits)
+    max_concurrency: int = 0
+    # Overrides of the proxy-wide httpx timeouts (seconds)
+    connect_timeout: float | None = None
+    read_timeout: float | None = None
+    write_timeout: float | None = None
+    pool_timeout: float | None = None
+
+    def __post_init__(self) -> None:
+        if not self.tags and not self.path_prefixes:
+            raise ValueError(f"Bulkhead {self.name}: needs tags or path_prefixes")
+        if self.max_connections < 1 or self.max_keepalive_connections < 0:
+            raise ValueError(f"Bulkhead {self.name}: invalid max_connections/max_keepalive_connections")
+        if self.max_concurrency < 0:
+            raise ValueError(f"Bulkhead {self.name}: invalid max_concurrency {self.max_concurrency!r}")
+        if self.keepalive_expiry < 0:
+            raise ValueError(f"Bulkhead {self.name}: invalid keepalive_expiry {self.keepalive_expiry!r}")
+        for name in ("connect_timeout", "read_timeout", "write_timeout", "pool_timeout"):
+            value = getattr(self, name)
+            if value is not None and value <= 0:
+                raise ValueError(f"Bulkhead {self.name}: invalid {name} {value!r}")
+
+    def matches(self, tags: Iterable[str], path: str) -> bool:
+        if self.path_prefixes and path.startswith(self.path_prefixes):
+            return True
+        return bool(self.tags) and not self.tags.isdisjoint(tags)
+
+
+# Settings a "default" section may provide for every route
+_DEFAULTABLE = (
+    "retries", "connect_retries", "retry_backoff", "retry_backoff_max", "hedge", "hedge_min_delay_ms",
+)
+
+
+class RoutePolicies:
+    """Ordered route policies; the first match wins, else the default policy."""
+
+    def __init__(
+        self,
+        routes: list[RoutePolicy],
+        default: RoutePolicy | None = None,
+        bulkheads: list[BulkheadSpec] | None = None,
+    ):
+        self.routes = routes
+        self.default = default or RoutePolicy(name="default")
+        # Route groups with their own connection pools (see gateway.proxy.bulkhead)
+        self.bulkheads = bulkheads or []
+
+    def match(self, method: str, path: str, tags: Iterable[str] = ()) -> RoutePolicy:
+        """First policy matching the request's path or its route's router tags."""
+        for route in self.routes:
+            if route.matches(method, path, tags):
+                return route
+        return self.default
+
+
+def _route_settings(data: dict, label: str) -> dict:
+    settings = {}
+    for name in ("cache_ttl", "retry_backoff", "retry_backoff_max", "hedge_min_delay_ms",
+                 "connect_timeout", "read_timeout"):
+        if name in data:
+            settings[name] = float(data[name])
+    for name in ("retries", "connect_retries"):
+        if name in data:
+            if not isinstance(data[name], int) or isinstance(data[name], bool):
+                raise ValueError(f"{label}: {name} must be an integer")
+            settings[name] = data[name]
+    if "hedge" in data:
+        if not isinstance(data["hedge"], bool):
+            raise ValueError(f"{label}: hedge must be true or false")
+        settings["hedge"] = data["hedge"]
+    return settings
+
+
+def _parse_bulkhead(data: object, position: int) -> BulkheadSpec:
+    if not isinstance(data, dict) or not data.get("name"):
+        raise ValueError(f"Bulkhead {position} must be an object with a name")
+    name = data["name"]
+    settings: dict = {}
+    for key in ("tags", "path_prefixes"):
+        values = data.get(key, [])
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"Bulkhead {name}: {key} must be a list of strings")
+        settings[key] = frozenset(values) if key == "tags" else tuple(values)
+    for key in ("max_connections", "max_keepalive_connections", "max_concurrency"):
+        if key in data:
+            if not isinstance(data[key], int) or isinstance(data[key], bool):
+                raise ValueError(f"Bulkhead {name}: {key} must be an integer")
+            settings[key] = data[key]
+    for key in ("keepalive_expiry", "connect_timeout", "read_timeout", "write_timeout", "pool_timeout"):
+        if key in data:
+            settings[key] = float(data[key])
+    return BulkheadSpec(name=name, **settings)
+
+
+def parse_route_policies(config: object) -> RoutePolicies:
+    """
+    Build RoutePolicies from the parsed proxy_policy.json document.
+
+    Raises:
+        ValueError: If the config is invalid
+    """
+    if not isinstance(config, dict) or not isinstance(config.get("routes", []), list):
+        raise ValueError("Proxy policy config must be an object with a 'routes' list")
+    default_data = config.get("default", {})
+    if not isinstance(default_data, dict):
+        raise ValueError("Proxy policy 'default' must be an object")
+    unknown = set(default_data) - set(_DEFAULTABLE)
+    if unknown:
+        raise ValueError(f"Proxy policy 'default' cannot set {sorted(unknown)}")
+    defaults = _route_settings(default_data, "Proxy policy 'default'")
+
+    routes = []
+    for position, data in enumerate(config.get("routes", [])):
+        if not isinstance(data, dict):
+            raise ValueError(f"Route policy {position} must be an object")
+        name = data.get("name") or f"route_{position}"
+        methods = data.get("methods")
+        tags = data.get("tags", [])
+        if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+            raise ValueError(f"Route policy {name}: tags must be a list of strings")
+        routes.append(
+            RoutePolicy(
+                name=name,
+                path=data.get("path"),
+                methods=frozenset(m.upper() for m in methods) if methods else None,
+                tags=frozenset(tags),
+                **{**defaults, **_route_settings(data, f"Route policy {name}")},
+            )
+        )
+    bulkhead_data = config.get("bulkheads", [])
+    if not isinstance(bulkhead_data, list):
+        raise ValueError("Proxy policy 'bulkheads' must be a list")
+    bulkheads = [_parse_bulkhead(data, position) for position, data in enumerate(bulkhead_data)]
+    names = [bulkhead.name for bulkhead in bulkheads]
+    if len(set(names)) != len(names) or "default" in names:
+        raise ValueError("Proxy policy bulkhead names must be unique and not 'default'")
+    return RoutePolicies(routes, default=RoutePolicy(name="default", **defaults), bulkheads=bulkheads)
+
+
+def load_route_policies(config_path: str | None = None) -> RoutePolicies:
+    """
+    Load route policies from file.
+
+    Config file format (JSON):
+    {
+        "default": {"connect_retries": 1},
+        "routes": [
+            {"name": "heartbeat", "path": "/heartbeat", "methods": ["GET"], "cache_ttl": 5,
+             "connect_timeout": 1, "read_timeout": 2},
+            {"name": "credit_report", "tags": ["Legacy: fetch_credit_report"], "read_timeout": 90},
+            {"name": "account_status", "path": "^/[^/]+/account/[^/]+$", "cache_ttl": 10,
+             "retries": 2, "hedge": true}
+        ],
+        "bulkheads": [
+            {"name": "hooks", "tags": ["Legacy: hooks"], "path_prefixes": ["/hooks/"],
+             "max_connections": 20, "max_concurrency": 40, "read_timeout": 60}
+        ]
+    }
+
+    A missing file means no route policies. Unlike the canary config, an
+    invalid file fails startup - these settings are not safe to guess.
+
+    Args:
+        config_path: Path to config file. If None, uses PROXY_POLICY_PATH env var
+                     or defaults to "proxy_policy.json" in current directory.
+
+    Returns:
+        RoutePolicies instance
+    """
+    if config_path is None:
+        config_path = os.getenv("PROXY_POLICY_PATH", "proxy_policy.json")
+
+    config_file = Path(config_path)
+    if not config_file.exists():
+        logger.info(f"Proxy policy file not found, using defaults: {config_path}")
+        return RoutePolicies([])
+
+    with open(config_file) as f:
+        policies = parse_route_policies(json.load(f))
+    logger.info(
+        f"Loaded proxy policy: {config_path} routes_count={len(policies.routes)} "
+        f"bulkheads_count={len(policies.bulkheads)}"
+    )
+    return policies
@@ -0,0 +1,130 @@
+"""Upstream connection pools: configurable limits and live pool statistics."""
+
+from __future__ import annotations
+
+import time
+
+import httpcore
+import httpx
+
+from gateway.proxy.metrics import CounterSet, LatencyWindow
+
+# httpcore trace events that mean a request has left the pool's queue: it is
+# either opening a new connection or writing to one it was given
+_DEQUEUE_EVENTS = ("connection.connect_tcp.started", "connection.connect_unix_socket.started")
+_SEND_EVENT_SUFFIX = "send_request_headers.started"
+_DEFAULT_PORTS = {b"http": 80, b"https": 443}
+
+
+def pool_limits(
+    max_connections: int, max_keepalive_connections: int, keepalive_expiry: float, label: str
+) -> httpx.Limits:
+    """httpx Limits, validated; ``label`` names the settings in errors (e.g. PROXY_POOL)."""
+    if max_connections < 1:
+        raise ValueError(f"Invalid {label}_MAX_CONNECTIONS: {max_connections}")
+    if max_keepalive_connections < 0:
+        raise ValueError(f"Invalid {label}_MAX_KEEPALIVE_CONNECTIONS: {max_keepalive_connections}")
+    if keepalive_expiry < 0:
+        raise ValueError(f"Invalid {label}_KEEPALIVE_EXPIRY: {keepalive_expiry}")
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    httpx transport that measures its own connection pool.
+
+    Uses httpcore's ``trace`` extension: a request is queued from the moment
+    it reaches the transport until it starts opening a connection or sending
+    on a pooled one. That interval is the time spent waiting for the pool.
+    Active and idle connections are read from the pool when status() is called.
+    """
+
+    def __init__(self, name: str, limits: httpx.Limits, **kwargs):
+        super().__init__(limits=limits, **kwargs)
+        self.name = name
+        self.limits = limits
+        self.queued = 0
+        self.wait_ms = LatencyWindow()
+        self.counters = CounterSet()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        waiting = True
+        self.queued += 1
+        self.counters.inc("requests")
+
+        def dequeue() -> None:
+            nonlocal waiting
+            waiting = False
+            self.queued -= 1
+            self.wait_ms.add((time.monotonic() - started) * 1000)
+
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict) -> None:
+            if waiting and (event_name in _DEQUEUE_EVENTS or event_name.endswith(_SEND_EVENT_SUFFIX)):
+                if event_name in _DEQUEUE_EVENTS:
+                    self.counters.inc("connections_opened")
+                dequeue()
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        try:
+            return await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.counters.inc("pool_timeouts")
+            raise
+        finally:
+            if waiting:
+                dequeue()
+
+    def connections_to(self, url: httpx.URL) -> int:
+        """Open, unexpired connections to the origin (scheme, host, port) of ``url``."""
+        origin = httpcore.Origin(
+            url.raw_scheme, url.raw_host, url.port or _DEFAULT_PORTS.get(url.raw_scheme, 80)
+        )
+        return sum(
+            1
+            for connection in getattr(self._pool, "connections", ())
+            if connection.can_handle_request(origin) and not connection.has_expired()
+        )
+
+    def status(self) -> dict:
+        """Limits, active/idle connections, queued requests and pool wait times."""
+        connections = list(getattr(self._pool, "connections", ()))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "active": len(connections) - idle,
+            "idle": idle,
+            "queued": self.queued,
+            "wait_ms": self.wait_ms.snapshot(),
+            **self.counters.snapshot(),
+        }
+
+
+def build_upstream_client(
+    name: str, timeout: httpx.Timeout, limits: httpx.Limits
+) -> tuple[httpx.AsyncClient, InstrumentedTransport]:
+    """
+    An upstream httpx client (no redirects followed) on an instrumented pool.
+
+    Requests without an Accept-Encoding of their own ask for ``identity``:
+    response bodies are relayed as received, so the upstream must not
+    compress for a client that never said it can decompress.
+    """
+    transport = InstrumentedTransport(name, limits)
+    client = httpx.AsyncClient(
+        timeout=timeout,
+        transport=transport,
+        follow_redirects=False,
+        headers={"accept-encoding": "identity"},
+    )
+    return client, transport
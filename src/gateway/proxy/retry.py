@@ -0,0 +1,190 @@
+"""Retry and hedging decisions for upstream calls, bounded by a global retry budget."""
+
+from __future__ import annotations
+
+import math
+import random
+import time
+
+import httpx
+
+from gateway.proxy.metrics import CounterSet, SlidingWindow
+from gateway.proxy.policy import RoutePolicy
+
+IDEMPOTENT_METHODS: frozenset[str] = frozenset({"GET", "HEAD"})
+
+# Upstream statuses a GET/HEAD is retried on (the response is discarded before
+# anything is sent downstream)
+RETRYABLE_STATUS: frozenset[int] = frozenset({502, 503, 504})
+
+# Errors raised before a single request byte reached the upstream: safe to
+# retry for any method
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Deposits are fractions; ten 10% deposits must add up to a whole token
+_TOKEN_EPSILON = 1e-9
+
+# Hedging waits for this many samples before trusting the route's p95
+_HEDGE_MIN_SAMPLES = 20
+
+# The merged-histogram p95 is recomputed at most this often per route
+_HEDGE_DELAY_REFRESH_SECONDS = 1.0
+
+
+def request_not_sent(error: Exception) -> bool:
+    """Whether the upstream call failed before any request byte was sent."""
+    return isinstance(error, _NOT_SENT_ERRORS)
+
+
+def backoff_delay(retry: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff before retry number ``retry`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (retry - 1)))
+
+
+class RetryBudget:
+    """
+    Caps retries and hedges at ``percent`` of upstream requests.
+
+    Every request deposits ``percent / 100`` of a token and every extra
+    attempt withdraws a whole one, so extra load stays proportional to real
+    traffic even when the upstream is failing everything. ``min_per_second``
+    tokens trickle in regardless, so a quiet worker can still retry.
+    """
+
+    def __init__(self, percent: float = 10.0, min_per_second: float = 1.0):
+        """
+        Args:
+            percent: Extra upstream attempts allowed, as a percentage of requests
+            min_per_second: Extra attempts allowed per second on top of that
+        """
+        if percent < 0:
+            raise ValueError(f"Invalid PROXY_RETRY_BUDGET_PERCENT: {percent}")
+        if min_per_second < 0:
+            raise ValueError(f"Invalid PROXY_RETRY_BUDGET_MIN_PER_SECOND: {min_per_second}")
+        self.ratio = percent / 100
+        self.min_per_second = min_per_second
+        # Bursts are bounded: roughly ten seconds' worth of the floor, at least 10
+        self.max_tokens = max(10.0, 10 * min_per_second)
+        # Start with the floor's burst so a fresh worker can retry at once
+        self._tokens = 10 * min_per_second if min_per_second else 0.0
+        self._refilled_at = time.monotonic()
+
+    def deposit(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self, now: float | None = None) -> bool:
+        """Take one token for an extra attempt; False when the budget is spent."""
+        now = time.monotonic() if now is None else now
+        if self.min_per_second:
+            elapsed = now - self._refilled_at
+            self._tokens = min(self.max_tokens, self._tokens + elapsed * self.min_per_second)
+        self._refilled_at = now
+        if self._tokens < 1 - _TOKEN_EPSILON:
+            return False
+        self._tokens = max(0.0, self._tokens - 1)
+        return True
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class RetryEngine:
+    """
+    Per-route retry and hedging decisions.
+
+    What a route may do comes from its RoutePolicy (proxy_policy.json):
+    - ``retries``: extra attempts for GET/HEAD after a transport error or a
+      502/503/504, with full-jitter exponential backoff
+    - ``connect_retries``: extra attempts for any method when the connection
+      failed before any byte was sent
+    - ``hedge``: for GET/HEAD, a second request is sent when the first has not
+      answered within the route's observed p95; the first response wins
+
+    Every extra attempt also needs a token from the shared RetryBudget.
+    """
+
+    def __init__(self, budget: RetryBudget):
+        self.budget = budget
+        self.counters = CounterSet()
+        # route policy name -> time to upstream headers, for hedge delays
+        self._latency: dict[str, SlidingWindow] = {}
+        self._hedge_delays: dict[str, tuple[float, float]] = {}
+
+    def may_retry(
+        self,
+        policy: RoutePolicy,
+        method: str,
+        retries_done: int,
+        replayable: bool,
+        error: Exception | None = None,
+        status_code: int | None = None,
+    ) -> bool:
+        """Whether a failed attempt (error, or a retryable status) gets another try."""
+        idempotent = method in IDEMPOTENT_METHODS
+        if error is not None and request_not_sent(error):
+            allowed = max(policy.connect_retries, policy.retries if idempotent else 0)
+            reason = "connect"
+        elif idempotent and replayable and (
+            isinstance(error, httpx.TransportError) or status_code in RETRYABLE_STATUS
+        ):
+            allowed = policy.retries
+            reason = "error" if error is not None else "status"
+        else:
+            return False
+        if retries_done >= allowed:
+            return False
+        if not self.budget.withdraw():
+            self.counters.inc("budget_exhausted")
+            return False
+        self.counters.inc(f"retries_{reason}")
+        return True
+
+    def backoff(self, policy: RoutePolicy, retry: int) -> float:
+        return backoff_delay(retry, policy.retry_backoff, policy.retry_backoff_max)
+
+    def record_latency(self, policy: RoutePolicy, latency_ms: float, now: float) -> None:
+        """Track time to headers for routes that hedge."""
+        if not policy.hedge:
+            return
+        window = self._latency.get(policy.name)
+        if window is None:
+            window = self._latency[policy.name] = SlidingWindow(60.0)
+        window.record(latency_ms, False, now)
+
+    def hedge_delay(self, policy: RoutePolicy, method: str, now: float) -> float | None:
+        """Seconds to wait before hedging this request, or None to not hedge."""
+        if not policy.hedge or method not in IDEMPOTENT_METHODS:
+            return None
+        cached = self._hedge_delays.get(policy.name)
+        if cached is not None and now < cached[1]:
+            delay = cached[0]
+        else:
+            window = self._latency.get(policy.name)
+            p95 = None
+            if window is not None and window.totals(now)[0] >= _HEDGE_MIN_SAMPLES:
+                p95 = window.percentile(95, now)
+            delay = math.inf if p95 is None else max(p95, policy.hedge_min_delay_ms) / 1000
+            self._hedge_delays[policy.name] = (delay, now + _HEDGE_DELAY_REFRESH_SECONDS)
+        return None if delay == math.inf else delay
+
+    def status(self) -> dict:
+        """Retry/hedge counters and per-route hedge delays (for /debug/proxy/retries)."""
+        now = time.monotonic()
+        return {
+            "budget": {
+                "percent": self.budget.ratio * 100,
+                "min_per_second": self.budget.min_per_second,
+                "tokens": round(self.budget.tokens, 2),
+            },
+            **self.counters.snapshot(),
+            "routes": {
+                name: {
+                    "latency": window.snapshot(now),
+                    "hedge_delay_ms": None
+                    if self._hedge_delays.get(name, (math.inf,))[0] == math.inf
+                    else round(self._hedge_delays[name][0] * 1000, 1),
+                }
+                for name, window in self._latency.items()
+            },
+        }
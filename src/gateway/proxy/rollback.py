@@ -0,0 +1,203 @@
+"""Automatic canary rollback from sliding-window error rate and p99 latency."""
+
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import dataclass
+from typing import Literal
+
+from gateway.proxy.metrics import SlidingWindow
+
+logger = logging.getLogger(__name__)
+
+RollbackAction = Literal["disable", "throttle"]
+
+# Once a window has enough samples, trip checks (merging histograms) run at most this often
+_EVALUATE_EVERY_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class RollbackPolicy:
+    """
+    Thresholds for pulling a canary rule back (the ``"rollback"`` config section).
+
+    A rule trips when, inside ``window_seconds`` and with at least
+    ``min_requests`` canary requests (and legacy requests, for relative checks):
+    - canary 5xx rate exceeds legacy's by more than ``max_error_rate_delta``, or
+      exceeds ``max_error_rate`` outright
+    - canary p99 exceeds ``max_p99_ratio`` x legacy p99, or ``max_p99_ms`` outright
+
+    A tripped rule is disabled (or throttled to ``throttle_percentage``) for
+    ``cooldown_seconds``, then gets its configured percentage back.
+    """
+
+    window_seconds: float = 60.0
+    min_requests: int = 20
+    max_error_rate_delta: float | None = 0.05
+    max_error_rate: float | None = None
+    max_p99_ratio: float | None = 2.0
+    max_p99_ms: float | None = None
+    action: RollbackAction = "disable"
+    throttle_percentage: int = 1
+    cooldown_seconds: float = 300.0
+
+    @classmethod
+    def from_config(cls, data: object) -> RollbackPolicy:
+        """Build from the config section; raises ValueError on bad values."""
+        if not isinstance(data, dict):
+            raise ValueError("Canary config 'rollback' must be an object")
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown rollback settings: {sorted(unknown)}")
+        policy = cls(**data)
+        if policy.action not in ("disable", "throttle"):
+            raise ValueError(f"Invalid rollback action: {policy.action!r}")
+        if not 0 <= policy.throttle_percentage <= 100:
+            raise ValueError(
+                f"Invalid rollback throttle_percentage: {policy.throttle_percentage!r}"
+            )
+        if policy.window_seconds <= 0 or policy.cooldown_seconds < 0 or policy.min_requests < 1:
+            raise ValueError("Invalid rollback window_seconds/cooldown_seconds/min_requests")
+        return policy
+
+
+@dataclass(frozen=True, slots=True)
+class RollbackTrip:
+    """An active rollback of one rule."""
+
+    cause: str
+    action: RollbackAction
+    throttle_percentage: int
+    until: float
+
+
+class RuleHealth:
+    """Canary and legacy windows for one rule, plus its rollback state."""
+
+    __slots__ = ("canary", "legacy", "trip", "next_evaluation", "trip_count")
+
+    def __init__(self, window_seconds: float):
+        self.canary = SlidingWindow(window_seconds)
+        self.legacy = SlidingWindow(window_seconds)
+        self.trip: RollbackTrip | None = None
+        self.next_evaluation = 0.0
+        self.trip_count = 0
+
+
+class CanaryHealth:
+    """
+    Per-rule health of the canary relative to legacy.
+
+    Owned by a CanaryRouter; on config reload the new router adopts the old
+    router's state (see ``adopt``) so windows and active trips survive edits.
+    Rules are identified by ``CanaryRule.identity`` - the same key sticky
+    bucketing uses - so changing a rule's percentage keeps its history.
+    """
+
+    def __init__(self, policy: RollbackPolicy):
+        self.policy = policy
+        self._rules: dict[str, RuleHealth] = {}
+
+    def adopt(self, previous: CanaryHealth | None) -> None:
+        """Carry windows and trips over from the router this one replaces."""
+        if previous is None:
+            return
+        for key, health in previous._rules.items():
+            if health.canary.window_seconds == self.policy.window_seconds:
+                self._rules[key] = health
+
+    def trip_for(self, rule_key: str, now: float) -> RollbackTrip | None:
+        """Active trip for a rule, or None. Cheap enough for every decision."""
+        health = self._rules.get(rule_key)
+        if health is None or health.trip is None:
+            return None
+        if now >= health.trip.until:
+            logger.info(f"canary_rollback_cleared rule={rule_key} cause={health.trip.cause}")
+            health.trip = None
+            return None
+        return health.trip
+
+    def record(
+        self, rule_key: str, canary: bool, status_code: int, latency_ms: float, now: float
+    ) -> None:
+        """
+        Record one upstream result for a rule.
+
+        Canary results re-evaluate the rule: on every result until the window
+        holds ``min_requests``, then at most once a second.
+        """
+        health = self._rules.get(rule_key)
+        if health is None:
+            health = self._rules[rule_key] = RuleHealth(self.policy.window_seconds)
+        if not canary:
+            health.legacy.record(latency_ms, status_code >= 500, now)
+            return
+        health.canary.record(latency_ms, status_code >= 500, now)
+        if health.trip is None and now >= health.next_evaluation:
+            self._evaluate(rule_key, health, now)
+
+    def _evaluate(self, rule_key: str, health: RuleHealth, now: float) -> None:
+        policy = self.policy
+        canary_requests, canary_errors = health.canary.totals(now)
+        if canary_requests < policy.min_requests:
+            return
+        health.next_evaluation = now + _EVALUATE_EVERY_SECONDS
+        legacy_requests, legacy_errors = health.legacy.totals(now)
+        has_baseline = legacy_requests >= policy.min_requests
+
+        cause = None
+        canary_error_rate = canary_errors / canary_requests
+        if policy.max_error_rate is not None and canary_error_rate > policy.max_error_rate:
+            cause = "error_rate"
+        elif (
+            policy.max_error_rate_delta is not None
+            and has_baseline
+            and canary_error_rate - legacy_errors / legacy_requests > policy.max_error_rate_delta
+        ):
+            cause = "error_rate"
+        else:
+            canary_p99 = health.canary.percentile(99, now)
+            if policy.max_p99_ms is not None and canary_p99 > policy.max_p99_ms:
+                cause = "p99"
+            elif policy.max_p99_ratio is not None and has_baseline:
+                legacy_p99 = health.legacy.percentile(99, now)
+                if (
+                    legacy_p99 not in (None, math.inf)
+                    and canary_p99 > policy.max_p99_ratio * legacy_p99
+                ):
+                    cause = "p99"
+
+        if cause is None:
+            return
+        health.trip = RollbackTrip(
+            cause=cause,
+            action=policy.action,
+            throttle_percentage=policy.throttle_percentage,
+            until=now + policy.cooldown_seconds,
+        )
+        health.trip_count += 1
+        logger.warning(
+            f"canary_rollback_tripped rule={rule_key} cause={cause} action={policy.action} "
+            f"canary={health.canary.snapshot(now)} legacy={health.legacy.snapshot(now)} "
+            f"cooldown_seconds={policy.cooldown_seconds}"
+        )
+
+    def status(self, now: float) -> dict:
+        """Per-rule windows and trips (for /debug/canary)."""
+        rules = {}
+        for key, health in self._rules.items():
+            trip = health.trip
+            rules[key] = {
+                "canary": health.canary.snapshot(now),
+                "legacy": health.legacy.snapshot(now),
+                "trip_count": health.trip_count,
+                "trip": None
+                if trip is None or now >= trip.until
+                else {
+                    "cause": trip.cause,
+                    "action": trip.action,
+                    "remaining_seconds": round(trip.until - now, 1),
+                },
+            }
+        return {"policy": self.policy.__dict__, "rules": rules}
@@ -0,0 +1,256 @@
+"""Fire-and-forget shadow mirroring of proxied requests to the canary upstream."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from gateway.proxy.body import UpstreamRequestBody
+from gateway.proxy.canary import CanaryRule
+from gateway.proxy.headers import RawHeaders
+from gateway.proxy.metrics import CounterSet, LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# Marks mirrored requests so the canary side can tell them apart
+SHADOW_HEADER = (b"x-gateway-shadow", b"1")
+
+# Route keys beyond this are folded into one bucket
+_MAX_ROUTES = 500
+_OTHER_ROUTE = "other"
+
+
+@dataclass(slots=True)
+class ShadowJob:
+    """One request to replay against the canary upstream."""
+
+    route: str
+    method: str
+    url: str
+    headers: RawHeaders
+    body: bytes
+    request_id: str
+    primary_status: int = 0
+    primary_latency_ms: float = 0.0
+
+
+class RouteDiff:
+    """Legacy vs shadow comparison for one route (shadow rule)."""
+
+    __slots__ = ("counters", "status_pairs", "primary_ms", "shadow_ms", "delta_ms")
+
+    def __init__(self) -> None:
+        self.counters = CounterSet()
+        # "legacy_status->shadow_status" -> count
+        self.status_pairs = CounterSet()
+        self.primary_ms = LatencyWindow()
+        self.shadow_ms = LatencyWindow()
+        # shadow minus legacy, per request
+        self.delta_ms = LatencyWindow()
+
+    def record(
+        self, primary_status: int, primary_ms: float, shadow_status: int, shadow_ms: float
+    ) -> None:
+        self.counters.inc("compared")
+        if primary_status != shadow_status:
+            self.counters.inc("status_mismatch")
+        self.status_pairs.inc(f"{primary_status}->{shadow_status}")
+        self.primary_ms.add(primary_ms)
+        self.shadow_ms.add(shadow_ms)
+        self.delta_ms.add(shadow_ms - primary_ms)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.counters.snapshot(),
+            "status_pairs": self.status_pairs.snapshot(),
+            "legacy_latency_ms": self.primary_ms.snapshot(),
+            "shadow_latency_ms": self.shadow_ms.snapshot(),
+            "latency_delta_ms": self.delta_ms.snapshot(),
+        }
+
+
+def shadow_route_key(rule: CanaryRule, method: str) -> str:
+    """Stats key for a mirrored request: its shadow rule, not the raw path (bounded)."""
+    return f"{method.upper()} {rule.partner or '*'} {rule.endpoint_pattern or '*'}"
+
+
+class ShadowMirror:
+    """
+    Bounded queue plus worker pool that replays requests against the canary.
+
+    The primary request only ever does ``put_nowait``: when the queue is full or
+    the workers are not running the shadow copy is dropped and counted, so
+    mirroring never adds latency to (or fails) the real request. Shadow calls use
+    their own httpx client, sized to the worker count, so they cannot take
+    connections from the primary pool. Shadow responses are drained and
+    discarded; only status and time-to-headers are kept, per route.
+    """
+
+    def __init__(
+        self,
+        canary_base_url: str,
+        queue_size: int = 1000,
+        workers: int = 4,
+        max_body_size: int = 1024 * 1024,
+        timeout: httpx.Timeout | None = None,
+    ):
+        """
+        Args:
+            canary_base_url: Base URL of the canary upstream (for logs)
+            queue_size: Max shadow requests waiting for a worker
+            workers: Concurrent shadow requests
+            max_body_size: Requests with larger (or non-replayable) bodies are not mirrored
+            timeout: Timeouts for shadow calls
+        """
+        if queue_size <= 0:
+            raise ValueError(f"Invalid PROXY_SHADOW_QUEUE_SIZE: {queue_size}")
+        if workers <= 0:
+            raise ValueError(f"Invalid PROXY_SHADOW_WORKERS: {workers}")
+        self.canary_base_url = canary_base_url
+        self.queue_size = queue_size
+        self.workers = workers
+        self.max_body_size = max_body_size
+        self.client = httpx.AsyncClient(
+            timeout=timeout or httpx.Timeout(10.0),
+            limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+            follow_redirects=False,
+        )
+        self.counters = CounterSet()
+        self.routes: dict[str, RouteDiff] = {}
+        self._queue: asyncio.Queue[ShadowJob] = asyncio.Queue(maxsize=queue_size)
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def prepare(
+        self,
+        rule: CanaryRule,
+        method: str,
+        url: str,
+        headers: RawHeaders,
+        body: UpstreamRequestBody,
+        request_id: str,
+    ) -> ShadowJob | None:
+        """
+        Capture what the shadow copy needs before the primary request consumes the body.
+
+        Returns None (and counts why) when the request cannot be mirrored.
+        """
+        if not self.running:
+            self.counters.inc("dropped_not_running")
+            return None
+        if self._queue.full():
+            # Checked here too so we don't copy a body only to drop it
+            self.counters.inc("dropped_queue_full")
+            return None
+        data = body.snapshot(self.max_body_size)
+        if data is None:
+            self.counters.inc("dropped_body")
+            return None
+        return ShadowJob(
+            route=shadow_route_key(rule, method),
+            method=method,
+            url=url,
+            headers=[*headers, SHADOW_HEADER],
+            body=data,
+            request_id=request_id,
+        )
+
+    def submit(self, job: ShadowJob, primary_status: int, primary_latency_ms: float) -> bool:
+        """Queue a prepared job once the primary result is known. Never blocks."""
+        job.primary_status = primary_status
+        job.primary_latency_ms = primary_latency_ms
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.counters.inc("dropped_queue_full")
+            return False
+        self.counters.inc("enqueued")
+        return True
+
+    def start(self) -> None:
+        """Start the worker pool (call from the running loop)."""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop workers, discard queued shadow work and close the shadow client."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self.counters.inc("dropped_shutdown")
+        await self.client.aclose()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._replay(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # a worker must survive anything a shadow call does
+                logger.error(f"shadow_worker_failed request_id={job.request_id} error={str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _replay(self, job: ShadowJob) -> None:
+        start_time = time.perf_counter()
+        route = self._route(job.route)
+        try:
+            async with self.client.stream(
+                method=job.method, url=job.url, headers=job.headers, content=job.body or None
+            ) as response:
+                shadow_ms = (time.perf_counter() - start_time) * 1000
+                # Drain so the connection goes back to the shadow pool
+                if not response.is_stream_consumed:
+                    async for _ in response.aiter_raw():
+                        pass
+        except httpx.HTTPError as e:
+            self.counters.inc("failed")
+            route.counters.inc("shadow_error")
+            logger.info(
+                f"shadow_request_failed request_id={job.request_id} route={job.route} "
+                f"error={type(e).__name__}"
+            )
+            return
+
+        self.counters.inc("completed")
+        route.record(job.primary_status, job.primary_latency_ms, response.status_code, shadow_ms)
+        if response.status_code != job.primary_status:
+            logger.info(
+                f"shadow_status_mismatch request_id={job.request_id} route={job.route} "
+                f"legacy_status={job.primary_status} shadow_status={response.status_code}"
+            )
+
+    def _route(self, key: str) -> RouteDiff:
+        route = self.routes.get(key)
+        if route is None:
+            if len(self.routes) >= _MAX_ROUTES:
+                key = _OTHER_ROUTE
+                route = self.routes.get(key)
+            if route is None:
+                route = self.routes[key] = RouteDiff()
+        return route
+
+    def status(self) -> dict:
+        """Queue state and per-route legacy/shadow diffs (for /debug/proxy/shadow)."""
+        return {
+            "canary_base_url": self.canary_base_url,
+            "running": self.running,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self._queue.qsize(),
+            **self.counters.snapshot(),
+            "routes": {key: route.snapshot() for key, route in self.routes.items()},
+        }
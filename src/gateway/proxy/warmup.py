@@ -0,0 +1,170 @@
+"""Connection pre-warming: open upstream connections before traffic arrives and keep them open."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+import httpx
+
+from gateway.proxy.metrics import CounterSet
+from gateway.proxy.pool import InstrumentedTransport
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WarmTarget:
+    """One upstream base URL and the client (and pool) its requests go through."""
+
+    upstream: str
+    base_url: str
+    client: httpx.AsyncClient
+    pool: InstrumentedTransport
+
+
+class ConnectionWarmer:
+    """
+    Keeps ``connections`` open connections to every upstream target.
+
+    warm() sends that many concurrent HEAD requests to each target's probe
+    path. Each in-flight request needs a connection of its own, so the pool
+    ends up with at least ``connections`` open to the target; any HTTP
+    response counts, since only the connection matters.
+
+    Once started, a background round runs every half keepalive expiry and
+    re-warms the targets that would otherwise go cold: those with fewer open
+    connections than wanted, or whose pool saw too few requests since the
+    last round to keep its idle connections from expiring. A busy pool stays
+    warm on its own and costs nothing.
+    """
+
+    def __init__(
+        self,
+        targets: Iterable[WarmTarget],
+        connections: int,
+        path: str = "/",
+        timeout: float = 5.0,
+    ):
+        """
+        Args:
+            targets: Upstream base URLs to keep connections open to
+            connections: Open connections wanted per target
+            path: Path requested (HEAD) to open or refresh a connection
+            timeout: Timeout of a single warming request (seconds)
+        """
+        if connections < 1:
+            raise ValueError(f"Invalid PROXY_WARM_CONNECTIONS: {connections}")
+        if timeout <= 0:
+            raise ValueError(f"Invalid PROXY_WARM_TIMEOUT: {timeout}")
+        self.targets = list(targets)
+        self.connections = connections
+        self.path = path if path.startswith("/") else "/" + path
+        self.timeout = timeout
+        # Idle connections close after keepalive_expiry; refresh well before that
+        expiries = [t.pool.limits.keepalive_expiry for t in self.targets if t.pool.limits.keepalive_expiry]
+        self.interval = min(expiries) / 2 if expiries else 0.0
+        self.counters = CounterSet()
+        # pool name -> warming requests sent through it / other requests seen at the last round
+        self._own_requests: dict[str, int] = {}
+        self._seen_requests: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def _traffic(self, pool: InstrumentedTransport) -> int:
+        """Requests through ``pool`` that were not ours."""
+        return pool.counters.get("requests") - self._own_requests.get(pool.name, 0)
+
+    async def warm(self, targets: Iterable[WarmTarget] | None = None) -> int:
+        """
+        Open (or refresh) ``connections`` connections to each target, concurrently.
+
+        Returns:
+            Number of warming requests that got an HTTP response
+        """
+        targets = self.targets if targets is None else list(targets)
+        results = await asyncio.gather(*(self._warm_target(target) for target in targets))
+        for pool in {target.pool.name: target.pool for target in self.targets}.values():
+            self._seen_requests[pool.name] = self._traffic(pool)
+        return sum(results)
+
+    async def _warm_target(self, target: WarmTarget) -> int:
+        started = time.monotonic()
+        url = f"{target.base_url}{self.path}"
+        self._own_requests[target.pool.name] = (
+            self._own_requests.get(target.pool.name, 0) + self.connections
+        )
+        results = await asyncio.gather(
+            *(target.client.head(url, timeout=self.timeout) for _ in range(self.connections)),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        ok = len(results) - len(errors)
+        self.counters.inc("requests", len(results))
+        self.counters.inc("failures", len(errors))
+        open_connections = target.pool.connections_to(httpx.URL(target.base_url))
+        message = (
+            f"upstream_connections_warmed upstream={target.upstream} base_url={target.base_url} "
+            f"ok={ok} failed={len(errors)} open={open_connections} "
+            f"duration_ms={(time.monotonic() - started) * 1000:.1f}"
+        )
+        if errors:
+            logger.warning(f"{message} error={type(errors[0]).__name__}")
+        else:
+            logger.debug(message)
+        return ok
+
+    def _cold_targets(self) -> list[WarmTarget]:
+        """Targets short of connections, or on a pool too quiet to keep them open."""
+        cold = []
+        for target in self.targets:
+            pool = target.pool
+            quiet = self._traffic(pool) - self._seen_requests.get(pool.name, 0) < self.connections
+            if quiet or pool.connections_to(httpx.URL(target.base_url)) < self.connections:
+                cold.append(target)
+        return cold
+
+    def start(self) -> None:
+        """Start the background refresh (not with keepalive_expiry 0: nothing is kept idle)."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                cold = self._cold_targets()
+                if cold:
+                    self.counters.inc("refreshes")
+                    await self.warm(cold)
+            except Exception as e:  # never let the refresher die
+                logger.error(f"upstream_warm_refresh_failed error={str(e)}")
+
+    def status(self) -> dict:
+        """Wanted vs open connections per target (for /debug/proxy/warmup)."""
+        return {
+            "connections": self.connections,
+            "path": self.path,
+            "refresh_interval": self.interval,
+            **self.counters.snapshot(),
+            "targets": [
+                {
+                    "upstream": target.upstream,
+                    "base_url": target.base_url,
+                    "pool": target.pool.name,
+                    "open": target.pool.connections_to(httpx.URL(target.base_url)),
+                }
+                for target in self.targets
+            ],
+        }
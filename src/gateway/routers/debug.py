@@ -6,6 +6,8 @@ from sqlalchemy.orm import Session
 
 from gateway.db.deps import get_db
 from gateway.oauth2.asgi_request import ASGIOAuthRequest
+from gateway.partners.policies import RATE_LIMITER
+from gateway.proxy.client import get_proxy_client
 
 router = APIRouter(prefix="/debug", tags=["debug"])
 
@@ -33,3 +35,117 @@ async def oauth_request_echo(request: Request) -> dict:
         "form": oreq.form,
         "body_len": len(oreq.body),
     }
+
+
+@router.get("/canary")
+async def canary_status() -> dict:
+    """Active canary config version and hot-reload state."""
+    return get_proxy_client().canary_config.status()
+
+
+@router.get("/proxy/shadow")
+async def shadow_status() -> dict:
+    """Shadow mirroring queue state and per-route legacy vs canary diffs."""
+    shadow_mirror = get_proxy_client().shadow_mirror
+    if shadow_mirror is None:
+        return {"enabled": False}
+    return {"enabled": True, **shadow_mirror.status()}
+
+
+@router.get("/proxy/upstreams")
+async def upstreams_status() -> dict:
+    """Legacy upstream instances: outstanding requests and outlier ejection state."""
+    return get_proxy_client().upstream_pool.status()
+
+
+@router.get("/proxy/cache")
+async def cache_status() -> dict:
+    """Response cache size and hit/miss counters, overall and per route policy."""
+    response_cache = get_proxy_client().response_cache
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.status()}
+
+
+@router.get("/proxy/coalescing")
+async def coalescing_status() -> dict:
+    """Request coalescing: in-flight upstream calls and leader/follower counters."""
+    coalescer = get_proxy_client().coalescer
+    if coalescer is None:
+        return {"enabled": False}
+    return {"enabled": True, **coalescer.status()}
+
+
+@router.get("/proxy/retries")
+async def retries_status() -> dict:
+    """Retry budget, retry/hedge counters and per-route hedge delays."""
+    return get_proxy_client().retry_engine.status()
+
+
+@router.get("/proxy/breakers")
+async def breakers_status() -> dict:
+    """Circuit breaker state per upstream (closed / open / half_open)."""
+    return {name: breaker.status() for name, breaker in get_proxy_client().breakers.items()}
+
+
+@router.get("/proxy/limiters")
+async def limiters_status() -> dict:
+    """Adaptive concurrency limit, in-flight requests and queue per upstream."""
+    return {name: limiter.status() for name, limiter in get_proxy_client().limiters.items()}
+
+
+@router.get("/proxy/pools")
+async def pools_status() -> dict:
+    """Connection pool limits, active/idle connections, queued requests and pool wait per upstream."""
+    return {name: pool.status() for name, pool in get_proxy_client().pools.items()}
+
+
+@router.get("/proxy/deadlines")
+async def deadlines_status() -> dict:
+    """Deadline headers, load balancer timeout, and requests that carried or missed a deadline."""
+    return get_proxy_client().deadlines.status()
+
+
+@router.get("/proxy/disconnects")
+async def disconnects_status() -> dict:
+    """Requests abandoned by their client, per phase and per route policy."""
+    return get_proxy_client().abandoned.status()
+
+
+@router.get("/proxy/compression")
+async def compression_status() -> dict:
+    """Response compression settings, CPU-adapted level, ratio and skip counters."""
+    compressor = get_proxy_client().response_compressor
+    if compressor is None:
+        return {"enabled": False}
+    return {"enabled": True, **compressor.status()}
+
+
+@router.get("/proxy/warmup")
+async def warmup_status() -> dict:
+    """Warm connections wanted vs open per upstream, and refresh counts."""
+    warmer = get_proxy_client().warmer
+    if warmer is None:
+        return {"enabled": False}
+    return {"enabled": True, **warmer.status()}
+
+
+@router.get("/proxy/bulkheads")
+async def bulkheads_status() -> dict:
+    """Per route group: pool limits, timeouts, in-flight/peak saturation and rejections."""
+    return get_proxy_client().bulkheads.status()
+
+
+@router.get("/proxy/fair-queue")
+async def fair_queue_status() -> dict:
+    """Fair queuing threshold, in-flight requests and queued requests per partner."""
+    fair_queue = get_proxy_client().fair_queue
+    if fair_queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **fair_queue.status()}
+
+
+@router.get("/rate-limits")
+async def rate_limits_status() -> dict:
+    """Partner rate-limit buckets and allowed/rejected counts per partner."""
+    return RATE_LIMITER.status()
@@ -0,0 +1,73 @@
+"""Tests for dropping requests that expired while queued (ExpiredRequestMiddleware)."""
+
+from __future__ import annotations
+
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from gateway.middleware.expired_requests import ExpiredRequestMiddleware
+from gateway.proxy.deadline import DeadlinePolicy
+
+
+class TestExpiredRequestMiddleware:
+    """Tests for the 503s served to requests whose deadline passed before they were handled."""
+
+    @staticmethod
+    def _build_app(deadlines: DeadlinePolicy, calls: list[str]) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/leads/{lead_id}")
+        async def get_lead(lead_id: str):
+            calls.append(lead_id)
+            return {"lead": lead_id}
+
+        app.add_middleware(ExpiredRequestMiddleware, deadlines=deadlines)
+        return app
+
+    @staticmethod
+    async def _get(app: FastAPI, url: str, **kwargs) -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="https://gateway.example.com") as c:
+            return await c.get(url, **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_request_queued_past_lb_timeout_is_dropped(self):
+        """Test that a request older than the load balancer timeout gets 503 without reaching the app."""
+        deadlines = DeadlinePolicy(lb_timeout=30.0)
+        calls: list[str] = []
+        app = self._build_app(deadlines, calls)
+        now_ms = int(time.time() * 1000)
+
+        fresh = await self._get(app, "/leads/1", headers={"X-Request-Start": f"t={now_ms - 2000}"})
+        stale = await self._get(app, "/leads/2", headers={"X-Request-Start": f"t={now_ms - 31000}"})
+        untimed = await self._get(app, "/leads/3")
+
+        assert fresh.status_code == 200
+        assert stale.status_code == 503
+        assert untimed.status_code == 200
+        assert calls == ["1", "3"]
+        status = deadlines.status()
+        assert status["dropped"] == 1
+        assert status["dropped_age_ms"]["count"] == 1
+        assert status["dropped_age_ms"]["mean"] >= 31000
+
+    @pytest.mark.asyncio
+    async def test_caller_budget_spent_in_queue_is_dropped(self):
+        """Test that the caller's X-Request-Timeout counts from the load balancer's request start."""
+        deadlines = DeadlinePolicy(request_start_header="X-Queue-Start")
+        calls: list[str] = []
+        app = self._build_app(deadlines, calls)
+        queued_since = f"t={time.time() - 3:.3f}"
+
+        within = await self._get(app, "/leads/1", headers={"X-Queue-Start": queued_since, "X-Request-Timeout": "5"})
+        spent = await self._get(app, "/leads/2", headers={"X-Queue-Start": queued_since, "X-Request-Timeout": "2"})
+        no_budget = await self._get(app, "/leads/3", headers={"X-Request-Timeout": "0"})
+
+        assert within.status_code == 200
+        assert spent.status_code == 503
+        assert no_budget.status_code == 503
+        assert calls == ["1"]
+        assert deadlines.status()["dropped"] == 2
@@ -2,20 +2,45 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from fastapi import APIRouter, Request
+import httpx
+from fastapi import APIRouter, FastAPI, Request
+from starlette.datastructures import Headers
 from starlette.responses import Response
 
-from gateway.proxy.canary import CanaryRule, CanaryRouter, load_canary_config
+from gateway.proxy.asgi import ProxyFastLaneMiddleware
+from gateway.proxy.balancer import UpstreamPool, parse_upstream_urls
+from gateway.proxy.body import read_request_body
+from gateway.proxy.breaker import CircuitBreaker
+from gateway.proxy.cache import ResponseCache, cache_key, response_ttl
+from gateway.proxy.canary import (
+    CanaryRule,
+    CanaryRouter,
+    CanarySubject,
+    load_canary_config,
+    parse_canary_config,
+)
+from gateway.proxy.canary_reload import CanaryConfigReloader
 from gateway.proxy.client import ProxyClient
+from gateway.proxy.coalesce import Coalescer
+from gateway.proxy.deadline import DeadlinePolicy
+from gateway.proxy.disconnect import AbandonedRequests
 from gateway.proxy.handler import proxy_handler, _extract_partner_from_path
+from gateway.proxy.headers import build_upstream_headers, filter_response_headers
+from gateway.proxy.bulkhead import Bulkheads
+from gateway.proxy.fairqueue import FairQueue
+from gateway.proxy.limiter import AdaptiveLimiter
+from gateway.proxy.policy import RoutePolicies, RoutePolicy, parse_route_policies
+from gateway.proxy.retry import RetryBudget, RetryEngine
 from gateway.proxy.endpoint import proxy_to_upstream
-from gateway.proxy.router import catch_all_proxy
+from gateway.proxy.router import router as proxy_router
+from gateway.proxy.shadow import ShadowMirror
 
 
 @pytest.fixture
@@ -24,6 +49,26 @@ def mock_proxy_client():
     client = MagicMock(spec=ProxyClient)
     client.upstream_base_url = "https://legacy-api.example.com"
     client.upstream_canary_base_url = "https://canary-api.example.com"
+    client.stream_chunk_size = 64 * 1024
+    client.response_passthrough = True
+    client.response_compressor = None
+    client.deadlines = DeadlinePolicy()
+    client.request_body_mode = "buffer"
+    client.cancel_on_disconnect = True
+    client.abandoned = AbandonedRequests()
+    client.spool_max_memory = 1024 * 1024
+    client.client = MagicMock()
+    client.shadow_mirror = None
+    client.upstream_pool = UpstreamPool([client.upstream_base_url])
+    client.route_policies = RoutePolicies([])
+    client.response_cache = None
+    client.coalescer = None
+    client.retry_engine = RetryEngine(RetryBudget())
+    client.breakers = {}
+    client.limiters = {}
+    client.fair_queue = None
+    client.canary_client = None
+    client.bulkheads = Bulkheads()
     client.get_upstream_url = lambda path, use_canary=False: (
         client.upstream_canary_base_url + path
         if use_canary
@@ -32,12 +77,53 @@ def mock_proxy_client():
     return client
 
 
+def make_asgi_request(
+    method: str,
+    path: str,
+    headers: dict[str, str],
+    body_chunks: list[bytes] | None = None,
+    query: str = "",
+    disconnect: asyncio.Event | None = None,
+) -> Request:
+    """
+    Build a real Starlette request whose body arrives in the given chunks.
+
+    Like an ASGI server, receive() then blocks until the client disconnects
+    (once ``disconnect`` is set; never without it).
+    """
+    chunks = list(body_chunks or [b""])
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await (disconnect or asyncio.Event()).wait()
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "scheme": "https",
+        # ASGI servers deliver lowercase header names
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("1.2.3.4", 12345),
+        "server": ("gateway.example.com", 443),
+    }
+    return Request(scope, receive)
+
+
 @pytest.fixture
 def mock_httpx_response():
     """Mock httpx response."""
     response = MagicMock()
     response.status_code = 200
-    response.headers = {"Content-Type": "application/json"}
+    response.headers = httpx.Headers({"Content-Type": "application/json"})
     response.content = b'{"status": "ok"}'
     response.is_streaming = False
     return response
@@ -143,6 +229,125 @@ class TestCanaryRouter:
         assert use_canary is True
 
 
+    def test_indexed_matching_equals_linear_scan(self):
+        """Test that the compiled rule index finds exactly what a linear scan finds, in order."""
+        import random
+
+        rng = random.Random(7)
+        partners = [None, "nav", "intuit", "NAV"]
+        methods = [None, "GET", "head", "POST"]
+        patterns = [None, "/api", "/api/v1", "/api/v1/leads", "/partners/", "^/api/v1/.*", "/v2.*", "^/x[", ""]
+        rules = [
+            CanaryRule(
+                partner=rng.choice(partners),
+                endpoint_pattern=rng.choice(patterns),
+                method=rng.choice(methods),
+                percentage=100,
+            )
+            for _ in range(300)
+        ]
+        router = CanaryRouter(rules=rules, canary_enabled=True)
+
+        paths = ["/", "/api", "/api/v1/leads/1", "/api/v2", "/v2/x", "/partners/nav/x", "/other"]
+        for partner in [None, "nav", "Intuit", "unknown"]:
+            for method in ["GET", "HEAD", "POST"]:
+                for path in paths:
+                    expected = [r for r in rules if r.matches(partner, path, method, False)]
+                    assert router.matching_rules(partner, path, method) == expected
+
+    def test_regex_compiled_once_at_load(self):
+        """Test that evaluating a regex rule does not compile patterns per request."""
+        rule = CanaryRule(partner="nav", endpoint_pattern="^/api/v1/.*", method="GET", percentage=100)
+        router = CanaryRouter(rules=[rule], canary_enabled=True)
+
+        with patch("gateway.proxy.canary.re.compile", side_effect=AssertionError("compiled")):
+            use_canary, _ = router.should_use_canary("nav", "/api/v1/test", "GET")
+
+        assert use_canary is True
+
+    def test_sticky_request_id_is_deterministic(self):
+        """Test that a sticky rule gives the same answer for the same subject every time."""
+        rule = CanaryRule(endpoint_pattern="/api", method="GET", percentage=50, sticky_key="request_id")
+        router = CanaryRouter(rules=[rule], canary_enabled=True)
+
+        for i in range(50):
+            subject = CanarySubject(request_id=f"req-{i}")
+            first = router.should_use_canary(None, "/api/x", "GET", subject=subject)
+            for _ in range(5):
+                assert router.should_use_canary(None, "/api/x", "GET", subject=subject) == first
+
+    def test_sticky_distribution_matches_percentage(self):
+        """Test that sticky bucketing sends roughly the configured share to canary."""
+        rule = CanaryRule(endpoint_pattern="/api", percentage=20, sticky_key="request_id")
+        router = CanaryRouter(rules=[rule], canary_enabled=True)
+
+        hits = sum(
+            router.should_use_canary(None, "/api", "GET", subject=CanarySubject(request_id=str(i)))[0]
+            for i in range(10_000)
+        )
+        assert 1_800 < hits < 2_200
+
+    def test_sticky_ramp_keeps_existing_canary_subjects(self):
+        """Test that raising the percentage only adds subjects to canary."""
+        subjects = [CanarySubject(request_id=f"user-{i}") for i in range(2_000)]
+
+        def canary_set(percentage: int) -> set[str]:
+            rule = CanaryRule(endpoint_pattern="/api", percentage=percentage, sticky_key="request_id")
+            router = CanaryRouter(rules=[rule], canary_enabled=True)
+            return {
+                s.request_id for s in subjects
+                if router.should_use_canary(None, "/api", "GET", subject=s)[0]
+            }
+
+        at_10, at_30 = canary_set(10), canary_set(30)
+        assert at_10 and at_10 < at_30
+
+    def test_sticky_auth_subject_uses_jwt_sub(self):
+        """Test that auth_subject buckets on the JWT sub claim, not the whole token."""
+        import base64
+
+        def token(sub: str, iat: int) -> bytes:
+            payload = base64.urlsafe_b64encode(json.dumps({"sub": sub, "iat": iat}).encode())
+            return b"Bearer eyJhbGciOiJIUzI1NiJ9." + payload.rstrip(b"=") + b".sig"
+
+        assert CanarySubject(authorization=token("alice", 1)).auth_subject() == "alice"
+        assert CanarySubject(authorization=b"Basic dXNlcjpwYXNz").auth_subject() == "Basic dXNlcjpwYXNz"
+
+        rule = CanaryRule(endpoint_pattern="/api", percentage=50, sticky_key="auth_subject")
+        router = CanaryRouter(rules=[rule], canary_enabled=True)
+        for user in ["alice", "bob", "carol", "dave"]:
+            first = router.should_use_canary(None, "/api", "GET", subject=CanarySubject(authorization=token(user, 1)))
+            again = router.should_use_canary(None, "/api", "GET", subject=CanarySubject(authorization=token(user, 2)))
+            assert first == again
+
+    def test_sticky_path_group_key(self):
+        """Test that a path:<group> key hashes the named regex group."""
+        rule = CanaryRule(
+            endpoint_pattern=r"^/api/v1/accounts/(?P<account>[^/]+)",
+            percentage=50,
+            sticky_key="path:account",
+        )
+        router = CanaryRouter(rules=[rule], canary_enabled=True)
+
+        for account in range(20):
+            a = router.should_use_canary(None, f"/api/v1/accounts/{account}/balance", "GET")
+            b = router.should_use_canary(None, f"/api/v1/accounts/{account}/history", "GET")
+            assert a == b
+            if a[0]:
+                assert a[1] == "sticky:path:account:50%"
+
+    def test_sticky_key_missing_falls_back_to_random(self):
+        """Test that a sticky rule without its key still routes by random roll."""
+        rule = CanaryRule(endpoint_pattern="/api", percentage=100, sticky_key="auth_subject")
+        router = CanaryRouter(rules=[rule], canary_enabled=True)
+        assert router.should_use_canary(None, "/api", "GET", subject=CanarySubject()) == (True, "percentage:100%")
+
+    def test_invalid_sticky_key_rejected(self):
+        """Test that unknown sticky keys fail at rule construction."""
+        with pytest.raises(ValueError):
+            CanaryRule(endpoint_pattern="/api", percentage=10, sticky_key="cookie")
+
+
 class TestCanaryConfig:
     """Tests for canary config loading."""
 
@@ -175,6 +380,298 @@ class TestCanaryConfig:
         assert len(router.rules) == 1
         assert router.rules[0].partner == "nav"
 
+    def test_load_canary_config_sticky_keys(self, tmp_path):
+        """Test that a top-level sticky_key applies to rules without their own."""
+        config_path = tmp_path / "canary_config.json"
+        config_path.write_text(json.dumps({
+            "enabled": True,
+            "sticky_key": "auth_subject",
+            "rules": [
+                {"endpoint_pattern": "/api/a", "percentage": 10},
+                {"endpoint_pattern": "/api/b", "percentage": 10, "sticky_key": "partner", "salt": "b-v2"},
+            ],
+        }))
+
+        router = load_canary_config(str(config_path))
+        assert [r.sticky_key for r in router.rules] == ["auth_subject", "partner"]
+        assert router.rules[1].hash_salt == "b-v2"
+
+
+class TestCanaryConfigReload:
+    """Tests for hot reload of the canary config."""
+
+    @staticmethod
+    def _write(path: Path, percentage, mtime_ns: int) -> None:
+        path.write_text(json.dumps({
+            "enabled": True,
+            "rules": [{"endpoint_pattern": "/api", "method": "GET", "percentage": percentage}],
+        }))
+        # Explicit mtimes: same-second rewrites must still be noticed
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_parse_canary_config_rejects_invalid(self):
+        """Test that strict parsing rejects bad percentages and regexes outright."""
+        with pytest.raises(ValueError):
+            parse_canary_config(b'{"rules": [{"endpoint_pattern": "/api", "percentage": 150}]}')
+        with pytest.raises(ValueError):
+            parse_canary_config(b'{"rules": [{"endpoint_pattern": "^/x[", "percentage": 5}]}')
+        with pytest.raises(ValueError):
+            parse_canary_config(b'{"rules": {}}')
+
+    @pytest.mark.asyncio
+    async def test_reload_on_change_swaps_router(self, tmp_path):
+        """Test that a changed file is compiled off-loop and swapped in with a new version."""
+        import threading
+
+        config_path = tmp_path / "canary_config.json"
+        self._write(config_path, 10, 1_000_000_000)
+        reloader = CanaryConfigReloader(str(config_path), poll_interval=0)
+        old_router = reloader.router
+        assert old_router.rules[0].percentage == 10
+
+        assert await reloader.reload() is False  # unchanged
+
+        compile_threads = []
+        real_parse = parse_canary_config
+
+        def recording_parse(raw):
+            compile_threads.append(threading.current_thread())
+            return real_parse(raw)
+
+        self._write(config_path, 30, 2_000_000_000)
+        with patch("gateway.proxy.canary_reload.parse_canary_config", side_effect=recording_parse):
+            assert await reloader.reload() is True
+
+        assert compile_threads and compile_threads[0] is not threading.main_thread()
+        assert reloader.router is not old_router
+        assert reloader.router.rules[0].percentage == 30
+        assert reloader.router.version != old_router.version
+        # The old instance is untouched for requests that already hold it
+        assert old_router.rules[0].percentage == 10
+        assert reloader.status()["reload_count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_invalid_config_keeps_last_good_rules(self, tmp_path):
+        """Test that a broken edit is reported and the previous rules stay active."""
+        config_path = tmp_path / "canary_config.json"
+        self._write(config_path, 10, 1_000_000_000)
+        reloader = CanaryConfigReloader(str(config_path), poll_interval=0)
+        good = reloader.router
+
+        config_path.write_text('{"enabled": true, "rules": [')
+        assert await reloader.reload() is False
+        assert reloader.router is good
+        assert reloader.status()["last_error"]
+
+        self._write(config_path, "ten", 3_000_000_000)
+        assert await reloader.reload() is False
+        assert reloader.router is good
+
+        config_path.unlink()
+        assert await reloader.reload() is False
+        assert reloader.router is good
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not hasattr(__import__("signal"), "SIGHUP"), reason="no SIGHUP")
+    async def test_sighup_forces_reload(self, tmp_path):
+        """Test that SIGHUP reloads even when the file stamp looks unchanged."""
+        import asyncio
+        import signal
+
+        config_path = tmp_path / "canary_config.json"
+        self._write(config_path, 10, 1_000_000_000)
+        reloader = CanaryConfigReloader(str(config_path), poll_interval=0)
+        reloader.start()
+        try:
+            self._write(config_path, 20, 1_000_000_000)
+            assert await reloader.reload() is False  # stamp identical (same size, same mtime)
+            os.kill(os.getpid(), signal.SIGHUP)
+            for _ in range(100):
+                if reloader.router.rules[0].percentage == 20:
+                    break
+                await asyncio.sleep(0.01)
+            assert reloader.router.rules[0].percentage == 20
+        finally:
+            await reloader.stop()
+
+    @pytest.mark.asyncio
+    async def test_sighup_reload_failure_is_logged(self, monkeypatch, tmp_path, caplog):
+        """Test that the SIGHUP reload task is kept until done and its failure is logged."""
+        reloader = CanaryConfigReloader(str(tmp_path / "canary_config.json"), poll_interval=0)
+        reload_started = asyncio.Event()
+
+        async def failing_reload(force: bool = False) -> bool:
+            reload_started.set()
+            await asyncio.sleep(0)
+            raise OSError("disk gone")
+
+        monkeypatch.setattr(reloader, "reload", failing_reload)
+        reloader._on_sighup()
+        (task,) = reloader._sighup_tasks
+        await asyncio.gather(task, return_exceptions=True)
+
+        assert reload_started.is_set()
+        assert reloader._sighup_tasks == set()
+        assert "canary_config_sighup_failed error=disk gone" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_debug_endpoint_reports_version(self, monkeypatch, tmp_path):
+        """Test that /debug/canary reports the active config version."""
+        from gateway.routers.debug import router as debug_router
+
+        config_path = tmp_path / "canary_config.json"
+        self._write(config_path, 10, 1_000_000_000)
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(config_path),
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        app = FastAPI()
+        app.include_router(debug_router)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gw") as c:
+            response = await c.get("/debug/canary")
+
+        assert response.status_code == 200
+        assert response.json()["version"] == proxy_client.canary_router.version
+        assert response.json()["rules_count"] == 1
+        await proxy_client.close()
+
+
+class TestCanaryRollback:
+    """Tests for automatic canary rollback."""
+
+    @staticmethod
+    def _router(**policy) -> tuple[CanaryRouter, CanaryRule]:
+        from gateway.proxy.rollback import RollbackPolicy
+
+        rule = CanaryRule(endpoint_pattern="/api", method="GET", percentage=100)
+        router = CanaryRouter(
+            rules=[rule], canary_enabled=True, rollback=RollbackPolicy(**policy)
+        )
+        return router, rule
+
+    def test_sliding_window_expires_and_estimates_p99(self):
+        """Test that the ring of time slices forgets old samples and bins latencies."""
+        from gateway.proxy.metrics import SlidingWindow
+
+        window = SlidingWindow(window_seconds=10, slots=10)
+        for _ in range(99):
+            window.record(4, error=False, now=100.0)
+        window.record(900, error=True, now=100.5)
+        assert window.totals(100.5) == (100, 1)
+        assert window.percentile(50, 100.5) == 5
+        assert window.percentile(100, 100.5) == 1_000
+
+        window.record(4, error=False, now=109.5)
+        assert window.totals(109.9) == (101, 1)
+        assert window.totals(110.5) == (1, 0)  # the t=100 slice fell out of the window
+
+    def test_error_rate_trips_and_disables_rule(self):
+        """Test that canary 5xx above legacy disables the rule with a rollback reason."""
+        import time
+
+        router, rule = self._router(min_requests=10, max_error_rate_delta=0.1, cooldown_seconds=60)
+        assert router.should_use_canary(None, "/api/x", "GET") == (True, "percentage:100%")
+
+        now = time.monotonic()
+        for _ in range(20):
+            router.health.record(rule.identity, False, 200, 5, now)
+        for i in range(20):
+            router.health.record(rule.identity, True, 503 if i % 2 else 200, 5, now + 1.5)
+
+        assert router.should_use_canary(None, "/api/x", "GET") == (False, "rollback:error_rate")
+        decision = router.decide(None, "/api/x", "GET")
+        assert decision.rule is rule
+        # Cooldown over: the configured percentage applies again
+        assert router.health.trip_for(rule.identity, now + 62) is None
+        assert router.should_use_canary(None, "/api/x", "GET") == (True, "percentage:100%")
+
+    def test_p99_trip_throttles_rule(self):
+        """Test that a slow canary is throttled to the configured percentage."""
+        import time
+
+        router, rule = self._router(
+            min_requests=10, max_p99_ratio=2.0, action="throttle", throttle_percentage=5
+        )
+        now = time.monotonic()
+        for _ in range(20):
+            router.health.record(rule.identity, False, 200, 40, now)
+            router.health.record(rule.identity, True, 200, 400, now)
+
+        results = {router.should_use_canary(None, "/api/x", "GET") for _ in range(300)}
+        assert results <= {(True, "rollback_throttle:p99:5%"), (False, "rollback_throttle:p99:5%")}
+        assert (False, "rollback_throttle:p99:5%") in results
+
+    def test_healthy_canary_is_left_alone(self):
+        """Test that no trip happens below thresholds or without enough samples."""
+        import time
+
+        router, rule = self._router(min_requests=10, max_error_rate=0.5)
+        now = time.monotonic()
+        for _ in range(5):
+            router.health.record(rule.identity, True, 500, 5, now)  # too few to judge
+        for _ in range(20):
+            router.health.record(rule.identity, False, 200, 5, now)
+        assert router.health.trip_for(rule.identity, now) is None
+        assert router.decide(None, "/api/x", "GET").use_canary is True
+
+    def test_rollback_state_survives_reload(self):
+        """Test that a reloaded router keeps windows and trips of unchanged rules."""
+        import time
+
+        router, rule = self._router(min_requests=5, max_error_rate=0.1)
+        now = time.monotonic()
+        for _ in range(10):
+            router.health.record(rule.identity, True, 500, 5, now)
+
+        reloaded = parse_canary_config(json.dumps({
+            "rules": [{"endpoint_pattern": "/api", "method": "GET", "percentage": 50}],
+            "rollback": {"min_requests": 5, "max_error_rate": 0.1},
+        }).encode())
+        reloaded.adopt_state(router)
+        assert reloaded.should_use_canary(None, "/api/x", "GET") == (False, "rollback:error_rate")
+
+    def test_invalid_rollback_config_rejected(self):
+        """Test that a bad rollback section rejects the whole config."""
+        with pytest.raises(ValueError):
+            parse_canary_config(b'{"rules": [], "rollback": {"action": "panic"}}')
+        with pytest.raises(ValueError):
+            parse_canary_config(b'{"rules": [], "rollback": {"max_p99": 3}}')
+
+    @pytest.mark.asyncio
+    async def test_reason_reaches_response_header(self, monkeypatch, tmp_path):
+        """Test that a failing canary is rolled back and the reason is in the debug header."""
+        config_path = tmp_path / "canary_config.json"
+        config_path.write_text(json.dumps({
+            "rules": [{"endpoint_pattern": "/api", "method": "GET", "percentage": 100}],
+            "rollback": {"min_requests": 5, "max_error_rate": 0.5},
+        }))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            upstream_canary_base_url="https://canary-api.example.com",
+            canary_config_path=str(config_path),
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(503 if request.url.host.startswith("canary") else 200)
+        ))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        reasons = []
+        for _ in range(8):
+            response = await proxy_handler(
+                make_asgi_request("GET", "/api/items", {}),
+                "api/items",
+                canary_router=proxy_client.canary_router,
+                debug_mode=True,
+            )
+            reasons.append(httpx.Headers(response.raw_headers)["x-gateway-upstream-reason"])
+            await response.background()
+
+        assert reasons[:5] == ["percentage:100%"] * 5
+        assert reasons[-1] == "rollback:error_rate"
+        await proxy_client.close()
+
 
 class TestPartnerExtraction:
     """Tests for partner extraction from URL path."""
@@ -200,6 +697,126 @@ class TestPartnerExtraction:
         assert partner == "nav"
 
 
+class TestHeaderPipeline:
+    """Tests for raw header list processing."""
+
+    def test_build_upstream_headers_single_pass(self):
+        """Test hop-by-hop removal, request-id bridging and X-Forwarded-* replacement."""
+        raw = [
+            (b"host", b"gateway.example.com"),
+            (b"connection", b"keep-alive"),
+            (b"authorization", b"Bearer token123"),
+            (b"x-request-id", b"x-req-1"),
+            (b"x-forwarded-for", b"10.0.0.1"),
+            (b"x-forwarded-proto", b"http"),
+            (b"te", b"trailers"),
+        ]
+
+        result = build_upstream_headers(raw, client_ip="1.2.3.4", scheme="https")
+
+        assert result.request_id == "x-req-1"
+        assert result.headers == [
+            (b"host", b"gateway.example.com"),
+            (b"authorization", b"Bearer token123"),
+            (b"x-request-id", b"x-req-1"),
+            (b"request-id", b"x-req-1"),
+            (b"x-forwarded-host", b"gateway.example.com"),
+            (b"x-forwarded-proto", b"https"),
+            (b"x-forwarded-for", b"10.0.0.1, 1.2.3.4"),
+        ]
+
+    def test_build_upstream_headers_keeps_existing_request_id(self):
+        """Test that request-id wins and x-request-id is then forwarded untouched."""
+        raw = [(b"x-request-id", b"x-req-1"), (b"request-id", b"req-1")]
+
+        result = build_upstream_headers(raw, client_ip="", scheme="")
+
+        assert result.request_id == "req-1"
+        assert (b"request-id", b"req-1") in result.headers
+        assert (b"x-request-id", b"x-req-1") in result.headers
+        assert (b"x-forwarded-proto", b"https") in result.headers
+        assert not any(name == b"x-forwarded-for" for name, _ in result.headers)
+
+    @pytest.mark.parametrize(
+        "raw",
+        [
+            [(b"x-request-id", b"x-req-1")],
+            [(b"request-id", b"req-1"), (b"x-request-id", b"x-req-1")],
+            [(b"request-id", b""), (b"x-request-id", b"x-req-1")],
+            [(b"request-id", b""), (b"request-id", b"req-2"), (b"x-correlation-id", b"corr-1")],
+            [(b"x-request-id", b""), (b"x-correlation-id", b"corr-1")],
+        ],
+    )
+    def test_build_upstream_headers_matches_previous_request_id_handling(self, raw):
+        """Test that request-id and x-request-id reach upstream as the dict-based forwarding sent them."""
+
+        # The handler's former _get_request_id + _get_forwarded_headers, request-id part
+        def previous(raw):
+            inbound = Headers(raw=raw)
+            request_id = inbound.get("request-id")
+            if not request_id:
+                request_id = inbound.get("X-Request-ID") or inbound.get("X-Correlation-Id")
+            headers = dict(inbound)
+            headers["request-id"] = request_id
+            return {k: v for k, v in headers.items() if k in ("request-id", "x-request-id")}
+
+        result = build_upstream_headers(raw, client_ip="1.2.3.4", scheme="https")
+        forwarded = [
+            (name.decode(), value.decode())
+            for name, value in result.headers
+            if name in (b"request-id", b"x-request-id")
+        ]
+
+        assert sorted(forwarded) == sorted(previous(raw).items())
+        assert result.request_id == previous(raw)["request-id"]
+
+    def test_build_upstream_headers_treats_empty_request_id_as_missing(self):
+        """Test that an empty request-id is replaced, not forwarded."""
+        result = build_upstream_headers([(b"request-id", b"")], client_ip="", scheme="https")
+
+        assert result.request_id
+        assert [value for name, value in result.headers if name == b"request-id"] == [
+            result.request_id.encode()
+        ]
+
+    def test_build_upstream_headers_joins_every_forwarded_for(self):
+        """Test that several inbound X-Forwarded-For headers keep all their hops, in order."""
+        raw = [
+            (b"x-forwarded-for", b"203.0.113.7"),
+            (b"accept", b"*/*"),
+            (b"x-forwarded-for", b"10.0.0.1, 10.0.0.2"),
+        ]
+
+        result = build_upstream_headers(raw, client_ip="1.2.3.4", scheme="https")
+
+        assert [value for name, value in result.headers if name == b"x-forwarded-for"] == [
+            b"203.0.113.7, 10.0.0.1, 10.0.0.2, 1.2.3.4"
+        ]
+        no_client = build_upstream_headers(raw, client_ip="", scheme="https")
+        assert (b"x-forwarded-for", b"203.0.113.7, 10.0.0.1, 10.0.0.2") in no_client.headers
+
+    def test_build_upstream_headers_generates_request_id(self):
+        """Test that a request-id is generated when no id header is present."""
+        result = build_upstream_headers([], client_ip="1.2.3.4", scheme="https")
+        assert result.request_id
+        assert (b"request-id", result.request_id.encode()) in result.headers
+
+    def test_filter_response_headers(self):
+        """Test that response headers are lowercased and hop-by-hop headers dropped."""
+        raw = [
+            (b"Content-Type", b"application/json"),
+            (b"Transfer-Encoding", b"chunked"),
+            (b"Connection", b"close"),
+            (b"Set-Cookie", b"a=1"),
+            (b"Set-Cookie", b"b=2"),
+        ]
+        assert filter_response_headers(raw) == [
+            (b"content-type", b"application/json"),
+            (b"set-cookie", b"a=1"),
+            (b"set-cookie", b"b=2"),
+        ]
+
+
 class TestProxyHandler:
     """Tests for proxy handler."""
 
@@ -207,18 +824,16 @@ class TestProxyHandler:
     async def test_proxy_handler_basic_get(self, mock_proxy_client, mock_httpx_response):
         """Test basic GET proxy forwarding with query/body preservation."""
         # Create mock request
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/api/v1/test"
-        request.url.query = "param=value&other=123"
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "request-id": "req-123",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b"")
+        request = make_asgi_request(
+            "GET",
+            "/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "request-id": "req-123",
+                "host": "gateway.example.com",
+            },
+            query="param=value&other=123",
+        )
 
         # Mock httpx stream context manager
         mock_stream_context = AsyncMock()
@@ -243,28 +858,26 @@ class TestProxyHandler:
         # Verify query string is preserved in URL
         assert "param=value" in call_kwargs["url"] or "other=123" in call_kwargs["url"]
         # Verify request-id header (upstream format: lowercase, hyphenated)
-        assert "request-id" in call_kwargs["headers"]
-        assert call_kwargs["headers"]["request-id"] == "req-123"
-        assert "X-Forwarded-For" in call_kwargs["headers"]
+        upstream_headers = httpx.Headers(call_kwargs["headers"])
+        assert "request-id" in upstream_headers
+        assert upstream_headers["request-id"] == "req-123"
+        assert "X-Forwarded-For" in upstream_headers
         # Verify no invented context headers
-        assert "X-Partner-Id" not in call_kwargs["headers"]
-        assert "X-API-Profile" not in call_kwargs["headers"]
+        assert "X-Partner-Id" not in upstream_headers
+        assert "X-API-Profile" not in upstream_headers
 
     @pytest.mark.asyncio
     async def test_proxy_handler_request_id_bridging(self, mock_proxy_client, mock_httpx_response):
         """Test request ID bridging from x-request-id to request-id."""
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/api/v1/test"
-        request.url.query = ""
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "X-Request-ID": "x-req-456",  # Uppercase version
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b"")
+        request = make_asgi_request(
+            "GET",
+            "/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "X-Request-ID": "x-req-456",  # Uppercase version
+                "host": "gateway.example.com",
+            },
+        )
 
         mock_stream_context = AsyncMock()
         mock_stream_context.__aenter__ = AsyncMock(return_value=mock_httpx_response)
@@ -283,25 +896,24 @@ class TestProxyHandler:
         assert response.status_code == 200
         call_kwargs = mock_proxy_client.client.stream.call_args[1]
         # Verify x-request-id was bridged to request-id
-        assert call_kwargs["headers"]["request-id"] == "x-req-456"
-        assert "X-Request-ID" not in call_kwargs["headers"] or call_kwargs["headers"].get("X-Request-ID") != "x-req-456"
+        upstream_headers = httpx.Headers(call_kwargs["headers"])
+        assert upstream_headers["request-id"] == "x-req-456"
+        assert upstream_headers["x-request-id"] == "x-req-456"
 
     @pytest.mark.asyncio
     async def test_proxy_handler_post_with_body(self, mock_proxy_client, mock_httpx_response):
         """Test POST proxy forwarding with body preservation."""
-        request = MagicMock(spec=Request)
-        request.method = "POST"
-        request.url.path = "/api/v1/test"
-        request.url.query = ""
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "Content-Type": "application/json",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
         request_body = b'{"key": "value"}'
-        request.body = AsyncMock(return_value=request_body)
+        request = make_asgi_request(
+            "POST",
+            "/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "Content-Type": "application/json",
+                "host": "gateway.example.com",
+            },
+            body_chunks=[request_body],
+        )
 
         mock_stream_context = AsyncMock()
         mock_stream_context.__aenter__ = AsyncMock(return_value=mock_httpx_response)
@@ -321,22 +933,20 @@ class TestProxyHandler:
         call_kwargs = mock_proxy_client.client.stream.call_args[1]
         assert call_kwargs["method"] == "POST"
         assert call_kwargs["content"] == request_body
-        assert call_kwargs["headers"]["Content-Type"] == "application/json"
+        assert httpx.Headers(call_kwargs["headers"])["Content-Type"] == "application/json"
 
     @pytest.mark.asyncio
     async def test_proxy_handler_query_string_preservation(self, mock_proxy_client, mock_httpx_response):
         """Test that query string is preserved correctly."""
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/api/v1/test"
-        request.url.query = "foo=bar&baz=qux"
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b"")
+        request = make_asgi_request(
+            "GET",
+            "/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "host": "gateway.example.com",
+            },
+            query="foo=bar&baz=qux",
+        )
 
         mock_stream_context = AsyncMock()
         mock_stream_context.__aenter__ = AsyncMock(return_value=mock_httpx_response)
@@ -364,25 +974,22 @@ class TestProxyHandler:
         """Test streaming response handling."""
         from starlette.responses import StreamingResponse
         
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/api/v1/stream"
-        request.url.query = ""
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b"")
+        request = make_asgi_request(
+            "GET",
+            "/api/v1/stream",
+            {
+                "Authorization": "Bearer token123",
+                "host": "gateway.example.com",
+            },
+        )
 
         # Create mock streaming response
         mock_stream_response = MagicMock()
         mock_stream_response.status_code = 200
-        mock_stream_response.headers = {"Content-Type": "application/octet-stream"}
+        mock_stream_response.headers = httpx.Headers({"Content-Type": "application/octet-stream"})
         
         # Mock streaming chunks
-        async def mock_aiter_bytes():
+        async def mock_aiter_bytes(chunk_size=None):
             yield b"chunk1"
             yield b"chunk2"
             yield b"chunk3"
@@ -413,24 +1020,71 @@ class TestProxyHandler:
         
         assert chunks == [b"chunk1", b"chunk2", b"chunk3"]
 
+    @pytest.mark.asyncio
+    async def test_proxy_handler_keeps_upstream_open_until_body_sent(self, mock_proxy_client):
+        """Test that the upstream stream outlives proxy_handler and is closed after the body."""
+        request = make_asgi_request("GET", "/api/v1/stream", {"host": "gateway.example.com"})
+
+        events = []
+        requested_chunk_sizes = []
+
+        mock_stream_response = MagicMock()
+        mock_stream_response.status_code = 200
+        mock_stream_response.headers = httpx.Headers({"Content-Type": "application/octet-stream"})
+
+        async def mock_aiter_bytes(chunk_size=None):
+            requested_chunk_sizes.append(chunk_size)
+            for chunk in (b"a" * 4, b"b" * 4):
+                events.append("chunk")
+                yield chunk
+
+        mock_stream_response.aiter_bytes = mock_aiter_bytes
+        mock_stream_response.aread = AsyncMock()
+
+        async def mock_aexit(*args):
+            events.append("closed")
+
+        mock_stream_context = AsyncMock()
+        mock_stream_context.__aenter__ = AsyncMock(return_value=mock_stream_response)
+        mock_stream_context.__aexit__ = AsyncMock(side_effect=mock_aexit)
+        mock_proxy_client.client.stream = MagicMock(return_value=mock_stream_context)
+        mock_proxy_client.stream_chunk_size = 4
+
+        with patch("gateway.proxy.handler.get_proxy_client", return_value=mock_proxy_client):
+            response = await proxy_handler(
+                request=request,
+                full_path="/api/v1/stream",
+                canary_router=None,
+                debug_mode=False,
+            )
+
+        # Body is not buffered up front and the stream is still open
+        mock_stream_response.aread.assert_not_called()
+        assert events == []
+
+        chunks = [chunk async for chunk in response.body_iterator]
+        await response.background()
+
+        assert chunks == [b"aaaa", b"bbbb"]
+        assert requested_chunk_sizes == [4]
+        # Closed exactly once, after the last chunk
+        assert events == ["chunk", "chunk", "closed"]
+
     @pytest.mark.asyncio
     async def test_proxy_handler_hop_by_hop_headers_stripped(self, mock_proxy_client, mock_httpx_response):
         """Test that hop-by-hop headers are stripped from request."""
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/api/v1/test"
-        request.url.query = ""
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "Connection": "keep-alive",
-            "Keep-Alive": "timeout=5",
-            "Transfer-Encoding": "chunked",
-            "Upgrade": "websocket",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b"")
+        request = make_asgi_request(
+            "GET",
+            "/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "Connection": "keep-alive",
+                "Keep-Alive": "timeout=5",
+                "Transfer-Encoding": "chunked",
+                "Upgrade": "websocket",
+                "host": "gateway.example.com",
+            },
+        )
 
         mock_stream_context = AsyncMock()
         mock_stream_context.__aenter__ = AsyncMock(return_value=mock_httpx_response)
@@ -448,7 +1102,7 @@ class TestProxyHandler:
 
         assert response.status_code == 200
         call_kwargs = mock_proxy_client.client.stream.call_args[1]
-        headers = call_kwargs["headers"]
+        headers = httpx.Headers(call_kwargs["headers"])
         
         # Verify hop-by-hop headers are stripped
         assert "connection" not in headers or headers.get("connection") != "keep-alive"
@@ -464,17 +1118,14 @@ class TestProxyHandler:
     @pytest.mark.asyncio
     async def test_proxy_handler_canary_routing_get(self, mock_proxy_client, mock_httpx_response):
         """Test proxy forwarding with canary routing for GET."""
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/partners/nav/api/v1/test"
-        request.url.query = ""
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b"")
+        request = make_asgi_request(
+            "GET",
+            "/partners/nav/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "host": "gateway.example.com",
+            },
+        )
 
         mock_stream_context = AsyncMock()
         mock_stream_context.__aenter__ = AsyncMock(return_value=mock_httpx_response)
@@ -509,17 +1160,15 @@ class TestProxyHandler:
         self, mock_proxy_client, mock_httpx_response
     ):
         """Test that POST requests are blocked from canary routing."""
-        request = MagicMock(spec=Request)
-        request.method = "POST"
-        request.url.path = "/partners/nav/api/v1/test"
-        request.url.query = ""
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b'{"data": "test"}')
+        request = make_asgi_request(
+            "POST",
+            "/partners/nav/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "host": "gateway.example.com",
+            },
+            body_chunks=[b'{"data": "test"}'],
+        )
 
         mock_stream_context = AsyncMock()
         mock_stream_context.__aenter__ = AsyncMock(return_value=mock_httpx_response)
@@ -565,17 +1214,15 @@ class TestContractFirstVsCatchAll:
         proxy_handler implementation and shared httpx client.
         """
         # Create a simple GET request
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/api/v1/test"
-        request.url.query = "param=value"
-        request.url.scheme = "https"
-        request.headers = {
-            "Authorization": "Bearer token123",
-            "host": "gateway.example.com",
-        }
-        request.client.host = "1.2.3.4"
-        request.body = AsyncMock(return_value=b"")
+        request = make_asgi_request(
+            "GET",
+            "/api/v1/test",
+            {
+                "Authorization": "Bearer token123",
+                "host": "gateway.example.com",
+            },
+            query="param=value",
+        )
 
         # Mock streaming response with known content
         response_content = b'{"status": "ok", "data": "test"}'
@@ -584,9 +1231,9 @@ class TestContractFirstVsCatchAll:
             """Create a fresh mock stream response for each call."""
             mock_stream_response = MagicMock()
             mock_stream_response.status_code = 200
-            mock_stream_response.headers = {"Content-Type": "application/json"}
+            mock_stream_response.headers = httpx.Headers({"Content-Type": "application/json"})
             
-            async def mock_aiter_bytes():
+            async def mock_aiter_bytes(chunk_size=None):
                 yield response_content
             
             mock_stream_response.aiter_bytes = mock_aiter_bytes
@@ -596,7 +1243,7 @@ class TestContractFirstVsCatchAll:
         # Track calls to verify they use the same client
         call_count = {"count": 0}
         
-        def create_mock_stream_context():
+        def create_mock_stream_context(*args, **kwargs):
             """Create a mock stream context that tracks calls."""
             call_count["count"] += 1
             mock_context = AsyncMock()
@@ -641,8 +1288,8 @@ class TestContractFirstVsCatchAll:
         assert "param=value" in call1_url
         
         # Both should forward same headers (excluding request-id which may differ)
-        call1_headers = mock_proxy_client.client.stream.call_args_list[0][1]["headers"]
-        call2_headers = mock_proxy_client.client.stream.call_args_list[1][1]["headers"]
+        call1_headers = httpx.Headers(mock_proxy_client.client.stream.call_args_list[0][1]["headers"])
+        call2_headers = httpx.Headers(mock_proxy_client.client.stream.call_args_list[1][1]["headers"])
         
         # Check key headers are present in both
         assert "Authorization" in call1_headers
@@ -676,3 +1323,2049 @@ class TestContractFirstVsCatchAll:
         assert mock_proxy_client.client.stream.call_count == 2
         # Both calls should use the same client instance
         assert mock_proxy_client.client.stream.call_args_list[0].args == mock_proxy_client.client.stream.call_args_list[1].args
+
+
+class TestRequestBodyForwarding:
+    """Tests for request body forwarding modes."""
+
+    @pytest.mark.asyncio
+    async def test_stream_mode_pipes_chunks_and_keeps_content_length(
+        self, mock_proxy_client, mock_httpx_response
+    ):
+        """Test that stream mode hands httpx the inbound stream instead of a buffered body."""
+        request = make_asgi_request(
+            "POST",
+            "/s3_data_upload",
+            {"host": "gateway.example.com", "content-length": "12"},
+            body_chunks=[b"part1-", b"part2-"],
+        )
+        forwarded = {}
+
+        def capture_stream(**kwargs):
+            forwarded.update(kwargs)
+            mock_stream_context = AsyncMock()
+            mock_stream_context.__aenter__ = AsyncMock(return_value=mock_httpx_response)
+            mock_stream_context.__aexit__ = AsyncMock(return_value=None)
+            return mock_stream_context
+
+        mock_proxy_client.client.stream = MagicMock(side_effect=capture_stream)
+
+        with patch("gateway.proxy.handler.get_proxy_client", return_value=mock_proxy_client):
+            response = await proxy_handler(
+                request=request,
+                full_path="/s3_data_upload",
+                body_mode="stream",
+            )
+
+        assert response.status_code == 200
+        assert not isinstance(forwarded["content"], bytes)
+        assert httpx.Headers(forwarded["headers"])["content-length"] == "12"
+        chunks = [chunk async for chunk in forwarded["content"]]
+        assert b"".join(chunks) == b"part1-part2-"
+
+    @pytest.mark.asyncio
+    async def test_stream_mode_without_body_sends_no_content(self):
+        """Test that a body-less GET is not turned into a chunked upload."""
+        request = make_asgi_request("GET", "/heartbeat", {"host": "gateway.example.com"})
+        body = await read_request_body(request, mode="stream")
+        assert body.content() is None
+
+    @pytest.mark.asyncio
+    async def test_spool_mode_is_replayable_and_spills_to_disk(self, monkeypatch):
+        """Test that a spooled body can be sent twice, and file I/O past the memory limit runs in threads."""
+        offloaded = []
+        to_thread = asyncio.to_thread
+
+        async def recording_to_thread(func, /, *args):
+            offloaded.append((func.__name__, args))
+            return await to_thread(func, *args)
+
+        monkeypatch.setattr(asyncio, "to_thread", recording_to_thread)
+        request = make_asgi_request(
+            "POST",
+            "/api/v1/upload",
+            {"host": "gateway.example.com", "transfer-encoding": "chunked"},
+            body_chunks=[b"a" * 8, b"b" * 8, b"c" * 8],
+        )
+        body = await read_request_body(request, mode="spool", spool_max_memory=10)
+        try:
+            assert body.replayable
+            assert body.size == 24
+            # The first chunk fits in memory; the rollover write and later ones do not
+            assert offloaded == [("write", (b"b" * 8,)), ("write", (b"c" * 8,))]
+            assert body.snapshot(max_bytes=1024) is None
+
+            first = b"".join([chunk async for chunk in body.content(chunk_size=5)])
+            second = b"".join([chunk async for chunk in body.content(chunk_size=5)])
+            assert first == second == b"a" * 8 + b"b" * 8 + b"c" * 8
+        finally:
+            await body.aclose()
+
+    @pytest.mark.asyncio
+    async def test_small_spooled_body_stays_on_the_event_loop(self, monkeypatch):
+        """Test that a spooled body under the memory limit is written and read without threads."""
+        offloaded = []
+        monkeypatch.setattr(asyncio, "to_thread", lambda *args: offloaded.append(args))
+        request = make_asgi_request(
+            "POST",
+            "/api/v1/upload",
+            {"host": "gateway.example.com", "content-length": "10"},
+            body_chunks=[b"a" * 5, b"b" * 5],
+        )
+        body = await read_request_body(request, mode="spool", spool_max_memory=10)
+        try:
+            assert b"".join([chunk async for chunk in body.content(chunk_size=4)]) == b"aaaaabbbbb"
+            assert body.snapshot(max_bytes=1024) == b"aaaaabbbbb"
+        finally:
+            await body.aclose()
+
+        assert offloaded == []
+
+
+class TestProxyFastLane:
+    """Tests that the pure-ASGI fast lane behaves like the catch-all route."""
+
+    @pytest.fixture
+    def upstream_requests(self, monkeypatch, tmp_path):
+        """Install a real ProxyClient backed by an in-memory upstream; collect its requests."""
+        seen: list[httpx.Request] = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(
+                201,
+                headers={"Content-Type": "application/json", "X-Upstream": "legacy"},
+                content=b'{"proxied": true}',
+            )
+
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            debug_mode=True,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        return seen
+
+    @staticmethod
+    def _build_app(fast_lane: bool) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/heartbeat")
+        async def heartbeat():
+            return {"contract": True}
+
+        app.include_router(proxy_router)
+        if fast_lane:
+            app.add_middleware(ProxyFastLaneMiddleware, router=app.router)
+        return app
+
+    @staticmethod
+    async def _call(app: FastAPI, method: str, url: str, **kwargs) -> httpx.Response:
+        transport = httpx.ASGITransport(app=app, client=("1.2.3.4", 5555))
+        async with httpx.AsyncClient(transport=transport, base_url="https://gateway.example.com") as c:
+            return await c.request(method, url, **kwargs)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "method,url,body",
+        [
+            ("GET", "/api/v1/partners/nav/status?x=1&y=2", None),
+            ("POST", "/hooks/nav/leads", b'{"lead": 1}'),
+            # Path exists as a contract-first GET only, so POST falls through to the proxy
+            ("POST", "/heartbeat", b"ping"),
+        ],
+    )
+    async def test_fast_lane_matches_catch_all(self, upstream_requests, method, url, body):
+        """Test that upstream requests and downstream responses are identical on both paths."""
+        headers = {"Authorization": "Bearer token123", "X-Request-ID": "req-1"}
+
+        slow = await self._call(self._build_app(False), method, url, headers=headers, content=body)
+        fast = await self._call(self._build_app(True), method, url, headers=headers, content=body)
+
+        assert len(upstream_requests) == 2
+        via_catch_all, via_fast_lane = upstream_requests
+        assert via_fast_lane.method == via_catch_all.method == method
+        assert str(via_fast_lane.url) == str(via_catch_all.url)
+        assert via_fast_lane.url.path == url.split("?")[0]
+        assert via_fast_lane.content == via_catch_all.content == (body or b"")
+        assert via_fast_lane.headers.multi_items() == via_catch_all.headers.multi_items()
+        assert via_fast_lane.headers["request-id"] == "req-1"
+        assert via_fast_lane.headers["X-Forwarded-For"] == "1.2.3.4"
+
+        assert fast.status_code == slow.status_code == 201
+        assert fast.content == slow.content == b'{"proxied": true}'
+        assert fast.headers.multi_items() == slow.headers.multi_items()
+        assert fast.headers["X-Gateway-Upstream"] == "legacy"
+
+    @pytest.mark.asyncio
+    async def test_fast_lane_leaves_contract_first_routes_to_fastapi(self, upstream_requests):
+        """Test that routes defined on the app are not proxied by the fast lane."""
+        response = await self._call(self._build_app(True), "GET", "/heartbeat")
+
+        assert response.status_code == 200
+        assert response.json() == {"contract": True}
+        assert upstream_requests == []
+
+
+class TestShadowMirroring:
+    """Tests for fire-and-forget shadow traffic to the canary upstream."""
+
+    @staticmethod
+    def _proxy_client(tmp_path, legacy, canary, **kwargs) -> ProxyClient:
+        config_path = tmp_path / "canary_config.json"
+        config_path.write_text(json.dumps({
+            "enabled": True,
+            "rules": [],
+            "shadow_rules": [{"endpoint_pattern": "/api/v1/leads"}],
+        }))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            upstream_canary_base_url="https://canary-api.example.com",
+            canary_config_path=str(config_path),
+            **kwargs,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(legacy))
+        proxy_client.shadow_mirror.client = httpx.AsyncClient(transport=httpx.MockTransport(canary))
+        return proxy_client
+
+    @pytest.mark.asyncio
+    async def test_post_is_mirrored_and_diffed(self, monkeypatch, tmp_path):
+        """Test that a POST is served by legacy, replayed to canary, and the diff recorded."""
+        shadow_seen: list[httpx.Request] = []
+
+        def canary(request: httpx.Request) -> httpx.Response:
+            shadow_seen.append(request)
+            return httpx.Response(500, content=b"canary broke")
+
+        proxy_client = self._proxy_client(
+            tmp_path, lambda request: httpx.Response(201, content=b"created"), canary
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        proxy_client.start()
+        try:
+            request = make_asgi_request(
+                "POST", "/api/v1/leads", {"Content-Type": "application/json"}, [b'{"a": 1}']
+            )
+            response = await proxy_handler(
+                request, "api/v1/leads", canary_router=proxy_client.canary_router
+            )
+            assert response.status_code == 201
+            await proxy_client.shadow_mirror._queue.join()
+        finally:
+            await proxy_client.close()
+
+        assert len(shadow_seen) == 1
+        assert str(shadow_seen[0].url) == "https://canary-api.example.com/api/v1/leads"
+        assert shadow_seen[0].content == b'{"a": 1}'
+        assert shadow_seen[0].headers["x-gateway-shadow"] == "1"
+
+        status = proxy_client.shadow_mirror.status()
+        route = status["routes"]["POST * /api/v1/leads"]
+        assert route["compared"] == 1
+        assert route["status_mismatch"] == 1
+        assert route["status_pairs"] == {"201->500": 1}
+        assert route["latency_delta_ms"]["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_shadow_work(self, monkeypatch, tmp_path):
+        """Test that shadow copies are dropped, not awaited, when workers are saturated."""
+        import asyncio
+
+        release = asyncio.Event()
+
+        async def slow_canary(request: httpx.Request) -> httpx.Response:
+            await release.wait()
+            return httpx.Response(200)
+
+        proxy_client = self._proxy_client(
+            tmp_path,
+            lambda request: httpx.Response(200, content=b"ok"),
+            slow_canary,
+            shadow_queue_size=1,
+            shadow_workers=1,
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        proxy_client.start()
+        try:
+            for _ in range(4):
+                response = await proxy_handler(
+                    make_asgi_request("GET", "/api/v1/leads", {}),
+                    "api/v1/leads",
+                    canary_router=proxy_client.canary_router,
+                )
+                assert response.status_code == 200
+                await asyncio.sleep(0)  # let the worker pick up a job
+
+            counters = proxy_client.shadow_mirror.counters
+            assert counters.get("enqueued") == 2  # one in flight, one queued
+            assert counters.get("dropped_queue_full") == 2
+            release.set()
+            await proxy_client.shadow_mirror._queue.join()
+        finally:
+            await proxy_client.close()
+
+    @pytest.mark.asyncio
+    async def test_unmatched_and_streamed_requests_not_mirrored(self, tmp_path):
+        """Test that only shadow-rule matches with replayable bodies are captured."""
+        from gateway.proxy.body import UpstreamRequestBody
+        from gateway.proxy.canary import CanaryRule
+
+        mirror = ShadowMirror("https://canary-api.example.com", workers=1)
+        mirror.start()
+        try:
+            rule = CanaryRule(endpoint_pattern="/api")
+            streamed = UpstreamRequestBody(mode="stream", _stream=AsyncMock())
+            assert mirror.prepare(rule, "PUT", "u", [], streamed, "r1") is None
+            assert mirror.counters.get("dropped_body") == 1
+
+            buffered = UpstreamRequestBody(mode="buffer", data=b"x", size=1)
+            assert mirror.prepare(rule, "PUT", "u", [], buffered, "r2").body == b"x"
+        finally:
+            await mirror.stop()
+
+        router = parse_canary_config(
+            b'{"rules": [], "shadow_rules": [{"endpoint_pattern": "/api", "method": "POST"}]}'
+        )
+        assert router.shadow_rule(None, "/api/x", "POST") is not None
+        assert router.shadow_rule(None, "/api/x", "GET") is None
+        assert router.shadow_rule(None, "/other", "POST") is None
+
+
+class _StandInUpstream:
+    """Minimal local HTTP server standing in for one upstream instance."""
+
+    def __init__(self, name: str, delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.hits = 0
+        self.server = None
+
+    async def __aenter__(self) -> _StandInUpstream:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            while True:
+                if not await reader.readuntil(b"\r\n\r\n"):
+                    break
+                self.hits += 1
+                await asyncio.sleep(self.delay)
+                body = self.name.encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _unused_local_url() -> str:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+class TestUpstreamBalancing:
+    """Tests for balancing across several legacy upstream instances."""
+
+    def test_parse_upstream_urls(self):
+        """Test that UPSTREAM_BASE_URL accepts a comma-separated instance list."""
+        assert parse_upstream_urls("http://a:8001/, http://b:8002") == ["http://a:8001", "http://b:8002"]
+        assert parse_upstream_urls("https://legacy-api.example.com") == ["https://legacy-api.example.com"]
+        with pytest.raises(ValueError):
+            parse_upstream_urls(" , ")
+
+    def test_least_outstanding_and_p2c_prefer_idle_instances(self):
+        """Test that both strategies avoid the busiest instance."""
+        for strategy in ("least_outstanding", "p2c"):
+            pool = UpstreamPool(["http://a", "http://b", "http://c"], strategy=strategy)
+            busy, idle_1, idle_2 = pool.instances
+            busy.outstanding = 10
+            idle_1.outstanding = 1
+            picks = {pool.pick().base_url for _ in range(200)}
+            assert "http://a" not in picks
+            if strategy == "least_outstanding":
+                assert picks == {"http://c"}
+
+    @staticmethod
+    def _proxy_client(monkeypatch, tmp_path, urls: list[str], **kwargs) -> ProxyClient:
+        proxy_client = ProxyClient(
+            upstream_base_url=",".join(urls),
+            canary_config_path=str(tmp_path / "missing.json"),
+            connect_timeout=1.0,
+            **kwargs,
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        return proxy_client
+
+    @staticmethod
+    async def _get(path: str = "/api/x") -> tuple[int, bytes]:
+        response = await proxy_handler(make_asgi_request("GET", path, {}), path.lstrip("/"))
+        if not hasattr(response, "body_iterator"):
+            return response.status_code, response.body
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        return response.status_code, body
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_spread_over_local_upstreams(self, monkeypatch, tmp_path):
+        """Test that concurrent requests are spread over several real local upstreams."""
+        import asyncio
+
+        async with _StandInUpstream("a", delay=0.05) as a, _StandInUpstream(
+            "b", delay=0.05
+        ) as b, _StandInUpstream("c", delay=0.05) as c:
+            proxy_client = self._proxy_client(monkeypatch, tmp_path, [a.url, b.url, c.url])
+            try:
+                results = await asyncio.gather(*[self._get() for _ in range(30)])
+                assert {status for status, _ in results} == {200}
+                assert all(server.hits >= 5 for server in (a, b, c))
+                assert all(i.outstanding == 0 for i in proxy_client.upstream_pool.instances)
+            finally:
+                await proxy_client.close()
+
+    @pytest.mark.asyncio
+    async def test_dead_instance_is_ejected_and_probed_back(self, monkeypatch, tmp_path):
+        """Test that connect failures eject an instance and a successful probe reinstates it."""
+        dead_url = _unused_local_url()
+        async with _StandInUpstream("a") as a:
+            proxy_client = self._proxy_client(
+                monkeypatch,
+                tmp_path,
+                [a.url, dead_url],
+                outlier_consecutive_failures=2,
+                outlier_ejection_seconds=0.0,
+            )
+            pool = proxy_client.upstream_pool
+            dead = pool.instances[1]
+            try:
+                failures = 0
+                for _ in range(40):
+                    status, _ = await self._get()
+                    failures += status == 502
+                    if dead.ejections:
+                        break
+                assert failures == 2 and dead.ejections == 1
+
+                # Ejection expired but the prober owns reinstatement: no traffic until a probe
+                pool._prober = MagicMock()
+                hits_before = a.hits
+                for _ in range(5):
+                    assert await self._get() == (200, b"a")
+                assert a.hits == hits_before + 5
+
+                await pool.probe(proxy_client.client)  # still dead -> re-ejected, longer
+                assert dead.ejections == 2 and not dead.probing
+            finally:
+                pool._prober = None
+                await proxy_client.close()
+
+        async with _StandInUpstream("b") as b:
+            pool = UpstreamPool([b.url, dead_url], ejection_seconds=0.0)
+            pool.instances[0].ejected_until = 1.0  # expired ejection
+            async with httpx.AsyncClient() as client:
+                await pool.probe(client)
+            assert pool.instances[0].ejected_until == 0.0 and b.hits == 1
+
+
+class TestResponseCache:
+    """Tests for the opt-in TTL/LRU cache of proxied GET responses."""
+
+    @staticmethod
+    def _proxy_client(monkeypatch, tmp_path, upstream, cache_ttl=30, **kwargs) -> ProxyClient:
+        policy_path = tmp_path / "proxy_policy.json"
+        policy_path.write_text(json.dumps({
+            "routes": [{"name": "accounts", "path": "/api/v1/accounts", "cache_ttl": cache_ttl}],
+        }))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            route_policy_path=str(policy_path),
+            cache_max_bytes=kwargs.pop("cache_max_bytes", 64 * 1024),
+            **kwargs,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        return proxy_client
+
+    @staticmethod
+    async def _get(path: str, headers: dict | None = None, query: str = "") -> Response:
+        response = await proxy_handler(
+            make_asgi_request("GET", path, headers or {}, query=query), path.lstrip("/")
+        )
+        if hasattr(response, "body_iterator"):
+            response.body = b"".join([chunk async for chunk in response.body_iterator])
+            if response.background is not None:
+                await response.background()
+        return response
+
+    @pytest.mark.asyncio
+    async def test_repeated_get_is_served_from_cache(self, monkeypatch, tmp_path):
+        """Test that a second identical GET never reaches the upstream."""
+        calls = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(
+                200, content=b'{"balance": 1}', headers={"Request-Id": request.headers["request-id"]}
+            )
+
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, upstream)
+        try:
+            first = await self._get("/api/v1/accounts/1", {"Authorization": "Bearer a", "X-Request-ID": "r1"})
+            second = await self._get("/api/v1/accounts/1", {"Authorization": "Bearer a", "X-Request-ID": "r2"})
+        finally:
+            await proxy_client.close()
+
+        assert len(calls) == 1
+        assert first.body == second.body == b'{"balance": 1}'
+        headers = dict(second.raw_headers)
+        assert headers[b"request-id"] == b"r2"
+        assert b"age" in headers
+        assert proxy_client.response_cache.status()["routes"]["accounts"] == {"hits": 1, "misses": 1}
+
+    @pytest.mark.asyncio
+    async def test_cache_is_partitioned_by_credentials(self, monkeypatch, tmp_path):
+        """Test that a response cached for one Authorization value is not served to another."""
+        calls = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(200, content=request.headers["authorization"].encode())
+
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, upstream)
+        try:
+            first = await self._get("/api/v1/accounts/1", {"Authorization": "Bearer a"})
+            second = await self._get("/api/v1/accounts/1", {"Authorization": "Bearer b"})
+        finally:
+            await proxy_client.close()
+
+        assert len(calls) == 2
+        assert (first.body, second.body) == (b"Bearer a", b"Bearer b")
+
+    @pytest.mark.asyncio
+    async def test_cache_is_partitioned_by_accept_encoding(self, monkeypatch, tmp_path):
+        """Test that a gzip body cached without Vary is never replayed to an identity-only client."""
+        import gzip
+
+        class NetworkStream(httpx.AsyncByteStream):
+            def __init__(self, body: bytes):
+                self.body = body
+
+            async def __aiter__(self):
+                yield self.body
+
+        calls = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request.headers.get("accept-encoding"))
+            if "gzip" in request.headers.get("accept-encoding", ""):
+                return httpx.Response(
+                    200,
+                    headers={"Content-Encoding": "gzip"},
+                    stream=NetworkStream(gzip.compress(b"accounts")),
+                )
+            return httpx.Response(200, content=b"accounts")
+
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, upstream)
+        try:
+            zipped = await self._get("/api/v1/accounts/1", {"Accept-Encoding": "gzip"})
+            plain = await self._get("/api/v1/accounts/1", {"Accept-Encoding": "identity"})
+            again = await self._get("/api/v1/accounts/1", {"Accept-Encoding": "GZIP"})
+        finally:
+            await proxy_client.close()
+
+        assert calls == ["gzip", "identity"]
+        assert zipped.headers["content-encoding"] == again.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(again.body) == b"accounts"
+        assert plain.body == b"accounts"
+        assert "content-encoding" not in plain.headers
+
+    @pytest.mark.asyncio
+    async def test_uncacheable_responses_and_routes_always_hit_upstream(self, monkeypatch, tmp_path):
+        """Test that no-store, Set-Cookie, errors and routes without a TTL are never cached."""
+        calls = []
+        responses = {
+            "/api/v1/accounts/no-store": httpx.Response(200, headers={"Cache-Control": "no-store"}),
+            "/api/v1/accounts/cookie": httpx.Response(200, headers={"Set-Cookie": "s=1"}),
+            "/api/v1/accounts/error": httpx.Response(503),
+            "/api/v1/leads": httpx.Response(200),
+        }
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            return responses[request.url.path]
+
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, upstream)
+        try:
+            for path in responses:
+                await self._get(path)
+                await self._get(path)
+            await self._get("/api/v1/accounts/1", {"Cache-Control": "no-cache"})
+        finally:
+            await proxy_client.close()
+
+        assert sorted(calls[:8]) == sorted(list(responses) * 2)
+        assert len(proxy_client.response_cache) == 0
+
+    def test_response_ttl_honours_upstream_cache_control(self):
+        """Test that upstream max-age can shorten but never extend the route TTL."""
+        assert response_ttl(200, [], 30) == 30
+        assert response_ttl(200, [(b"cache-control", b"max-age=5")], 30) == 5
+        assert response_ttl(200, [(b"cache-control", b"public, s-maxage=600")], 30) == 30
+        assert response_ttl(200, [(b"cache-control", b"private")], 30) == 0
+        assert response_ttl(200, [(b"vary", b"*")], 30) == 0
+        assert response_ttl(404, [], 30) == 0
+
+    def test_query_order_and_slashes_are_normalized(self):
+        """Test that equivalent URLs share a key and credentials split keys."""
+        assert cache_key("legacy", "/a//b", "y=2&x=1", b"Bearer t") == cache_key(
+            "legacy", "/a/b", "x=1&y=2", b"Bearer t"
+        )
+        assert cache_key("legacy", "/a", "", b"Bearer t") != cache_key("canary", "/a", "", b"Bearer t")
+        assert cache_key("legacy", "/a", "", b"Bearer t") != cache_key("legacy", "/a", "", None)
+        assert cache_key("legacy", "/a", "", None, "gzip") != cache_key("legacy", "/a", "", None)
+
+    @pytest.mark.asyncio
+    async def test_partner_access_tokens_do_not_share_entries(self, monkeypatch, tmp_path):
+        """Test that access_token and Cookie credentials are part of the key, like Authorization."""
+        from gateway.proxy.cache import request_credentials
+
+        assert request_credentials([(b"accept", b"*/*")]) is None
+        assert request_credentials([(b"access_token", b"a")]) != request_credentials([(b"access_token", b"b")])
+        assert request_credentials([(b"cookie", b"s=1")]) != request_credentials([(b"cookie", b"s=2")])
+
+        seen = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            token = request.headers.get("access_token", "none")
+            seen.append(token)
+            return httpx.Response(200, content=f"data for {token}".encode())
+
+        policy_path = tmp_path / "proxy_policy.json"
+        policy_path.write_text(json.dumps({"routes": [{"name": "status", "path": "/status", "cache_ttl": 60}]}))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            route_policy_path=str(policy_path),
+            cache_max_bytes=1024 * 1024,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        async def get(headers: dict[str, str]) -> bytes:
+            response = await proxy_handler(make_asgi_request("GET", "/status", headers), "status")
+            if response.background is None:
+                return response.body  # cache hit
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            await response.background()
+            return body
+
+        try:
+            bodies = [
+                await get({"access_token": "partner-a"}),
+                await get({"access_token": "partner-b"}),
+                await get({}),
+                await get({"access_token": "partner-a"}),
+            ]
+        finally:
+            await proxy_client.close()
+
+        assert bodies == [b"data for partner-a", b"data for partner-b", b"data for none", b"data for partner-a"]
+        assert seen == ["partner-a", "partner-b", "none"]
+
+    def test_vary_expiry_and_lru_eviction(self):
+        """Test Vary matching, TTL expiry and byte-bounded LRU eviction."""
+        cache = ResponseCache(max_bytes=2000, max_entry_bytes=1000)
+        vary = [(b"vary", b"Accept-Language")]
+        cache.put("k1", 200, vary, b"x" * 100, 10, [(b"accept-language", b"en")], now=0)
+        assert cache.get("k1", [(b"accept-language", b"en")], "r", now=1) is not None
+        assert cache.get("k1", [(b"accept-language", b"fr")], "r", now=1) is None
+        assert cache.get("k1", [(b"accept-language", b"en")], "r", now=11) is None
+        assert cache.status()["expired"] == 1
+
+        assert cache.put("big", 200, [], b"x" * 1000, 10, [], now=0) is False
+        cache.put("a", 200, [], b"a" * 500, 10, [], now=0)
+        cache.put("b", 200, [], b"b" * 500, 10, [], now=0)
+        cache.get("a", [], "r", now=1)  # a becomes most recently used
+        cache.put("c", 200, [], b"c" * 500, 10, [], now=1)
+        assert cache.get("b", [], "r", now=2) is None
+        assert cache.get("a", [], "r", now=2) is not None
+        assert cache.bytes_used <= cache.max_bytes
+        assert cache.status()["evictions"] == 1
+
+    def test_route_policy_config_validation(self):
+        """Test that invalid proxy policy files are rejected."""
+        policies = parse_route_policies({"routes": [{"path": "^/api/v1/accounts/[^/]+$", "cache_ttl": 5}]})
+        assert policies.match("GET", "/api/v1/accounts/1").cache_ttl == 5
+        assert policies.match("GET", "/api/v1/accounts/1/x") is policies.default
+        with pytest.raises(ValueError):
+            parse_route_policies({"routes": [{"path": "/x", "cache_ttl": -1}]})
+        with pytest.raises(ValueError):
+            parse_route_policies([])
+
+
+class TestRequestCoalescing:
+    """Tests for singleflight coalescing of identical concurrent GETs."""
+
+    @staticmethod
+    def _proxy_client(monkeypatch, tmp_path, upstream, **kwargs) -> ProxyClient:
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            coalesce_max_wait=kwargs.pop("coalesce_max_wait", 2.0),
+            **kwargs,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        return proxy_client
+
+    @staticmethod
+    async def _get(path: str, headers: dict | None = None) -> tuple[int, bytes, dict]:
+        response = await proxy_handler(make_asgi_request("GET", path, headers or {}), path.lstrip("/"))
+        if hasattr(response, "body_iterator"):
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            if response.background is not None:
+                await response.background()
+        else:
+            body = response.body
+        return response.status_code, body, dict(response.raw_headers)
+
+    @staticmethod
+    def _slow_upstream(calls: list, body: bytes = b'{"status": "pending"}', **headers):
+        import asyncio
+
+        async def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(
+                200, content=body, headers={"Request-Id": request.headers["request-id"], **headers}
+            )
+
+        return upstream
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_gets_share_one_upstream_call(self, monkeypatch, tmp_path):
+        """Test that a burst of identical polls makes one upstream call and all get its body."""
+        import asyncio
+
+        calls = []
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, self._slow_upstream(calls))
+        try:
+            results = await asyncio.gather(*[
+                self._get("/v1/partners/acme/status", {"Authorization": "Bearer a", "X-Request-ID": f"r{n}"})
+                for n in range(20)
+            ])
+        finally:
+            await proxy_client.close()
+
+        assert len(calls) == 1
+        assert {(status, body) for status, body, _ in results} == {(200, b'{"status": "pending"}')}
+        assert sorted(headers[b"request-id"] for _, _, headers in results) == sorted(
+            f"r{n}".encode() for n in range(20)
+        )
+        status = proxy_client.coalescer.status()
+        assert (status["leaders"], status["followers"], status["in_flight"]) == (1, 19, 0)
+
+    @pytest.mark.asyncio
+    async def test_disconnected_follower_stops_waiting_for_the_leader(self, monkeypatch, tmp_path):
+        """Test that a follower whose client disconnects gets a 499 at once; the leader carries on."""
+        calls = []
+        release = asyncio.Event()
+
+        async def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            await release.wait()
+            return httpx.Response(200, content=b"ok")
+
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, upstream)
+        disconnect = asyncio.Event()
+        try:
+            leader = asyncio.ensure_future(self._get("/v1/status"))
+            await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(proxy_handler(
+                make_asgi_request("GET", "/v1/status", {}, disconnect=disconnect), "v1/status"
+            ))
+            await asyncio.sleep(0.01)
+            disconnect.set()
+            abandoned = await asyncio.wait_for(follower, timeout=1)
+            assert not leader.done()
+            release.set()
+            status, body, _ = await leader
+        finally:
+            await proxy_client.close()
+
+        assert abandoned.status_code == 499
+        assert (status, body) == (200, b"ok")
+        assert len(calls) == 1
+        assert proxy_client.abandoned.status()["before_headers"] == 1
+
+    @pytest.mark.asyncio
+    async def test_different_access_tokens_do_not_coalesce(self, monkeypatch, tmp_path):
+        """Test that requests with another partner access_token, or none, never get the leader's body."""
+        calls = []
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, self._slow_upstream(calls))
+        try:
+            results = await asyncio.gather(
+                self._get("/v1/status", {"access_token": "partner-a"}),
+                self._get("/v1/status", {"access_token": "partner-a"}),
+                self._get("/v1/status", {"access_token": "partner-b"}),
+                self._get("/v1/status"),
+            )
+        finally:
+            await proxy_client.close()
+
+        assert [status for status, _, _ in results] == [200, 200, 200, 200]
+        assert sorted(request.headers.get("access_token", "none") for request in calls) == [
+            "none", "partner-a", "partner-b"
+        ]
+        status = proxy_client.coalescer.status()
+        assert (status["leaders"], status["followers"]) == (3, 1)
+
+    @pytest.mark.asyncio
+    async def test_different_credentials_or_accept_are_not_coalesced(self, monkeypatch, tmp_path):
+        """Test that requests that could get different responses each go upstream."""
+        import asyncio
+
+        calls = []
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, self._slow_upstream(calls))
+        try:
+            await asyncio.gather(
+                self._get("/v1/partners/acme/status", {"Authorization": "Bearer a"}),
+                self._get("/v1/partners/acme/status", {"Authorization": "Bearer b"}),
+                self._get("/v1/partners/acme/status", {"Authorization": "Bearer a", "Accept": "text/csv"}),
+            )
+        finally:
+            await proxy_client.close()
+
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_large_or_private_responses_fall_back_to_own_call(self, monkeypatch, tmp_path):
+        """Test that bodies above the size cap and Set-Cookie responses are not shared."""
+        import asyncio
+
+        for upstream_kwargs in ({"body": b"x" * 2048}, {"Set-Cookie": "session=1"}):
+            calls = []
+            proxy_client = self._proxy_client(
+                monkeypatch, tmp_path, self._slow_upstream(calls, **upstream_kwargs),
+                coalesce_max_body_bytes=1024,
+            )
+            try:
+                results = await asyncio.gather(*[self._get("/v1/partners/acme/status") for _ in range(5)])
+            finally:
+                await proxy_client.close()
+            assert len(calls) == 5
+            assert {status for status, _, _ in results} == {200}
+
+    @pytest.mark.asyncio
+    async def test_follower_stops_waiting_after_max_wait(self):
+        """Test that a follower gives up on a stuck leader after max_wait."""
+        coalescer = Coalescer(max_wait=0.01)
+        flight, leader = coalescer.join("k")
+        follower_flight, follower_leads = coalescer.join("k")
+        assert leader and not follower_leads and follower_flight is flight
+        assert await coalescer.follow(flight) is None
+        assert coalescer.counters.get("timeouts") == 1
+
+        # A flight older than max_wait is replaced instead of joined
+        import asyncio
+
+        await asyncio.sleep(0.02)
+        _, leads_again = coalescer.join("k")
+        assert leads_again
+
+
+class TestRetriesAndHedging:
+    """Tests for per-route retries, hedged GETs and the retry budget."""
+
+    @staticmethod
+    def _proxy_client(monkeypatch, tmp_path, upstream, route: dict, **kwargs) -> ProxyClient:
+        policy_path = tmp_path / "proxy_policy.json"
+        policy_path.write_text(json.dumps({
+            "routes": [{"name": "status", "path": "/v1/", "retry_backoff": 0, **route}],
+        }))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            route_policy_path=str(policy_path),
+            **kwargs,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        return proxy_client
+
+    @staticmethod
+    async def _send(method: str, path: str = "/v1/status", body: bytes | None = None) -> Response:
+        request = make_asgi_request(method, path, {}, [body] if body else None)
+        return await proxy_handler(request, path.lstrip("/"))
+
+    @staticmethod
+    def _flaky(calls: list, failures: list):
+        """Upstream that raises/returns each queued failure in turn, then 200."""
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            if failures:
+                failure = failures.pop(0)
+                if isinstance(failure, Exception):
+                    raise failure
+                return httpx.Response(failure)
+            return httpx.Response(200, content=b"ok")
+
+        return upstream
+
+    @pytest.mark.asyncio
+    async def test_get_is_retried_on_connect_error_and_5xx(self, monkeypatch, tmp_path):
+        """Test that a GET survives a failed connection and a 503 within its retry allowance."""
+        calls = []
+        proxy_client = self._proxy_client(
+            monkeypatch, tmp_path,
+            self._flaky(calls, [httpx.ConnectError("refused"), 503]),
+            {"retries": 2},
+        )
+        try:
+            response = await self._send("GET")
+        finally:
+            await proxy_client.close()
+
+        assert response.status_code == 200
+        assert len(calls) == 3
+        counters = proxy_client.retry_engine.status()
+        assert (counters["retries_connect"], counters["retries_status"]) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_post_is_only_retried_when_nothing_was_sent(self, monkeypatch, tmp_path):
+        """Test that a POST is retried after a connect error but never after a read timeout."""
+        calls = []
+        proxy_client = self._proxy_client(
+            monkeypatch, tmp_path,
+            self._flaky(calls, [httpx.ConnectError("refused")]),
+            {"connect_retries": 1, "retries": 3},
+        )
+        try:
+            response = await self._send("POST", body=b'{"a": 1}')
+            assert response.status_code == 200
+            assert [request.content for request in calls] == [b'{"a": 1}', b'{"a": 1}']
+
+            calls.clear()
+            proxy_client.client = httpx.AsyncClient(
+                transport=httpx.MockTransport(self._flaky(calls, [httpx.ReadTimeout("slow")]))
+            )
+            response = await self._send("POST", body=b'{"a": 1}')
+            assert response.status_code == 504
+            assert len(calls) == 1
+        finally:
+            await proxy_client.close()
+
+    @pytest.mark.asyncio
+    async def test_retry_budget_caps_extra_attempts(self, monkeypatch, tmp_path):
+        """Test that an exhausted budget turns retries off."""
+        calls = []
+        proxy_client = self._proxy_client(
+            monkeypatch, tmp_path,
+            self._flaky(calls, [503, 503]),
+            {"retries": 2},
+            retry_budget_percent=0,
+            retry_budget_min_per_second=0,
+        )
+        try:
+            response = await self._send("GET")
+        finally:
+            await proxy_client.close()
+
+        assert response.status_code == 503
+        assert len(calls) == 1
+        assert proxy_client.retry_engine.counters.get("budget_exhausted") == 1
+
+    def test_budget_tracks_a_percentage_of_requests(self):
+        """Test that 10% of requests buys one retry, plus the per-second floor."""
+        budget = RetryBudget(percent=10, min_per_second=0)
+        for _ in range(9):
+            budget.deposit()
+        assert not budget.withdraw()
+        budget.deposit()
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+        floor = RetryBudget(percent=0, min_per_second=2)
+        assert floor.withdraw(now=floor._refilled_at + 1.0)
+
+    @pytest.mark.asyncio
+    async def test_slow_get_is_hedged_after_route_p95(self, monkeypatch, tmp_path):
+        """Test that a GET slower than the route's p95 is raced by a second request."""
+        import asyncio
+
+        calls = []
+
+        async def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            if len(calls) == 1:
+                await asyncio.sleep(5)
+            return httpx.Response(200, content=b"hedged")
+
+        proxy_client = self._proxy_client(
+            monkeypatch, tmp_path, upstream, {"hedge": True, "hedge_min_delay_ms": 1}
+        )
+        engine = proxy_client.retry_engine
+        policy = proxy_client.route_policies.match("GET", "/v1/status")
+        import time
+
+        for _ in range(20):
+            engine.record_latency(policy, 5.0, time.monotonic())
+        try:
+            started = time.monotonic()
+            response = await self._send("GET")
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            await response.background()
+        finally:
+            await proxy_client.close()
+
+        assert body == b"hedged"
+        assert time.monotonic() - started < 2
+        assert len(calls) == 2
+        assert (engine.counters.get("hedges"), engine.counters.get("hedge_wins")) == (1, 1)
+        assert proxy_client.upstream_pool.instances[0].outstanding == 0
+
+    def test_no_hedging_without_enough_samples(self):
+        """Test that a route is not hedged until its p95 is known."""
+        engine = RetryEngine(RetryBudget())
+        policy = RoutePolicy(name="r", hedge=True)
+        assert engine.hedge_delay(policy, "GET", now=0.0) is None
+        for _ in range(20):
+            engine.record_latency(policy, 40.0, now=0.0)
+        assert engine.hedge_delay(policy, "GET", now=2.0) == pytest.approx(0.05)
+        assert engine.hedge_delay(policy, "POST", now=2.0) is None
+
+
+class TestCircuitBreaker:
+    """Tests for per-upstream circuit breakers."""
+
+    def test_consecutive_failures_open_then_half_open_trial(self):
+        """Test closed -> open -> half-open -> closed/open transitions."""
+        breaker = CircuitBreaker("legacy", consecutive_failures=3, open_seconds=10)
+        for _ in range(3):
+            assert breaker.allow(now=0.0)
+            breaker.record(True, now=0.0)
+        assert breaker.state == "open"
+        assert not breaker.allow(now=5.0)
+        assert breaker.retry_after(now=5.0) == 5
+
+        # One trial at a time once the open period is over
+        assert breaker.allow(now=10.0)
+        assert breaker.state == "half_open"
+        assert not breaker.allow(now=10.0)
+        breaker.record(True, now=10.5)
+        assert breaker.state == "open"
+        assert breaker.retry_after(now=10.5) == 20  # repeated trip: twice as long
+
+        assert breaker.allow(now=31.0)
+        breaker.record(False, now=31.0)
+        assert breaker.state == "closed"
+        assert breaker.status()["trip_count"] == 2
+
+    def test_failure_rate_opens_breaker(self):
+        """Test that a failure rate above the threshold opens the breaker without a long streak."""
+        breaker = CircuitBreaker("canary", failure_rate=0.5, min_requests=6, consecutive_failures=100)
+        for n in range(5):
+            breaker.record(n % 2 == 0, now=1.0)
+        assert breaker.state == "closed"
+        breaker.record(True, now=1.0)
+        assert breaker.state == "open"
+
+    def test_failure_statuses_do_not_build_a_streak(self):
+        """Test that 502/503/504 responses in a row count toward the rate only, not the streak."""
+        breaker = CircuitBreaker("legacy", min_requests=20, consecutive_failures=3)
+        for _ in range(10):
+            breaker.record(True, now=1.0, transport=False)
+        assert breaker.state == "closed"
+        assert breaker.status()["consecutive_failures"] == 0
+        breaker.record(True, now=1.0)
+        breaker.record(True, now=1.0)
+        breaker.record(True, now=1.0)
+        assert breaker.state == "open"
+
+    def test_breakers_are_opt_in(self, tmp_path):
+        """Test that a proxy client has no circuit breakers unless they are enabled."""
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+        )
+        assert proxy_client.breakers == {}
+
+    @staticmethod
+    def _proxy_client(monkeypatch, tmp_path, upstream, canary=False, **kwargs) -> ProxyClient:
+        config_path = tmp_path / "canary_config.json"
+        config_path.write_text(json.dumps({
+            "enabled": True,
+            "rules": [{"endpoint_pattern": "/api/v1/leads", "percentage": 100}],
+        }))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            upstream_canary_base_url="https://canary-api.example.com" if canary else None,
+            canary_config_path=str(config_path),
+            breaker_enabled=True,
+            breaker_consecutive_failures=2,
+            **kwargs,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        return proxy_client
+
+    @pytest.mark.asyncio
+    async def test_open_legacy_breaker_fails_fast_with_retry_after(self, monkeypatch, tmp_path):
+        """Test that once legacy's breaker opens, requests get 503 without an upstream call."""
+        calls = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            raise httpx.ConnectError("refused")
+
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, upstream)
+        try:
+            statuses = []
+            for _ in range(4):
+                response = await proxy_handler(make_asgi_request("GET", "/api/x", {}), "api/x")
+                statuses.append(response.status_code)
+        finally:
+            await proxy_client.close()
+
+        assert statuses == [502, 502, 503, 503]
+        assert len(calls) == 2
+        assert int(response.headers["retry-after"]) == 30
+        assert proxy_client.breakers["legacy"].status()["rejected"] == 2
+
+    @pytest.mark.asyncio
+    async def test_open_canary_breaker_falls_back_to_legacy(self, monkeypatch, tmp_path):
+        """Test that canary traffic is served by legacy while canary's breaker is open."""
+        hosts = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            hosts.append(request.url.host)
+            if request.url.host == "canary-api.example.com":
+                raise httpx.ConnectError("refused")
+            return httpx.Response(200, content=b"legacy")
+
+        proxy_client = self._proxy_client(monkeypatch, tmp_path, upstream, canary=True)
+        try:
+            responses = []
+            for _ in range(3):
+                responses.append(await proxy_handler(
+                    make_asgi_request("GET", "/api/v1/leads", {}),
+                    "api/v1/leads",
+                    canary_router=proxy_client.canary_router,
+                    debug_mode=True,
+                ))
+        finally:
+            await proxy_client.close()
+
+        assert hosts == ["canary-api.example.com", "canary-api.example.com", "legacy-api.example.com"]
+        assert [r.status_code for r in responses] == [502, 502, 200]
+        assert responses[-1].headers["x-gateway-upstream-reason"] == "circuit_open:canary"
+        assert proxy_client.breakers["canary"].state == "open"
+        assert proxy_client.breakers["legacy"].state == "closed"
+
+
+    @pytest.mark.asyncio
+    async def test_half_open_trial_not_held_by_rejected_request(self, monkeypatch, tmp_path):
+        """Test that a half-open request shed before its attempt (bulkhead full) leaves the trial slot free."""
+        failing = [True]
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            if failing[0]:
+                raise httpx.ConnectError("refused")
+            return httpx.Response(200, content=b"ok")
+
+        policy_path = tmp_path / "proxy_policy.json"
+        policy_path.write_text(json.dumps({
+            "bulkheads": [{"name": "hooks", "path_prefixes": ["/hooks/"], "max_concurrency": 1}]
+        }))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            route_policy_path=str(policy_path),
+            breaker_enabled=True,
+            breaker_consecutive_failures=1,
+            breaker_open_seconds=0.05,
+        )
+        hooks = proxy_client.bulkheads.bulkheads[0]
+        hooks.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        breaker = proxy_client.breakers["legacy"]
+
+        async def get() -> int:
+            response = await proxy_handler(make_asgi_request("GET", "/hooks/nav", {}), "hooks/nav")
+            if response.background is not None:
+                async for _ in response.body_iterator:
+                    pass
+                await response.background()
+            return response.status_code
+
+        try:
+            assert await get() == 502
+            assert breaker.state == "open"
+            await asyncio.sleep(0.06)
+            assert hooks.try_acquire()
+            shed = await get()
+            hooks.release()
+            assert breaker.state == "half_open"
+            assert breaker.admits() and breaker.admits()
+            failing[0] = False
+            recovered = await get()
+        finally:
+            await proxy_client.close()
+
+        assert shed == 503
+        assert recovered == 200
+        assert breaker.state == "closed"
+
+
+class TestConcurrencyLimiter:
+    """Tests for adaptive concurrency limiting in front of the upstream."""
+
+    @pytest.mark.asyncio
+    async def test_queue_and_deadline_rejections(self):
+        """Test that excess requests queue, and are rejected when the queue is full or time runs out."""
+        import asyncio
+
+        limiter = AdaptiveLimiter("legacy", initial_limit=2, min_limit=1, queue_size=1, max_wait=0.05)
+        assert await limiter.acquire() and await limiter.acquire()
+
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not await limiter.acquire()  # queue full
+        assert not await waiting  # waited max_wait
+        assert limiter.status()["queued"] == 0
+
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        assert await waiting  # the released slot went to the waiter
+        assert limiter.in_flight == 2
+        assert not await limiter.acquire(deadline=0.0)
+
+        counters = limiter.counters.snapshot()
+        assert (counters["rejected_queue_full"], counters["rejected_deadline"]) == (1, 2)
+
+    def test_limit_follows_latency_gradient(self):
+        """Test that the limit grows at steady latency and shrinks as latency climbs or requests drop."""
+        limiter = AdaptiveLimiter("legacy", initial_limit=20, min_limit=4, max_limit=100)
+        limiter.in_flight = 20
+        for _ in range(50):
+            limiter.record(10.0)
+        grown = limiter.limit
+        assert grown > 20
+
+        limiter.in_flight = int(grown)
+        for _ in range(50):
+            limiter.record(100.0)
+        assert limiter.limit < grown
+
+        before = limiter.limit
+        limiter.record(5000.0, dropped=True)
+        assert limiter.limit == pytest.approx(max(4, before * 0.9))
+
+    def test_limit_does_not_grow_when_underused(self):
+        """Test that a lightly used limiter does not inflate its limit."""
+        limiter = AdaptiveLimiter("legacy", initial_limit=20)
+        for _ in range(100):
+            limiter.record(10.0)
+        assert limiter.limit == 20
+
+    @pytest.mark.asyncio
+    async def test_overload_gets_immediate_503(self, monkeypatch, tmp_path):
+        """Test that a request that cannot get a slot in time is shed with 503 without reaching upstream."""
+        import asyncio
+
+        calls = []
+
+        async def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, content=b"ok")
+
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            concurrency_limit_enabled=True,
+            concurrency_limit_initial=1,
+            concurrency_limit_min=1,
+            concurrency_queue_size=1,
+            concurrency_max_wait=0.05,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        async def get() -> tuple[int, str | None]:
+            response = await proxy_handler(make_asgi_request("GET", "/api/x", {}), "api/x")
+            if hasattr(response, "body_iterator"):
+                async for _ in response.body_iterator:
+                    pass
+                await response.background()
+            return response.status_code, response.headers.get("retry-after")
+
+        try:
+            results = await asyncio.gather(get(), get(), get())
+        finally:
+            await proxy_client.close()
+
+        assert sorted(results, key=lambda r: r[0]) == [(200, None), (503, "1"), (503, "1")]
+        assert len(calls) == 1
+        limiter = proxy_client.limiters["legacy"]
+        assert limiter.in_flight == 0
+        assert limiter.counters.snapshot() == {
+            "waited": 1, "rejected_queue_full": 1, "rejected_deadline": 1,
+        }
+
+
+class TestFairQueue:
+    """Tests for weighted fair queuing across partners above the in-flight threshold."""
+
+    @pytest.mark.asyncio
+    async def test_uncongested_requests_skip_the_queue(self):
+        """Test that requests below the threshold are admitted at once and never queued."""
+        fair_queue = FairQueue(threshold=2)
+
+        assert await fair_queue.acquire("nav") and await fair_queue.acquire("intuit")
+        fair_queue.release()
+        fair_queue.release()
+
+        assert fair_queue.in_flight == 0
+        assert fair_queue.counters.snapshot() == {}
+
+    @pytest.mark.asyncio
+    async def test_slots_are_shared_by_weight(self):
+        """Test that a bursting partner cannot starve others, and weights set each partner's share."""
+        import asyncio
+
+        weights = {"batch": 1.0, "interactive": 2.0}
+        fair_queue = FairQueue(threshold=1, queue_size=100, max_wait=5, weight=weights.__getitem__)
+        assert await fair_queue.acquire("batch")
+
+        order: list[str] = []
+
+        async def request(partner: str) -> None:
+            assert await fair_queue.acquire(partner)
+            order.append(partner)
+
+        # The batch partner queues its whole burst before anyone else shows up
+        tasks = [asyncio.ensure_future(request("batch")) for _ in range(6)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(request("interactive")) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert fair_queue.status()["partners"] == {
+            "batch": {"weight": 1.0, "queued": 6},
+            "interactive": {"weight": 2.0, "queued": 4},
+        }
+
+        for _ in tasks:
+            fair_queue.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+        # One batch request per round against two interactive ones
+        assert order[:6] == ["batch", "interactive", "interactive", "batch", "interactive", "interactive"]
+        assert order[6:] == ["batch"] * 4
+        assert fair_queue.queued == 0 and fair_queue.status()["partners"] == {}
+
+    @pytest.mark.asyncio
+    async def test_full_queue_and_timeout_rejections(self):
+        """Test that a partner over its queue size or the wait limit is rejected."""
+        import asyncio
+
+        fair_queue = FairQueue(threshold=1, queue_size=1, max_wait=0.05)
+        assert await fair_queue.acquire("nav")
+
+        waiting = asyncio.ensure_future(fair_queue.acquire("nav"))
+        await asyncio.sleep(0)
+        assert not await fair_queue.acquire("nav")  # nav's queue is full
+        assert not await waiting  # waited max_wait
+
+        assert fair_queue.queued == 0
+        assert fair_queue.counters.snapshot() == {
+            "waited": 1, "rejected_queue_full": 1, "rejected_timeout": 1,
+        }
+
+    @pytest.mark.asyncio
+    async def test_proxied_requests_hold_a_slot_until_relayed(self, monkeypatch, tmp_path):
+        """Test that the handler queues by partner above the threshold and sheds with 503 after max_wait."""
+        import asyncio
+
+        async def upstream(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, content=b"ok")
+
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            fair_queue_threshold=1,
+            fair_queue_max_wait=0.05,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        async def get(headers: dict) -> int:
+            response = await proxy_handler(make_asgi_request("GET", "/api/x", headers), "api/x")
+            if hasattr(response, "body_iterator"):
+                async for _ in response.body_iterator:
+                    pass
+                await response.background()
+            return response.status_code
+
+        try:
+            results = await asyncio.gather(get({"X-Partner": "nav"}), get({"X-Partner": "intuit"}))
+        finally:
+            await proxy_client.close()
+
+        assert sorted(results) == [200, 503]
+        assert proxy_client.fair_queue.in_flight == 0
+        assert proxy_client.fair_queue.counters.snapshot() == {"waited": 1, "rejected_timeout": 1}
+
+
+
+class TestBulkheads:
+    """Tests for route groups isolated on their own connection pools."""
+
+    def test_parse_and_match(self):
+        """Test that bulkheads are matched by router tag or path prefix, first match winning."""
+        policies = parse_route_policies({
+            "bulkheads": [
+                {"name": "hooks", "tags": ["Legacy: hooks"], "path_prefixes": ["/hooks/"],
+                 "max_connections": 5, "max_keepalive_connections": 2, "read_timeout": 60},
+                {"name": "ssn", "tags": ["Legacy: fetch_ssn", "Legacy: fetch_ssn_masked"]},
+            ]
+        })
+        bulkheads = Bulkheads(policies.bulkheads, timeout=httpx.Timeout(10.0, read=30.0))
+
+        assert bulkheads.match(["Legacy: hooks"], "/anything").name == "hooks"
+        assert bulkheads.match((), "/hooks/nav/leads").name == "hooks"
+        assert bulkheads.match(["Legacy: fetch_ssn_masked"], "/x").name == "ssn"
+        assert bulkheads.match(["Legacy: stripe"], "/stripe/webhook") is None
+
+        hooks = bulkheads.bulkheads[0]
+        assert hooks.timeout.read == 60 and hooks.timeout.connect == 10
+        assert hooks.status()["pool"]["max_connections"] == 5
+
+        with pytest.raises(ValueError):
+            parse_route_policies({"bulkheads": [{"name": "empty"}]})
+        with pytest.raises(ValueError):
+            parse_route_policies({"bulkheads": [{"name": "a", "tags": ["x"]}, {"name": "a", "tags": ["y"]}]})
+
+    @pytest.mark.asyncio
+    async def test_group_uses_own_client_and_cap(self, monkeypatch, tmp_path):
+        """Test that a group's requests use its own client, and requests over its cap get 503 at once."""
+        import asyncio
+        from types import SimpleNamespace
+
+        shared_calls, hooks_calls = [], []
+
+        async def hooks_upstream(request: httpx.Request) -> httpx.Response:
+            hooks_calls.append(request.url.path)
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, content=b"hooks")
+
+        policy_path = tmp_path / "proxy_policy.json"
+        policy_path.write_text(json.dumps({
+            "bulkheads": [{"name": "hooks", "tags": ["Legacy: hooks"], "max_concurrency": 1}]
+        }))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            route_policy_path=str(policy_path),
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: shared_calls.append(request.url.path) or httpx.Response(200)
+        ))
+        hooks = proxy_client.bulkheads.bulkheads[0]
+        await hooks.client.aclose()
+        hooks.client = httpx.AsyncClient(transport=httpx.MockTransport(hooks_upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        async def get(path: str, tags: list[str]) -> int:
+            request = make_asgi_request("GET", path, {})
+            request.scope["route"] = SimpleNamespace(tags=tags)
+            response = await proxy_handler(request, path.lstrip("/"))
+            if hasattr(response, "body_iterator"):
+                async for _ in response.body_iterator:
+                    pass
+                await response.background()
+            return response.status_code
+
+        try:
+            results = await asyncio.gather(
+                get("/hooks/nav/leads", ["Legacy: hooks"]),
+                get("/hooks/nav/lead", ["Legacy: hooks"]),
+                get("/stripe/webhook", ["Legacy: stripe"]),
+            )
+        finally:
+            await proxy_client.close()
+
+        assert sorted(results[:2]) == [200, 503]
+        assert results[2] == 200
+        assert len(hooks_calls) == 1
+        assert shared_calls == ["/stripe/webhook"]
+        status = hooks.status()
+        assert (status["requests"], status["rejected"], status["in_flight"]) == (1, 1, 0)
+        assert status["peak_saturation"] == 1.0
+
+
+class TestConnectionPools:
+    """Tests for configurable upstream pool limits and pool statistics."""
+
+    def test_limits_and_dedicated_canary_pool(self, tmp_path):
+        """Test that pool limits are validated, and canary only gets its own pool when configured."""
+        kwargs = dict(
+            upstream_base_url="https://legacy-api.example.com",
+            upstream_canary_base_url="https://canary-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+        )
+        with pytest.raises(ValueError, match="PROXY_POOL_MAX_CONNECTIONS"):
+            ProxyClient(pool_max_connections=0, **kwargs)
+        with pytest.raises(ValueError, match="PROXY_CANARY_POOL_KEEPALIVE_EXPIRY"):
+            ProxyClient(canary_pool_keepalive_expiry=-1, **kwargs)
+
+        shared = ProxyClient(pool_max_connections=5, pool_max_keepalive_connections=2, **kwargs)
+        assert shared.canary_client is None
+        assert shared.pools["legacy"].status()["max_connections"] == 5
+
+        dedicated = ProxyClient(pool_max_connections=5, canary_pool_max_connections=3, **kwargs)
+        assert dedicated.canary_client is not None
+        canary = dedicated.pools["canary"].status()
+        assert (canary["max_connections"], canary["max_keepalive_connections"]) == (3, 20)
+
+    @pytest.mark.asyncio
+    async def test_pool_statistics(self):
+        """Test that queued requests, pool wait time and active/idle connections are reported."""
+        import asyncio
+
+        from gateway.proxy.pool import build_upstream_client, pool_limits
+
+        async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            while await reader.readuntil(b"\r\n\r\n"):
+                await asyncio.sleep(0.02)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client, pool = build_upstream_client("legacy", httpx.Timeout(5.0), pool_limits(1, 1, 5.0, "PROXY_POOL"))
+        try:
+            gets = [asyncio.ensure_future(client.get(f"http://127.0.0.1:{port}/")) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            during = pool.status()
+            responses = await asyncio.gather(*gets)
+            after = pool.status()
+        finally:
+            await client.aclose()
+            server.close()
+
+        assert [r.status_code for r in responses] == [200, 200, 200]
+        # One connection serves all three; two requests wait for it
+        assert (during["active"], during["queued"]) == (1, 2)
+        assert (after["active"], after["idle"], after["queued"]) == (0, 1, 0)
+        assert (after["requests"], after["connections_opened"]) == (3, 1)
+        assert after["wait_ms"]["count"] == 3
+        assert after["wait_ms"]["p99"] >= 20
+
+    @pytest.mark.asyncio
+    async def test_warm_connections_opened_at_startup_and_kept_open(self, tmp_path):
+        """Test that warm_up opens N connections and the refresher keeps them past keepalive expiry."""
+        import asyncio
+
+        accepted = []
+
+        async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            accepted.append(writer)
+            try:
+                while await reader.readuntil(b"\r\n\r\n"):
+                    await asyncio.sleep(0.01)
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+                    await writer.drain()
+            except asyncio.IncompleteReadError:
+                pass
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        with pytest.raises(ValueError, match="PROXY_WARM_CONNECTIONS"):
+            ProxyClient(upstream_base_url="https://legacy-api.example.com", warm_connections=-1)
+        pc = ProxyClient(
+            upstream_base_url=f"http://127.0.0.1:{port}",
+            canary_config_path=str(tmp_path / "missing.json"),
+            pool_keepalive_expiry=0.2,
+            warm_connections=3,
+        )
+        try:
+            await pc.warm_up()
+            warmed = pc.warmer.status()
+            pc.start()
+            # Without refreshes the idle connections would expire after 0.2s
+            await asyncio.sleep(0.5)
+            refreshed = pc.warmer.status()
+        finally:
+            await pc.close()
+            server.close()
+
+        assert warmed["targets"][0]["open"] == 3
+        assert warmed["refresh_interval"] == pytest.approx(0.1)
+        assert refreshed["targets"][0]["open"] == 3
+        assert refreshed["refreshes"] >= 2
+        assert refreshed.get("failures", 0) == 0
+        # Refreshes reused the warm connections instead of opening new ones
+        assert len(accepted) == 3
+        assert pc.pools["legacy"].status()["connections_opened"] == 3
+
+
+class TestResponsePassthrough:
+    """Tests for relaying content-encoded upstream bodies without decoding them."""
+
+    @staticmethod
+    async def _proxy_gzip(monkeypatch, tmp_path, **client_kwargs) -> tuple[Response, bytes, bytes]:
+        import gzip
+
+        class NetworkStream(httpx.AsyncByteStream):
+            def __init__(self, body: bytes):
+                self.body = body
+
+            async def __aiter__(self):
+                yield self.body[:10]
+                yield self.body[10:]
+
+        encoded = gzip.compress(b'{"leads": []}' * 100)
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            **client_kwargs,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(
+                200,
+                headers={
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                    "Content-Length": str(len(encoded)),
+                },
+                stream=NetworkStream(encoded),
+            )
+        ))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        try:
+            response = await proxy_handler(
+                make_asgi_request("GET", "/leads", {"accept-encoding": "gzip"}), "leads"
+            )
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            await response.background()
+        finally:
+            await proxy_client.close()
+        return response, body, encoded
+
+    @pytest.mark.asyncio
+    async def test_encoded_body_relayed_byte_for_byte(self, monkeypatch, tmp_path):
+        """Test that a gzip body is forwarded as received, with its encoding and length headers."""
+        response, body, encoded = await self._proxy_gzip(monkeypatch, tmp_path)
+
+        headers = dict(response.raw_headers)
+        assert body == encoded
+        assert headers[b"content-encoding"] == b"gzip"
+        assert headers[b"content-length"] == str(len(encoded)).encode()
+
+    @pytest.mark.asyncio
+    async def test_decode_mode_drops_coding_headers(self, monkeypatch, tmp_path):
+        """Test that with passthrough off the body is decoded and its coding headers dropped."""
+        response, body, _ = await self._proxy_gzip(monkeypatch, tmp_path, response_passthrough=False)
+
+        assert body == b'{"leads": []}' * 100
+        names = [name for name, _ in response.raw_headers]
+        assert b"content-encoding" not in names
+        assert b"content-length" not in names
+
+    def test_upstream_asked_for_identity_without_client_preference(self):
+        """Test that upstream requests ask for identity unless the client sent Accept-Encoding."""
+        from gateway.proxy.pool import build_upstream_client, pool_limits
+
+        client, _ = build_upstream_client("legacy", httpx.Timeout(5.0), pool_limits(1, 1, 5.0, "PROXY_POOL"))
+        default = client.build_request("GET", "https://legacy-api.example.com/leads", headers=[])
+        gzip_ok = client.build_request(
+            "GET", "https://legacy-api.example.com/leads", headers=[(b"accept-encoding", b"gzip")]
+        )
+
+        assert default.headers["accept-encoding"] == "identity"
+        assert gzip_ok.headers["accept-encoding"] == "gzip"
+
+
+class TestResponseCompression:
+    """Tests for opt-in gzip/deflate compression of uncompressed upstream responses."""
+
+    def test_negotiate(self):
+        """Test Accept-Encoding negotiation with q-values and wildcards."""
+        from gateway.proxy.compress import negotiate
+
+        assert negotiate(b"gzip, deflate, br") == "gzip"
+        assert negotiate(b"gzip;q=0.5, deflate") == "deflate"
+        assert negotiate(b"*") == "gzip"
+        assert negotiate(b"gzip;q=0, *;q=0.1") == "deflate"
+        assert negotiate(b"br") is None
+        assert negotiate(None) is None
+
+    def test_level_follows_cpu_utilization(self):
+        """Test that the zlib level drops from max to min level as the worker's CPU gets busy."""
+        from gateway.proxy.compress import CpuLoad, ResponseCompressor
+
+        clock = {"wall": 0.0, "cpu": 0.0}
+        load = CpuLoad(interval=1.0, clock=lambda: clock["wall"], cpu_clock=lambda: clock["cpu"])
+        compressor = ResponseCompressor(min_level=1, max_level=6, cpu_low=0.5, cpu_high=0.9, cpu_load=load)
+
+        levels = []
+        for cpu_seconds in (0.2, 0.95, 0.95, 0.95):
+            clock["wall"] += 1.0
+            clock["cpu"] += cpu_seconds
+            levels.append(compressor.level())
+
+        # Smoothed: 0.2 -> idle, then 0.575, 0.7625, 0.856 - converging on busy
+        assert levels[0] == 6
+        assert levels == sorted(levels, reverse=True)
+        assert levels[-1] < 3
+        with pytest.raises(ValueError, match="PROXY_COMPRESSION_LEVEL"):
+            ResponseCompressor(max_level=10)
+
+    @pytest.mark.asyncio
+    async def test_compresses_eligible_responses_in_chunks(self, monkeypatch, tmp_path):
+        """Test that large JSON is gzipped chunk by chunk, and small or binary bodies are sent as is."""
+        import gzip
+
+        payload = b'{"dashboard": "' + b"x" * 10_000 + b'"}'
+
+        async def upstream(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/stripe/get_dashboard_data":
+                return httpx.Response(
+                    200,
+                    headers={"Content-Type": "application/json", "ETag": '"v1"'},
+                    content=payload,
+                )
+            if request.url.path == "/small":
+                return httpx.Response(200, json={"ok": True})
+            return httpx.Response(200, headers={"Content-Type": "image/png"}, content=b"\x89PNG" * 1000)
+
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            stream_chunk_size=4096,
+            compression_enabled=True,
+            compression_min_size=100,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        async def get(path: str, headers: dict) -> tuple[dict, list[bytes]]:
+            response = await proxy_handler(make_asgi_request("GET", path, headers), path.lstrip("/"))
+            chunks = [chunk async for chunk in response.body_iterator]
+            await response.background()
+            return dict(response.raw_headers), chunks
+
+        try:
+            gzipped_headers, gzipped = await get("/stripe/get_dashboard_data", {"accept-encoding": "gzip, br"})
+            plain_headers, plain = await get("/stripe/get_dashboard_data", {})
+            small_headers, _ = await get("/small", {"accept-encoding": "gzip"})
+            image_headers, _ = await get("/logo.png", {"accept-encoding": "gzip"})
+        finally:
+            await proxy_client.close()
+
+        assert gzipped_headers[b"content-encoding"] == b"gzip"
+        assert gzipped_headers[b"vary"] == b"Accept-Encoding"
+        assert gzipped_headers[b"etag"] == b'W/"v1"'
+        assert b"content-length" not in gzipped_headers
+        assert len(gzipped) > 2  # one compressed chunk per relayed chunk, plus the trailer
+        assert gzip.decompress(b"".join(gzipped)) == payload
+        assert len(b"".join(gzipped)) < len(payload) // 10
+
+        assert b"content-encoding" not in plain_headers
+        assert plain_headers[b"vary"] == b"Accept-Encoding"
+        assert b"".join(plain) == payload
+        assert b"content-encoding" not in small_headers
+        assert b"content-encoding" not in image_headers
+
+        status = proxy_client.response_compressor.status()
+        assert status["compressed_gzip"] == 1
+        assert (status["skipped_small"], status["skipped_type"]) == (1, 1)
+
+
+class TestDeadlines:
+    """Tests for per-route upstream timeouts and caller deadline propagation."""
+
+    def test_deadline_from_caller_budget_and_request_start(self):
+        """Test that the deadline is the earlier of X-Request-Timeout and request start + LB timeout."""
+        from gateway.proxy.deadline import parse_request_start, parse_timeout
+
+        assert parse_timeout(b"2.5") == 2.5
+        assert parse_timeout(b"250ms") == 0.25
+        assert parse_timeout(b"soon") is None
+        assert parse_request_start(b"t=1700000000.5") == 1700000000.5
+        assert parse_request_start(b"1700000000500") == 1700000000.5
+        assert parse_request_start(b"1700000000500000") == 1700000000.5
+
+        policy = DeadlinePolicy(lb_timeout=30.0)
+        started = [(b"x-request-start", b"t=1000.0")]
+        assert policy.deadline([], now=50.0, wall=1010.0) is None
+        assert policy.deadline(started, now=50.0, wall=1010.0) == pytest.approx(70.0)
+        # Time queued behind the load balancer is spent from the caller's budget
+        assert policy.deadline(
+            started + [(b"x-request-timeout", b"15")], now=50.0, wall=1010.0
+        ) == pytest.approx(55.0)
+        assert DeadlinePolicy().deadline(
+            [(b"x-request-timeout", b"15")], now=50.0, wall=1010.0
+        ) == pytest.approx(65.0)
+        # The load balancer's clock running ahead never extends the budget
+        assert policy.deadline(started, now=50.0, wall=990.0) == pytest.approx(80.0)
+        assert DeadlinePolicy().deadline(started, now=50.0, wall=1010.0) is None
+
+    @pytest.mark.asyncio
+    async def test_route_timeouts_by_path_and_tag(self, monkeypatch, tmp_path):
+        """Test that route policies matched by path or router tag set the attempt's timeouts."""
+        from types import SimpleNamespace
+
+        timeouts = {}
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            timeouts[request.url.path] = request.extensions["timeout"]
+            return httpx.Response(200)
+
+        policy_path = tmp_path / "proxy_policy.json"
+        policy_path.write_text(json.dumps({"routes": [
+            {"name": "heartbeat", "path": "/heartbeat", "connect_timeout": 1, "read_timeout": 2},
+            {"name": "credit_report", "tags": ["Legacy: fetch_credit_report"], "read_timeout": 90},
+        ]}))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            route_policy_path=str(policy_path),
+        )
+        proxy_client.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, read=30.0), transport=httpx.MockTransport(upstream)
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        async def get(path: str, tags: list[str]) -> None:
+            request = make_asgi_request("GET", path, {})
+            request.scope["route"] = SimpleNamespace(tags=tags)
+            response = await proxy_handler(request, path.lstrip("/"))
+            async for _ in response.body_iterator:
+                pass
+            await response.background()
+
+        try:
+            await get("/heartbeat", [])
+            await get("/nav/credit_report/1", ["Legacy: fetch_credit_report"])
+            await get("/nav/leads", ["Leads"])
+        finally:
+            await proxy_client.close()
+
+        assert (timeouts["/heartbeat"]["connect"], timeouts["/heartbeat"]["read"]) == (1, 2)
+        assert (timeouts["/nav/credit_report/1"]["connect"], timeouts["/nav/credit_report/1"]["read"]) == (10, 90)
+        assert timeouts["/nav/leads"]["read"] == 30
+
+    @pytest.mark.asyncio
+    async def test_expired_request_never_reaches_upstream(self, monkeypatch, tmp_path):
+        """Test that a request whose load balancer deadline has passed gets 504 without an upstream call."""
+        import time as time_module
+
+        calls = []
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            lb_timeout=30.0,
+        )
+        proxy_client.client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: calls.append(request) or httpx.Response(200)
+        ))
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        started_ms = int((time_module.time() - 31) * 1000)
+
+        try:
+            response = await proxy_handler(
+                make_asgi_request("GET", "/nav/leads", {"X-Request-Start": f"t={started_ms}"}), "nav/leads"
+            )
+        finally:
+            await proxy_client.close()
+
+        assert response.status_code == 504
+        assert calls == []
+        assert proxy_client.deadlines.status()["expired"] == 1
+
+    @pytest.mark.asyncio
+    async def test_caller_budget_caps_upstream_wait_and_is_forwarded(self, monkeypatch, tmp_path):
+        """Test that X-Request-Timeout cuts a slow upstream call short without counting as an upstream failure."""
+        import asyncio
+
+        received = []
+
+        async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            received.append(await reader.readuntil(b"\r\n\r\n"))
+            await asyncio.sleep(1.0)
+            writer.close()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        proxy_client = ProxyClient(
+            upstream_base_url=f"http://127.0.0.1:{port}",
+            canary_config_path=str(tmp_path / "missing.json"),
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        started = asyncio.get_running_loop().time()
+        try:
+            response = await proxy_handler(
+                make_asgi_request("GET", "/reports", {"X-Request-Timeout": "0.2"}), "reports"
+            )
+        finally:
+            await proxy_client.close()
+            server.close()
+        elapsed = asyncio.get_running_loop().time() - started
+
+        assert response.status_code == 504
+        assert elapsed < 0.8
+        forwarded = float(received[0].split(b"x-request-timeout: ")[1].split(b"\r\n")[0])
+        assert 0 < forwarded <= 0.2
+        assert proxy_client.upstream_pool.instances[0].consecutive_failures == 0
+        assert proxy_client.deadlines.status()["caller_deadlines"] == 1
+
+
+class TestClientDisconnect:
+    """Tests for cancelling upstream work when the downstream client disconnects."""
+
+    @pytest.mark.asyncio
+    async def test_disconnect_before_headers_cancels_upstream_call(self, monkeypatch, tmp_path):
+        """Test that a disconnect while waiting for headers closes the upstream connection and frees its slot."""
+        upstream_closed = asyncio.Event()
+
+        async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            await reader.readuntil(b"\r\n\r\n")
+            # Never answers; the proxy hanging up is the only way out
+            await reader.read()
+            upstream_closed.set()
+            writer.close()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        proxy_client = ProxyClient(
+            upstream_base_url=f"http://127.0.0.1:{port}",
+            canary_config_path=str(tmp_path / "missing.json"),
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        disconnect = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.1, disconnect.set)
+
+        try:
+            response = await asyncio.wait_for(
+                proxy_handler(make_asgi_request("GET", "/reports", {}, disconnect=disconnect), "reports"),
+                timeout=2,
+            )
+            await asyncio.wait_for(upstream_closed.wait(), timeout=2)
+            pool = proxy_client.pools["legacy"].status()
+            instance = proxy_client.upstream_pool.instances[0]
+        finally:
+            await proxy_client.close()
+            server.close()
+
+        assert response.status_code == 499
+        assert (pool["active"], pool["idle"]) == (0, 0)
+        assert instance.outstanding == 0
+        assert instance.consecutive_failures == 0
+        assert proxy_client.abandoned.status() == {
+            "abandoned": 1,
+            "before_headers": 1,
+            "routes": {"default": 1},
+        }
+
+    @pytest.mark.asyncio
+    async def test_disconnect_while_fair_queued_leaves_the_queue(self, monkeypatch, tmp_path):
+        """Test that a client disconnecting while queued for a slot gets no upstream call and frees its place."""
+        upstream_calls = []
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+        )
+        proxy_client.client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: upstream_calls.append(request) or httpx.Response(200))
+        )
+        proxy_client.fair_queue = FairQueue(threshold=1, max_wait=5)
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+        # Another request holds the only slot
+        assert await proxy_client.fair_queue.acquire("intuit")
+        disconnect = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.1, disconnect.set)
+
+        try:
+            response = await asyncio.wait_for(
+                proxy_handler(
+                    make_asgi_request("GET", "/reports", {"X-Partner": "nav"}, disconnect=disconnect),
+                    "reports",
+                ),
+                timeout=2,
+            )
+        finally:
+            await proxy_client.close()
+
+        assert response.status_code == 499
+        assert upstream_calls == []
+        assert proxy_client.fair_queue.queued == 0
+        assert proxy_client.fair_queue.status()["partners"] == {}
+        proxy_client.fair_queue.release()
+        assert proxy_client.fair_queue.in_flight == 0
+        assert proxy_client.abandoned.status()["before_headers"] == 1
+
+    @pytest.mark.asyncio
+    async def test_disconnect_mid_body_is_counted_per_route(self, monkeypatch, tmp_path):
+        """Test that a body relay closed before the end closes the upstream stream and counts against the route."""
+        closed = []
+
+        class SlowBody(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield b"first"
+                await asyncio.sleep(10)
+                yield b"never"
+
+            async def aclose(self) -> None:
+                closed.append(True)
+
+        policy_path = tmp_path / "proxy_policy.json"
+        policy_path.write_text(json.dumps({"routes": [{"name": "reports", "path": "^/reports"}]}))
+        proxy_client = ProxyClient(
+            upstream_base_url="https://legacy-api.example.com",
+            canary_config_path=str(tmp_path / "missing.json"),
+            route_policy_path=str(policy_path),
+            stream_chunk_size=5,
+        )
+        proxy_client.client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=SlowBody()))
+        )
+        monkeypatch.setattr("gateway.proxy.client._proxy_client", proxy_client)
+
+        try:
+            response = await proxy_handler(make_asgi_request("GET", "/reports/1", {}), "reports/1")
+            body = response.body_iterator
+            assert await body.__anext__() == b"first"
+            # What Starlette does once it sees http.disconnect mid-body
+            await body.aclose()
+        finally:
+            await proxy_client.close()
+
+        assert closed == [True]
+        assert proxy_client.abandoned.status() == {
+            "abandoned": 1,
+            "during_body": 1,
+            "routes": {"reports": 1},
+        }
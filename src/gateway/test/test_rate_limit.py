@@ -0,0 +1,175 @@
+"""Tests for partner rate limits (token buckets and PartnerRateLimitMiddleware)."""
+
+from __future__ import annotations
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from gateway.errors.exceptions import FundboxAPIException
+from gateway.errors.handlers import fundbox_exception_handler
+from gateway.middleware.rate_limit import PartnerRateLimitMiddleware
+from gateway.partners.file_provider import InMemoryPolicyProvider
+from gateway.partners.policy import PartnerPolicy, RateLimit
+from gateway.partners.ratelimit import PartnerRateLimiter
+
+
+def _limiter(**policy_kwargs) -> PartnerRateLimiter:
+    provider = InMemoryPolicyProvider(
+        policies={"nav": PartnerPolicy("nav", frozenset({"Leads"}), **policy_kwargs)}
+    )
+    return PartnerRateLimiter(provider)
+
+
+class TestPartnerRateLimiter:
+    """Tests for the token buckets behind partner rate limits."""
+
+    def test_shipped_policies_set_no_limits(self):
+        """Test that no partner is limited until its policy configures a limit."""
+        from gateway.partners.policies import RATE_LIMITER
+
+        assert RATE_LIMITER.limited_tags() == frozenset()
+        for partner in ("nav", "intuit", "unknown"):
+            assert RATE_LIMITER.check(partner, ["Leads"]) is None
+
+    def test_burst_then_refill(self):
+        """Test that a partner gets its burst, is rejected, then refills at the configured rate."""
+        limiter = _limiter(rate_limit=RateLimit(requests=2, burst=3))
+
+        decisions = [limiter.check("nav", now=100.0) for _ in range(4)]
+
+        assert [d.allowed for d in decisions] == [True, True, True, False]
+        assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+        assert decisions[3].retry_after == pytest.approx(0.5)
+        assert decisions[3].headers()["Retry-After"] == "1"
+        # Two tokens per second: half a second later one request fits again
+        assert limiter.check("nav", now=100.5).allowed is True
+        assert limiter.check("nav", now=100.5).allowed is False
+
+    def test_partner_without_limits_is_not_checked(self):
+        """Test that partners without a rate limit get no decision (and no bucket)."""
+        limiter = _limiter()
+
+        assert limiter.check("nav", ["Leads"]) is None
+        assert limiter.check("unknown") is None
+        assert limiter.status()["buckets"] == 0
+
+    def test_tag_limit_rejection_takes_no_partner_token(self):
+        """Test that a request rejected by its tag bucket leaves the partner bucket untouched."""
+        limiter = _limiter(
+            rate_limit=RateLimit(requests=10),
+            tag_rate_limits={"Leads": RateLimit(requests=1)},
+        )
+
+        first = limiter.check("nav", ["Leads"], now=0.0)
+        rejected = limiter.check("nav", ["Leads"], now=0.0)
+        untagged = limiter.check("nav", ["tokens"], now=0.0)
+
+        assert first.allowed and first.limit.requests == 1 and first.remaining == 0
+        assert not rejected.allowed and rejected.limit.requests == 1
+        # 10 - 1 (first) - 1 (untagged): the rejected request took nothing
+        assert untagged.allowed and untagged.remaining == 8
+
+    def test_buckets_are_bounded(self):
+        """Test that unknown partner ids sharing a default limit cannot grow memory without bound."""
+        provider = InMemoryPolicyProvider(
+            policies={},
+            default=PartnerPolicy("default", frozenset(), rate_limit=RateLimit(requests=1)),
+        )
+        limiter = PartnerRateLimiter(provider, max_buckets=3)
+
+        for i in range(10):
+            assert limiter.check(f"partner-{i}", now=0.0).allowed is True
+
+        status = limiter.status()
+        assert status["buckets"] == 3
+        assert status["evictions"] == 7
+        assert status["partners"] == {"default": {"allowed": 10}}
+
+
+    def test_busy_partner_bucket_is_not_evicted(self):
+        """Test that eviction drops the least recently used bucket, so an active partner keeps its limit."""
+        provider = InMemoryPolicyProvider(
+            policies={},
+            default=PartnerPolicy("default", frozenset(), rate_limit=RateLimit(requests=1, burst=2)),
+        )
+        limiter = PartnerRateLimiter(provider, max_buckets=2)
+
+        assert limiter.check("busy", now=0.0).allowed is True
+        for i in range(5):
+            limiter.check(f"scanner-{i}", now=0.0)
+            assert limiter.check("busy", now=0.0) is not None
+
+        # A rebuilt bucket would be full again; busy's kept its spent tokens
+        assert limiter.check("busy", now=0.0).allowed is False
+        assert limiter.status()["evictions"] == 4
+
+
+class TestPartnerRateLimitMiddleware:
+    """Tests for the 429s and RateLimit-* headers served by the middleware."""
+
+    @staticmethod
+    def _build_app(limiter: PartnerRateLimiter) -> FastAPI:
+        app = FastAPI()
+        app.add_exception_handler(FundboxAPIException, fundbox_exception_handler)
+
+        @app.get("/leads/{lead_id}", tags=["Leads"])
+        async def get_lead(lead_id: str):
+            return {"lead": lead_id}
+
+        @app.get("/partners/{partner}/status")
+        async def status(partner: str):
+            return {"partner": partner}
+
+        app.add_middleware(PartnerRateLimitMiddleware, limiter=limiter, router=app.router)
+        return app
+
+    @staticmethod
+    async def _get(app: FastAPI, url: str, **kwargs) -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="https://gateway.example.com") as c:
+            return await c.get(url, **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_rejection_uses_gateway_error_payload(self):
+        """Test that the 429 carries the errors.handlers payload, Retry-After and RateLimit-* headers."""
+        app = self._build_app(_limiter(rate_limit=RateLimit(requests=1, per_seconds=10)))
+
+        ok = await self._get(app, "/leads/1", headers={"X-Partner": "NAV"})
+        limited = await self._get(app, "/leads/1", headers={"X-Partner": "nav"})
+
+        assert ok.status_code == 200
+        assert ok.headers["RateLimit-Limit"] == "1"
+        assert ok.headers["RateLimit-Remaining"] == "0"
+        assert ok.headers["RateLimit-Policy"] == "1;w=10"
+        assert limited.status_code == 429
+        assert limited.json() == {
+            "status": 429,
+            "message": "Rate limit exceeded: retry after 10s",
+            "quiet": False,
+        }
+        assert limited.headers["Retry-After"] == "10"
+        assert limited.headers["RateLimit-Remaining"] == "0"
+
+    @pytest.mark.asyncio
+    async def test_tag_limits_follow_route_tags(self):
+        """Test that per-tag limits apply to tagged routes only."""
+        app = self._build_app(_limiter(tag_rate_limits={"Leads": RateLimit(requests=1, per_seconds=60)}))
+        headers = {"X-Partner": "nav"}
+
+        assert (await self._get(app, "/leads/1", headers=headers)).status_code == 200
+        assert (await self._get(app, "/leads/2", headers=headers)).status_code == 429
+        untagged = await self._get(app, "/partners/nav/status", headers=headers)
+        assert untagged.status_code == 200
+        assert "RateLimit-Limit" not in untagged.headers
+
+    @pytest.mark.asyncio
+    async def test_partner_from_path_and_anonymous_requests(self):
+        """Test that the partner is taken from the path without X-Partner, and anonymous requests pass."""
+        app = self._build_app(_limiter(rate_limit=RateLimit(requests=1, per_seconds=60)))
+
+        assert (await self._get(app, "/partners/nav/status")).status_code == 200
+        assert (await self._get(app, "/partners/nav/status")).status_code == 429
+        anonymous = await self._get(app, "/leads/1")
+        assert anonymous.status_code == 200
+        assert "RateLimit-Limit" not in anonymous.headers